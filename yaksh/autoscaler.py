@@ -0,0 +1,128 @@
+"""Decides how many code servers the server pool should run.
+
+The pool starts with its minimum number of code servers.  It adds code
+servers, up to the maximum, when jobs are queued and either more jobs are
+queued than there are code servers, or the oldest queued job or the 95th
+percentile of the time the jobs of the last `window` seconds spent in the
+queue exceed half of `target_wait`.  One code server is added per queued
+job, so that a burst is absorbed in one step.
+
+Code servers are stopped one at a time, down to the minimum, when nothing is
+queued, the recent 95th percentile wait is under a quarter of `target_wait`
+and a code server has been idle for `idle_time` seconds.  The gap between
+the two thresholds, and the idle time, keep the pool from growing and
+shrinking on every change of load.
+"""
+from __future__ import unicode_literals
+from collections import deque
+import math
+import time
+
+# Local imports
+from .settings import (
+    AUTOSCALE_TARGET_WAIT, AUTOSCALE_WINDOW, AUTOSCALE_IDLE_TIME,
+    AUTOSCALE_INTERVAL
+)
+
+
+def percentile(values, fraction):
+    """Return the `fraction` percentile of `values` by the nearest rank
+    method, or 0.0 if there are none.
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = max(int(math.ceil(fraction * len(values))), 1)
+    return values[rank - 1]
+
+
+class Autoscaler(object):
+    def __init__(self, min_servers, max_servers,
+                 target_wait=AUTOSCALE_TARGET_WAIT, window=AUTOSCALE_WINDOW,
+                 idle_time=AUTOSCALE_IDLE_TIME, interval=AUTOSCALE_INTERVAL):
+        self.min_servers = min_servers
+        self.max_servers = max(max_servers, min_servers)
+        self.target_wait = target_wait
+        self.window = window
+        self.idle_time = idle_time
+        self.interval = interval
+        # (time the job was started, seconds it waited in the queue)
+        self.waits = deque()
+        self.events = deque(maxlen=50)
+        self.last_scale_up = 0.0
+
+    @property
+    def enabled(self):
+        return self.max_servers > self.min_servers
+
+    # Public Protocol ##########
+    def record_wait(self, wait, now=None):
+        """Record that a job was started after waiting `wait` seconds."""
+        now = time.time() if now is None else now
+        self.waits.append((now, wait))
+        self._expire(now)
+
+    def recent_wait(self, now=None):
+        """Return the 95th percentile of the recent waits."""
+        now = time.time() if now is None else now
+        self._expire(now)
+        return percentile([wait for _, wait in self.waits], 0.95)
+
+    def decide(self, n_servers, queued, oldest_wait, idle_times, now=None):
+        """Return the number of code servers to run.
+
+        Parameters
+        ----------
+
+        n_servers : int
+            Number of code servers running.
+
+        queued : int
+            Number of jobs waiting for a code server.
+
+        oldest_wait : float
+            Seconds for which the oldest queued job has waited.
+
+        idle_times : list
+            Seconds for which each idle code server has been idle.
+        """
+        now = time.time() if now is None else now
+        if not self.enabled:
+            return n_servers
+        p95 = self.recent_wait(now)
+        high = self.target_wait / 2.0
+        if queued and n_servers < self.max_servers and (
+                queued >= n_servers or oldest_wait > high or p95 > high):
+            target = min(n_servers + queued, self.max_servers)
+            self._record('up', n_servers, target, queued, p95, now)
+            self.last_scale_up = now
+            return target
+        low = self.target_wait / 4.0
+        if (not queued and n_servers > self.min_servers and p95 <= low and
+                now - self.last_scale_up >= self.idle_time and
+                any(idle >= self.idle_time for idle in idle_times)):
+            target = n_servers - 1
+            self._record('down', n_servers, target, queued, p95, now)
+            return target
+        return n_servers
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'min': self.min_servers,
+            'max': self.max_servers,
+            'target_wait': self.target_wait,
+            'p95_wait': round(self.recent_wait(), 3),
+            'events': list(self.events),
+        }
+
+    # Private Protocol ##########
+    def _expire(self, now):
+        while self.waits and now - self.waits[0][0] > self.window:
+            self.waits.popleft()
+
+    def _record(self, action, n_from, n_to, queued, p95, now):
+        self.events.append(dict(
+            time=now, action=action, servers=[n_from, n_to], queued=queued,
+            p95_wait=round(p95, 3)
+        ))
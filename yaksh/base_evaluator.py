@@ -2,13 +2,13 @@
 from __future__ import unicode_literals
 import os
 from os.path import abspath, exists
-import subprocess
 import stat
 import signal
 
 
 # Local imports
 from .grader import TimeoutException
+from .resource_usage import AccountedPopen
 
 
 class BaseEvaluator(object):
@@ -18,6 +18,13 @@ class BaseEvaluator(object):
     def __init__(self):
         pass
 
+    @classmethod
+    def prepare(cls, test_case_instances):
+        """Called with the instances of this class for the test cases of a
+        job, before any is compiled, so they can share work.
+        """
+        pass
+
     def check_code(self):
         raise NotImplementedError("check_code method not implemented")
 
@@ -30,8 +37,8 @@ class BaseEvaluator(object):
         stdout and stderr.
         """
         try:
-            proc = subprocess.Popen(cmd_args,
-                                    preexec_fn=os.setpgrp, *args, **kw)
+            proc = AccountedPopen(cmd_args,
+                                  preexec_fn=os.setpgrp, *args, **kw)
             stdout, stderr = proc.communicate()
         except TimeoutException:
             # Runaway code, so kill it.
@@ -7,6 +7,7 @@ from os.path import isfile
 # local imports
 from .stdio_evaluator import StdIOEvaluator
 from .file_utils import copy_files, delete_files
+from .resource_usage import AccountedPopen
 
 
 class BashStdIOEvaluator(StdIOEvaluator):
@@ -45,13 +46,13 @@ class BashStdIOEvaluator(StdIOEvaluator):
         mark_fraction = 0.0
 
         self.expected_input = str(self.expected_input).replace('\r', '')
-        proc = subprocess.Popen("bash ./Test.sh",
-                                shell=True,
-                                stdin=subprocess.PIPE,
-                                stdout=subprocess.PIPE,
-                                stderr=subprocess.PIPE,
-                                preexec_fn=os.setpgrp
-                                )
+        proc = AccountedPopen("bash ./Test.sh",
+                              shell=True,
+                              stdin=subprocess.PIPE,
+                              stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE,
+                              preexec_fn=os.setpgrp
+                              )
         success, err = self.evaluate_stdio(self.user_answer, proc,
                                            self.expected_input,
                                            self.expected_output
@@ -0,0 +1,74 @@
+"""Compare the time jobs wait in the queue during a burst of submissions
+with a fixed pool of code servers and with a pool which autoscales.
+
+Usage::
+
+    $ python -m yaksh.benchmarks.autoscale -n 2 -m 20 -j 40 -s 0.5 -t 2
+
+Reports the 95th percentile queue wait of each pool and whether it stayed
+under the target.
+"""
+from __future__ import print_function, unicode_literals
+from argparse import ArgumentParser
+import json
+import shutil
+
+from yaksh.autoscaler import percentile
+from yaksh.code_server import submit
+from .utils import running_pool, python_job, make_user_dir, wait_for
+
+
+def p95_wait(port, n, max_n, n_jobs, job_time, target_wait):
+    user_dir = make_user_dir()
+    try:
+        with running_pool(port, n=n, max_n=max_n) as (url, pool):
+            autoscaler = pool.autoscaler
+            autoscaler.target_wait = target_wait
+            # Keep the wait of every job of the burst.
+            autoscaler.window = 3600
+            uids = ['job%d' % i for i in range(n_jobs)]
+            for uid in uids:
+                # Different answers, so that the grade cache is not used.
+                answer = 'import time\ntime.sleep(%s)\ndef f(): return 1'\
+                         '  # %s' % (job_time, uid)
+                submit(url, uid, python_job(answer), user_dir)
+            wait_for(url, uids)
+            waits = [wait for _, wait in autoscaler.waits]
+            scaled = len(autoscaler.events)
+    finally:
+        shutil.rmtree(user_dir)
+    return percentile(waits, 0.95), scaled
+
+
+def main(args=None):
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('-n', type=int, default=2,
+                        help="Number of code servers to start with.")
+    parser.add_argument('-m', '--max', type=int, default=20,
+                        help="Most code servers of the autoscaled pool.")
+    parser.add_argument('-j', '--jobs', type=int, default=40,
+                        help="Number of jobs in the burst.")
+    parser.add_argument('-s', '--job-time', type=float, default=0.5,
+                        help="Seconds each job takes.")
+    parser.add_argument('-t', '--target-wait', type=float, default=2.0,
+                        help="Target for the 95th percentile queue wait.")
+    parser.add_argument('-p', '--port', type=int, default=55600,
+                        help="Port for the server pool.")
+    options = parser.parse_args(args)
+
+    report = {}
+    for mode, max_n in (('fixed', options.n), ('autoscaled', options.max)):
+        wait, scaled = p95_wait(
+            options.port, options.n, max_n, options.jobs, options.job_time,
+            options.target_wait
+        )
+        report[mode] = {
+            'p95_wait': round(wait, 3),
+            'within_target': wait <= options.target_wait,
+            'scaling_events': scaled,
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
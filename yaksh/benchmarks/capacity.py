@@ -0,0 +1,702 @@
+"""A benchmark of the grading capacity of the code server.
+
+It starts a server pool, or uses the one at ``--url``, submits a mix of
+jobs at a steady rate for a while and prints a json report.  The report
+gives the throughput, the latency percentiles and the number of timeouts,
+overall and per kind of job.  Keep the reports of two commits to compare
+their capacity::
+
+    $ python -m yaksh.benchmarks.capacity -n 4 --rate 20 --duration 60 \\
+          --mix python:4,python_stdio:2,hook:1,c:1,cpp:1,bash:1 > before.json
+
+The jobs are correct answers taken from the evaluator tests.  Kinds whose
+compiler or interpreter is not installed are skipped and listed in the
+report.  Each answer gets a unique comment, so the grade cache does not
+answer it.  The jobs are spread over `--users` user directories, like the
+answers of a class.
+
+The latency of a job runs from its submission till the server reports it
+done.  A pool of `--concurrency` threads submits the jobs on schedule.
+`max_lag` in the report is the longest any job was submitted late; a large
+value means the benchmark itself could not keep up.
+
+With ``--client N`` it instead times N requests made by the client
+functions, over kept alive connections with json bodies, against N made
+over new connections with form bodies.  With ``--recovery N`` it times the
+start of a pool whose journal holds N unfinished jobs, see `yaksh.journal`.
+With ``--first-job`` it times the first job of each kind in the mix in a
+fresh process, cold and after the evaluators were preloaded.  With
+``--isolation N`` it times a Python job with N test cases in each mode of
+`PYTHON_TEST_ISOLATION`.
+"""
+from __future__ import unicode_literals
+from argparse import ArgumentParser
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from textwrap import dedent
+import time
+import urllib
+
+# Library imports
+import requests
+
+# Local imports
+from yaksh.autoscaler import percentile
+from yaksh.code_server import (
+    ServerPool, submit, get_result, evaluate_code, preload_modules
+)
+from yaksh.journal import Journal
+from yaksh import python_assertion_evaluator
+from yaksh.settings import (
+    N_CODE_SERVERS, SERVER_POOL_PORT, CODE_SERVER_FORK, WAIT_FOR_RESULT
+)
+from .utils import pool_or_url
+
+C_TEST = dedent("""\
+    #include <stdio.h>
+    #include <stdlib.h>
+
+    extern int add(int, int);
+
+    template <class T>
+    void check(T expect, T result)
+    {
+        if (expect == result)
+        {
+            printf("Correct: Expected %d got %d ", expect, result);
+        }
+        else
+        {
+            printf("Incorrect: Expected %d got %d ", expect, result);
+            exit(1);
+        }
+    }
+
+    int main(void)
+    {
+        check(0, add(0, 0));
+        check(5, add(2, 3));
+        printf("All Correct");
+        return 0;
+    }
+    """)
+
+JAVA_TEST = dedent("""\
+    class main
+    {
+        public static void main(String arg[])
+        {
+            Test t = new Test();
+            if (t.square_num(5) != 25 || t.square_num(6) != 36)
+            {
+                System.exit(1);
+            }
+        }
+    }
+    """)
+
+HOOK_CODE = dedent("""\
+    def check_answer(user_answer):
+        exec(user_answer, globals())
+        if add(1, 2) == 3:
+            return True, "", 1.0
+        return False, "Incorrect Answer", 0.0
+    """)
+
+R_TEST = dedent("""\
+    source("function.r")
+    check = function(input, output){
+        stopifnot(input == output)
+    }
+    check(odd_or_even(6), "EVEN")
+    check(odd_or_even(777), "ODD")
+    """)
+
+SCILAB_TEST = dedent("""\
+    mode(-1)
+    exec("function.sci",-1);
+    if add(3, 5) == 8 & add(22, -20) == 2 then
+        exit(0);
+    end
+    exit(1);
+    """)
+
+
+def _stdio(expected_input, expected_output):
+    return [{'expected_input': expected_input,
+             'expected_output': expected_output,
+             'test_case_type': 'stdiobasedtestcase', 'weight': 0.0}]
+
+
+def _assertion(test_case, **kw):
+    return [dict(test_case=test_case, test_case_type='standardtestcase',
+                 weight=0.0, **kw)]
+
+
+# Kind of job -> language, programs it needs, line comment of the language,
+# answer and test cases.
+KINDS = OrderedDict([
+    ('python', dict(
+        language='python', tools=[], comment='#',
+        user_answer='def add(a, b):\n    return a + b',
+        test_case_data=_assertion('assert add(1, 2) == 3')
+    )),
+    ('python_stdio', dict(
+        language='python', tools=[], comment='#',
+        user_answer='a = int(input())\nb = int(input())\nprint(a + b)',
+        test_case_data=_stdio('5\n6', '11')
+    )),
+    ('python_timeout', dict(
+        language='python', tools=[], comment='#',
+        user_answer='def add(a, b):\n    while True:\n        pass',
+        test_case_data=_assertion('assert add(1, 2) == 3')
+    )),
+    ('hook', dict(
+        language='python', tools=[], comment='#',
+        user_answer='def add(a, b):\n    return a + b',
+        test_case_data=[{'test_case_type': 'hooktestcase',
+                         'hook_code': HOOK_CODE, 'weight': 1.0}]
+    )),
+    ('c', dict(
+        language='c', tools=['g++'], comment='//',
+        user_answer='int add(int a, int b)\n{return a + b;}',
+        test_case_data=_assertion(C_TEST)
+    )),
+    ('cpp', dict(
+        language='cpp', tools=['g++'], comment='//',
+        user_answer=dedent("""\
+            #include <iostream>
+            using namespace std;
+            int main(void) {
+                int a, b;
+                cin >> a >> b;
+                cout << a + b;
+            }
+            """),
+        test_case_data=_stdio('5\n6', '11')
+    )),
+    ('bash', dict(
+        language='bash', tools=['bash'], comment='#',
+        user_answer='#!/bin/bash\n[[ $# -eq 2 ]] && echo $(( $1 + $2 )) '
+                    '&& exit $(( $1 + $2 ))',
+        test_case_data=_assertion(
+            '#!/bin/bash\n[[ $# -eq 2 ]] && echo $(( $1 + $2 )) '
+            '&& exit $(( $1 + $2 ))', test_case_args='1 2\n2 1'
+        )
+    )),
+    ('bash_stdio', dict(
+        language='bash', tools=['bash'], comment='#',
+        user_answer='#!/bin/bash\nread A\nread B\necho -n $(( $A + $B ))',
+        test_case_data=_stdio('5\n6', '11')
+    )),
+    ('java', dict(
+        language='java', tools=['javac', 'java'], comment='//',
+        user_answer='class Test {\n\tint square_num(int a) {\n'
+                    '\treturn a*a;\n\t}\n}',
+        test_case_data=_assertion(JAVA_TEST)
+    )),
+    ('r', dict(
+        language='r', tools=['Rscript'], comment='#',
+        user_answer='odd_or_even <- function(n){\n  if(n %% 2 == 0){\n'
+                    '    return("EVEN")\n  }\n  return("ODD")\n}',
+        test_case_data=_assertion(R_TEST)
+    )),
+    ('scilab', dict(
+        language='scilab', tools=['scilab-cli'], comment='//',
+        user_answer='funcprot(0)\nfunction[c]=add(a,b)\n\tc=a+b;\n'
+                    'endfunction',
+        test_case_data=_assertion(SCILAB_TEST)
+    )),
+])
+
+DEFAULT_MIX = 'python:4,python_stdio:2,hook:1,c:1,cpp:1,bash:1'
+
+
+def parse_mix(spec):
+    """Return an OrderedDict of the weight of each kind of job given as
+    ``kind:weight,...``.  A ValueError is raised for an unknown kind.
+    """
+    mix = OrderedDict()
+    for item in spec.split(','):
+        kind, _, weight = item.strip().partition(':')
+        if not kind:
+            continue
+        if kind not in KINDS:
+            raise ValueError("Unknown kind of job %r, one of %s." % (
+                kind, ', '.join(KINDS)
+            ))
+        mix[kind] = float(weight) if weight else 1.0
+    return mix
+
+
+def missing_tools(kind):
+    """Return the programs needed by the kind of job which are not
+    installed.
+    """
+    return [tool for tool in KINDS[kind]['tools']
+            if shutil.which(tool) is None]
+
+
+def make_job(kind, uid):
+    """Return the json data of a job of the given kind, its answer made
+    unique by a comment holding `uid`.
+    """
+    spec = KINDS[kind]
+    answer = '%s\n%s %s\n' % (spec['user_answer'], spec['comment'], uid)
+    return json.dumps({
+        'metadata': {
+            'user_answer': answer,
+            'language': spec['language'],
+            'partial_grading': False
+        },
+        'test_case_data': spec['test_case_data']
+    })
+
+
+def timed_out(result):
+    """Return True if the graded result says the job hit the time limit."""
+    for error in result.get('error') or []:
+        if isinstance(error, dict) and \
+                error.get('exception') == 'TimeoutException':
+            return True
+    return False
+
+
+def summarize(latencies):
+    """Return the count, mean, percentiles and largest of the latencies."""
+    if not latencies:
+        return dict(count=0)
+    return OrderedDict([
+        ('count', len(latencies)),
+        ('mean', round(sum(latencies) / len(latencies), 4)),
+        ('p50', round(percentile(latencies, 0.5), 4)),
+        ('p95', round(percentile(latencies, 0.95), 4)),
+        ('p99', round(percentile(latencies, 0.99), 4)),
+        ('max', round(max(latencies), 4)),
+    ])
+
+
+def outcome(result):
+    """Return how the job went: success, rejected, timeout, failure, or
+    error if the result is None.
+    """
+    if result is None:
+        return 'error'
+    if result.get('success'):
+        return 'success'
+    if result.get('rejected'):
+        return 'rejected'
+    if timed_out(result):
+        return 'timeout'
+    return 'failure'
+
+
+def report_on(jobs, elapsed):
+    """Return the counts, throughput and latency of the jobs, a list of
+    (latency, outcome), run in `elapsed` seconds.
+    """
+    outcomes = [o for latency, o in jobs]
+    completed = [latency for latency, o in jobs if o != 'error']
+    return OrderedDict([
+        ('submitted', len(jobs)),
+        ('completed', len(completed)),
+        ('throughput', round(len(completed) / elapsed, 3)),
+        ('latency', summarize(completed)),
+        ('timeouts', outcomes.count('timeout')),
+        ('failures', outcomes.count('failure')),
+        ('rejected', outcomes.count('rejected')),
+        ('errors', outcomes.count('error')),
+    ])
+
+
+def run_job(url, uid, json_data, user_dir, priority=None):
+    """Submit a job and wait till it is done, return the seconds it took
+    and its result, or None for the result if the server failed.
+    """
+    start = time.time()
+    try:
+        submit(url, uid, json_data, user_dir, priority)
+        data = get_result(url, uid, wait=WAIT_FOR_RESULT)
+        while data.get('status') != 'done':
+            if data.get('status') == 'unknown':
+                time.sleep(0.01)
+            data = get_result(url, uid, wait=WAIT_FOR_RESULT)
+        result = json.loads(data['result'])
+    except Exception:
+        return time.time() - start, None
+    return time.time() - start, result
+
+
+def current_commit():
+    try:
+        output = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode('utf-8').strip()
+
+
+class Benchmark(object):
+    def __init__(self, url, mix, rate, duration, users=50, concurrency=256,
+                 seed=0):
+        """Submit jobs of the kinds in `mix`, weighted, to the server at
+        `url`, `rate` jobs a second for `duration` seconds.
+        """
+        self.url = url
+        self.skipped = OrderedDict(
+            (kind, missing_tools(kind)) for kind in mix if missing_tools(kind)
+        )
+        self.mix = OrderedDict(
+            (kind, weight) for kind, weight in mix.items()
+            if kind not in self.skipped
+        )
+        self.rate = rate
+        self.duration = duration
+        self.users = users
+        self.concurrency = concurrency
+        self.random = random.Random(seed)
+        # kind -> list of (latency, outcome) of the finished jobs.
+        self.done = defaultdict(list)
+        self.lags = []
+
+    # Private Protocol ##########
+    def _run_job(self, uid, kind, user_dir, due):
+        self.lags.append(max(time.time() - due, 0.0))
+        latency, result = run_job(self.url, uid, make_job(kind, uid),
+                                  user_dir)
+        self.done[kind].append((latency, outcome(result)))
+
+    # Public Protocol ##########
+    def run(self):
+        """Run the benchmark and return the report."""
+        kinds = list(self.mix)
+        weights = list(self.mix.values())
+        n_jobs = int(self.rate * self.duration) if kinds else 0
+        root = tempfile.mkdtemp(prefix='yaksh_benchmark_')
+        user_dirs = [os.path.join(root, 'user%d' % i)
+                     for i in range(self.users)]
+        run_id = '%x' % int(time.time() * 1000)
+        start = time.time()
+        try:
+            with ThreadPoolExecutor(self.concurrency) as executor:
+                for i in range(n_jobs):
+                    due = start + i / float(self.rate)
+                    delay = due - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                    kind = self.random.choices(kinds, weights)[0]
+                    executor.submit(
+                        self._run_job, 'bench-%s-%d' % (run_id, i), kind,
+                        user_dirs[i % self.users], due
+                    )
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+        elapsed = time.time() - start
+        all_jobs = [job for jobs in self.done.values() for job in jobs]
+        report = OrderedDict([
+            ('commit', current_commit()),
+            ('url', self.url),
+            ('rate', self.rate),
+            ('duration', self.duration),
+            ('elapsed', round(elapsed, 3)),
+            ('mix', self.mix),
+            ('skipped', self.skipped),
+            ('max_lag', round(max(self.lags or [0.0]), 4)),
+        ])
+        report.update(report_on(all_jobs, elapsed))
+        report['kinds'] = OrderedDict(
+            (kind, report_on(self.done[kind], elapsed))
+            for kind in self.mix
+        )
+        return report
+
+
+def _time_requests(n_requests, request):
+    times = []
+    for i in range(n_requests):
+        start = time.time()
+        request(i)
+        times.append(time.time() - start)
+    return summarize(times)
+
+
+def benchmark_client(url, n_requests, answer_size=1000):
+    """Return the seconds taken by the client functions to submit a job
+    with an answer of `answer_size` bytes and to get a result, against the
+    same requests made over a new connection with a form body.
+    """
+    prefix = 'client-%x-' % int(time.time() * 1000)
+    job = json.dumps({
+        'metadata': {
+            'user_answer': 'def add(a, b):\n    return a + b\n# %s\n'
+                           % ('x' * answer_size),
+            'language': 'python',
+            'partial_grading': False
+        },
+        'test_case_data': KINDS['python']['test_case_data']
+    })
+    # Grade the job once, the same job is then answered by the grade cache,
+    # if the server has one (GRADE_CACHE_SIZE), so only the requests are
+    # timed.
+    run_job(url, prefix + 'warm', job, '')
+
+    def uid(mode, i):
+        return '%s%s-%d' % (prefix, mode, i)
+
+    report = OrderedDict([('commit', current_commit()), ('url', url),
+                          ('requests', n_requests),
+                          ('answer_size', answer_size)])
+    report['form_submit'] = _time_requests(n_requests, lambda i: requests.post(
+        url, data=dict(uid=uid('form', i), json_data=job, user_dir='')
+    ))
+    report['form_get_result'] = _time_requests(
+        n_requests, lambda i: requests.get(
+            urllib.parse.urljoin(url, uid('form', i))
+        )
+    )
+    report['submit'] = _time_requests(
+        n_requests, lambda i: submit(url, uid('pooled', i), job, '')
+    )
+    report['get_result'] = _time_requests(
+        n_requests, lambda i: get_result(url, uid('pooled', i))
+    )
+    report['saved_per_request'] = OrderedDict(
+        (name, round(report['form_' + name]['mean'] - report[name]['mean'],
+                     6))
+        for name in ('submit', 'get_result')
+    )
+    return report
+
+
+def _time_first_job(kind, warm, times):
+    if warm:
+        preload_modules()
+    user_dir = tempfile.mkdtemp(prefix='yaksh_benchmark_')
+    try:
+        start = time.time()
+        evaluate_code(make_job(kind, 'first'), user_dir)
+        times.put(time.time() - start)
+    finally:
+        shutil.rmtree(user_dir, ignore_errors=True)
+
+
+def benchmark_first_job(mix):
+    """Return the seconds taken by the first job of each kind in `mix` in a
+    new process, cold and with the evaluators preloaded, as a code server
+    evaluates it after a restart.
+    """
+    context = multiprocessing.get_context('spawn')
+    times = context.Queue()
+    report = OrderedDict([('commit', current_commit())])
+    for kind in mix:
+        if missing_tools(kind):
+            continue
+        seconds = {}
+        for warm in (False, True):
+            process = context.Process(target=_time_first_job,
+                                      args=(kind, warm, times))
+            process.start()
+            seconds[warm] = times.get()
+            process.join()
+        report[kind] = OrderedDict([
+            ('cold', round(seconds[False], 4)),
+            ('warm', round(seconds[True], 4)),
+            ('saved', round(seconds[False] - seconds[True], 4)),
+        ])
+    return report
+
+
+def benchmark_recovery(n_jobs, port, mix):
+    """Return how long a server pool takes to start with `n_jobs` jobs of
+    the kinds in `mix` left unfinished in its journal.
+    """
+    root = tempfile.mkdtemp(prefix='yaksh_benchmark_')
+    path = os.path.join(root, 'journal.db')
+    try:
+        journal = Journal(path)
+        kinds = list(mix)
+        start = time.time()
+        for i in range(n_jobs):
+            uid = 'recover-%d' % i
+            journal.accept(uid, make_job(kinds[i % len(kinds)], uid),
+                           os.path.join(root, 'user%d' % (i % 50)), 'exam')
+        journal.close()
+        written = time.time() - start
+        start = time.time()
+        pool = ServerPool(n=1, pool_port=port, journal=path)
+        recovered = time.time() - start
+        queued = len(pool.partitions)
+        pool.stop()
+        for sock in pool.sockets:
+            sock.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return OrderedDict([
+        ('commit', current_commit()),
+        ('jobs', n_jobs),
+        ('queued', queued),
+        ('journal_write', round(written, 4)),
+        ('recovery', round(recovered, 4)),
+    ])
+
+
+def benchmark_isolation(n_test_cases, repeat=5):
+    """Return the median seconds taken by a Python job with `n_test_cases`
+    assertion test cases and costly module level code, in each mode of
+    `PYTHON_TEST_ISOLATION`.
+    """
+    answer = dedent("""\
+        squares = [i * i for i in range(200000)]
+        def square(n):
+            return squares[n]
+        # %s
+        """)
+    test_case_data = [
+        dict(test_case='assert square(%d) == %d' % (i, i * i),
+             test_case_type='standardtestcase', weight=1.0)
+        for i in range(n_test_cases)
+    ]
+    user_dir = tempfile.mkdtemp(prefix='yaksh_benchmark_')
+    default = python_assertion_evaluator.PYTHON_TEST_ISOLATION
+    report = OrderedDict([('commit', current_commit()),
+                          ('test_cases', n_test_cases)])
+    try:
+        for isolation in ('exec', 'copy', 'fork'):
+            python_assertion_evaluator.PYTHON_TEST_ISOLATION = isolation
+            times = []
+            for i in range(repeat):
+                json_data = json.dumps({
+                    'metadata': {'user_answer': answer % i,
+                                 'language': 'python',
+                                 'partial_grading': True},
+                    'test_case_data': test_case_data
+                })
+                start = time.time()
+                evaluate_code(json_data, user_dir)
+                times.append(time.time() - start)
+            report[isolation] = round(sorted(times)[len(times) // 2], 4)
+    finally:
+        python_assertion_evaluator.PYTHON_TEST_ISOLATION = default
+        shutil.rmtree(user_dir, ignore_errors=True)
+    return report
+
+
+def _run_benchmark(options, mix):
+    with pool_or_url(options) as url:
+        benchmark = Benchmark(
+            url, mix, options.rate, options.duration, users=options.users,
+            concurrency=options.concurrency, seed=options.seed
+        )
+        report = benchmark.run()
+    if options.url is None:
+        report['code_servers'] = options.n
+        report['fork'] = options.fork
+    return report
+
+
+###############################################################################
+def main(args=None):
+    parser = ArgumentParser(
+        description="Measure the grading capacity of the code server."
+    )
+    parser.add_argument(
+        '-n', dest='n', type=int, default=N_CODE_SERVERS,
+        help="Number of code servers of the pool started."
+    )
+    parser.add_argument(
+        '-p', '--port', dest='port', type=int, default=SERVER_POOL_PORT + 100,
+        help="Port of the pool started."
+    )
+    parser.add_argument(
+        '-f', '--fork', dest='fork', action='store_true',
+        default=CODE_SERVER_FORK,
+        help="Evaluate every job in a child forked from a warm process."
+    )
+    parser.add_argument(
+        '--url', dest='url', default=None,
+        help="URL of a running server pool or coordinator to use instead "
+             "of starting a pool."
+    )
+    parser.add_argument(
+        '--mix', dest='mix', default=DEFAULT_MIX,
+        help="Kinds of jobs and their weights, from %s." % ', '.join(KINDS)
+    )
+    parser.add_argument(
+        '--rate', dest='rate', type=float, default=10.0,
+        help="Jobs submitted per second."
+    )
+    parser.add_argument(
+        '--duration', dest='duration', type=float, default=30.0,
+        help="Seconds for which jobs are submitted."
+    )
+    parser.add_argument(
+        '--users', dest='users', type=int, default=50,
+        help="Number of user directories the jobs are spread over."
+    )
+    parser.add_argument(
+        '--concurrency', dest='concurrency', type=int, default=256,
+        help="Most jobs submitted and waited for at once."
+    )
+    parser.add_argument(
+        '--seed', dest='seed', type=int, default=0,
+        help="Seed of the choice of the kinds of jobs."
+    )
+    parser.add_argument(
+        '-o', '--output', dest='output', default=None,
+        help="File to write the report to, instead of the standard output."
+    )
+    parser.add_argument(
+        '--client', dest='client', type=int, default=0,
+        help="Instead, time this many requests of the client functions."
+    )
+    parser.add_argument(
+        '--first-job', dest='first_job', action='store_true',
+        help="Instead, time the first job of each kind, cold and warm."
+    )
+    parser.add_argument(
+        '--recovery', dest='recovery', type=int, default=0,
+        help="Instead, time the restart of a pool with this many unfinished "
+             "jobs in its journal."
+    )
+    parser.add_argument(
+        '--isolation', dest='isolation', type=int, default=0,
+        help="Instead, time a Python job with this many test cases in each "
+             "mode of PYTHON_TEST_ISOLATION."
+    )
+    options = parser.parse_args(args)
+
+    try:
+        mix = parse_mix(options.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    if options.recovery:
+        report = benchmark_recovery(options.recovery, options.port, mix)
+    elif options.isolation:
+        report = benchmark_isolation(options.isolation)
+    elif options.first_job:
+        report = benchmark_first_job(mix)
+    elif options.client:
+        with pool_or_url(options) as url:
+            report = benchmark_client(url, options.client)
+    else:
+        report = _run_benchmark(options, mix)
+    text = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        sys.stdout.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,60 @@
+"""Compare the throughput of the code server with and without the fork
+server mode.
+
+Usage::
+
+    $ python -m yaksh.benchmarks.fork_server -n 4 -j 200
+
+"""
+from __future__ import print_function, unicode_literals
+from argparse import ArgumentParser
+import json
+import shutil
+import time
+
+from yaksh.code_server import submit
+from .utils import running_pool, python_job, make_user_dir, wait_for
+
+
+def jobs_per_second(port, n, n_jobs, fork):
+    user_dir = make_user_dir()
+    json_data = python_job(
+        test_cases=['assert f() == 1', 'check_equal("f()", 1)']
+    )
+    try:
+        with running_pool(port, n=n, fork=fork) as (url, pool):
+            # Warm up, so that process start up is not measured.
+            submit(url, 'warmup', json_data, user_dir)
+            wait_for(url, ['warmup'])
+            uids = ['job%d' % i for i in range(n_jobs)]
+            start = time.time()
+            for uid in uids:
+                submit(url, uid, json_data, user_dir)
+            wait_for(url, uids)
+            elapsed = time.time() - start
+    finally:
+        shutil.rmtree(user_dir)
+    return n_jobs / elapsed
+
+
+def main(args=None):
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('-n', type=int, default=4,
+                        help="Number of code servers to run.")
+    parser.add_argument('-j', '--jobs', type=int, default=200,
+                        help="Number of jobs to submit.")
+    parser.add_argument('-p', '--port', type=int, default=55600,
+                        help="Port for the server pool.")
+    options = parser.parse_args(args)
+
+    report = {}
+    for fork in (False, True):
+        mode = 'fork' if fork else 'default'
+        report[mode] = round(
+            jobs_per_second(options.port, options.n, options.jobs, fork), 2
+        )
+    print(json.dumps({'jobs_per_second': report}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Compare the time taken to grade a Java submission with several test cases
+when it is compiled for every test case, compiled once, and compiled once
+and run in the persistent JVM.
+
+Usage::
+
+    $ python -m yaksh.benchmarks.java -t 5 -r 10
+
+The benchmark is skipped if javac is not installed.
+"""
+from __future__ import print_function, unicode_literals
+from argparse import ArgumentParser
+import json
+import shutil
+import tempfile
+import time
+
+from yaksh import compile_cache, java_runner
+from yaksh.compile_cache import CompileCache
+from yaksh.grader import Grader
+from .utils import make_user_dir
+
+USER_ANSWER = """
+class Test {
+    int square_num(int num) {
+        return num * num;
+    }
+}
+"""
+
+TEST_CASE = """
+class main {
+    public static void main(String arg[]) {
+        Test t = new Test();
+        if (t.square_num(%d) != %d) {
+            System.exit(1);
+        }
+    }
+}
+"""
+
+
+def java_job(n_test_cases):
+    return {
+        'metadata': {
+            'user_answer': USER_ANSWER,
+            'file_paths': None,
+            'partial_grading': False,
+            'language': 'java'
+        },
+        'test_case_data': [
+            {'test_case': TEST_CASE % (i, i * i),
+             'test_case_type': 'standardtestcase', 'weight': 1.0}
+            for i in range(n_test_cases)
+        ]
+    }
+
+
+def seconds_per_job(n_test_cases, n_runs, cache_size, persistent_jvm):
+    cache_dir = tempfile.mkdtemp(prefix='yaksh_bench_cache_')
+    user_dir = make_user_dir()
+    compile_cache.cache = CompileCache(cache_dir, max_size=cache_size)
+    java_runner.JAVA_RUNNER = persistent_jvm
+    try:
+        times = []
+        for run in range(n_runs):
+            # Every run is a new submission, so nothing is cached between
+            # runs.
+            job = java_job(n_test_cases)
+            job['metadata']['user_answer'] += '// run %d' % run
+            start = time.time()
+            result = Grader(user_dir).evaluate(job)
+            times.append(time.time() - start)
+            assert result['success'], result
+    finally:
+        if java_runner.runner is not None:
+            java_runner.runner.stop()
+        java_runner.JAVA_RUNNER = False
+        compile_cache.cache = None
+        shutil.rmtree(cache_dir)
+        shutil.rmtree(user_dir)
+    return sum(times) / len(times)
+
+
+def main(args=None):
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('-t', '--test-cases', type=int, default=5,
+                        help="Number of test cases of the question.")
+    parser.add_argument('-r', '--runs', type=int, default=10,
+                        help="Number of submissions to grade in each mode.")
+    options = parser.parse_args(args)
+
+    if not shutil.which('javac'):
+        print(json.dumps({'skipped': 'javac is not installed'}))
+        return
+    modes = [
+        ('compile_per_test_case', 0, False),
+        ('compile_once', 16, False),
+        ('persistent_jvm', 16, True),
+    ]
+    report = {}
+    for mode, cache_size, persistent_jvm in modes:
+        report[mode] = round(
+            seconds_per_job(options.test_cases, options.runs, cache_size,
+                            persistent_jvm), 3
+        )
+    print(json.dumps({'seconds_per_job': report}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
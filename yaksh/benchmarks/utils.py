@@ -0,0 +1,62 @@
+"""Helpers shared by the code server benchmarks."""
+from __future__ import unicode_literals
+import contextlib
+import json
+import tempfile
+from threading import Thread
+
+from yaksh.code_server import ServerPool, get_result
+
+
+@contextlib.contextmanager
+def running_pool(port, **kwargs):
+    """Run a `ServerPool` in a background thread for the duration of the
+    block and yield its url.
+    """
+    pool = ServerPool(pool_port=port, **kwargs)
+    thread = Thread(target=pool.run)
+    thread.start()
+    try:
+        yield 'http://localhost:%s' % port, pool
+    finally:
+        pool.stop()
+        thread.join()
+
+
+@contextlib.contextmanager
+def pool_or_url(options):
+    """Yield the url of the server at ``options.url``, or of a pool of
+    ``options.n`` code servers started on ``options.port`` for the block.
+    """
+    if options.url is not None:
+        yield options.url
+        return
+    with running_pool(options.port, n=options.n,
+                      fork=options.fork) as (url, pool):
+        yield url
+
+
+def python_job(user_answer='def f(): return 1',
+               test_cases=('assert f() == 1',)):
+    """Return the json data of a python assertion job."""
+    return json.dumps({
+        'metadata': {
+            'user_answer': user_answer,
+            'language': 'python',
+            'partial_grading': False
+        },
+        'test_case_data': [
+            {'test_case': tc, 'test_case_type': 'standardtestcase',
+             'weight': 1.0}
+            for tc in test_cases
+        ]
+    })
+
+
+def make_user_dir():
+    return tempfile.mkdtemp(prefix='yaksh_bench_')
+
+
+def wait_for(url, uids):
+    """Block till all the given jobs are done and return their results."""
+    return [get_result(url, uid, block=True) for uid in uids]
@@ -13,30 +13,69 @@ run as many servers as desired.
 # Standard library imports
 from __future__ import unicode_literals
 from argparse import ArgumentParser
+from collections import defaultdict, Counter
+from datetime import timedelta
+import gzip
 import json
-from multiprocessing import Process, Queue, Manager
+from multiprocessing import Process, Queue
 import os
 from os.path import dirname, abspath
 try:
     import pwd
 except ImportError:
     pass
+import resource
+import select
+import signal
 import sys
+from threading import Thread
 import time
 
 # Library imports
 import requests
-from tornado.ioloop import IOLoop
-from tornado.web import Application, RequestHandler
+from requests.adapters import HTTPAdapter
+from tornado import gen
+from tornado.concurrent import Future
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop, PeriodicCallback
+from tornado.netutil import bind_sockets
+from tornado.web import Application, HTTPError, RequestHandler
 import urllib
 
 # Local imports
-from .settings import N_CODE_SERVERS, SERVER_POOL_PORT
-from .grader import Grader
+from .settings import (
+    N_CODE_SERVERS, SERVER_POOL_PORT, SERVER_TIMEOUT, CODE_SERVER_FORK,
+    MAX_RESULT_WAIT, WAIT_FOR_RESULT, CODE_SERVER_NODES, CODE_SERVERS_MAX,
+    SUPERVISOR_INTERVAL, JOB_MAX_RETRIES, WORKER_HANG_TIMEOUT, WORKER_MAX_JOBS,
+    WORKER_CANCEL_GRACE,
+    WORKER_MAX_RSS_MB, CODE_SERVER_PARTITIONS, CODE_SERVER_BORROW,
+    CODE_SERVER_FAIR_QUEUING, CODE_SERVER_USER_MAX_JOBS, CODE_SERVER_RECORD,
+    CODE_SERVER_JOURNAL, RESULT_STORE_TTL, CODE_SERVER_CLIENT_POOL_SIZE,
+    CODE_SERVER_GZIP_SIZE
+)
+from .grader import Grader, JobCancelled
+from .language_registry import get_registry
+from .result_store import create_result_store
+from .grade_cache import GradeCache
+from .autoscaler import Autoscaler
+from .resource_usage import ResourceStats, kill_children
+from .metrics import JobMetrics
+from .scheduler import DEFAULT_PRIORITY
+from .partitions import Partitions
+from .recorder import Recorder
+from .journal import Journal
+from . import worker_stats
 
 
 MY_DIR = abspath(dirname(__file__))
 
+# Whether the code server is evaluating a job, and the child evaluating it
+# if the code server forks, for the handler of the cancel signal.  In the
+# child `_forked` is True.
+_evaluating = False
+_child_pid = None
+_forked = False
+
 
 # Private Protocol ##########
 def run_as_nobody():
@@ -47,148 +86,1205 @@ def run_as_nobody():
     os.seteuid(nobody.pw_uid)
 
 
-def check_code(pid, job_queue, results):
-    """Check the code, this runs forever.
+def preload_modules():
+    """Import the evaluator classes and their heavy dependencies (nose,
+    numpy) so that the first job, and the children forked from this
+    process, start warm.  Return the evaluators which could not be
+    imported, see `_LanguageRegistry.preload`.
     """
+    import nose.tools  # noqa: F401
+    return get_registry().preload()
+
+
+def cancelled_result():
+    """Return the result of a cancelled job as a json string."""
+    return json.dumps(dict(
+        success=False, weight=0.0, error=['The job was cancelled.'],
+        cancelled=True
+    ))
+
+
+def _cancel_job(signum, frame):
+    """Stop the job being evaluated, on SIGUSR1 from the server pool.
+
+    The processes the job started are killed.  A forked child then exits
+    right away.  Otherwise `JobCancelled` is raised in the job, which the
+    code of the submission may catch, so the server pool replaces a code
+    server which does not report the job done soon after.
+    """
+    if _child_pid is not None:
+        try:
+            os.kill(_child_pid, signal.SIGUSR1)
+        except OSError:
+            pass
+    elif _evaluating:
+        kill_children()
+        if _forked:
+            os._exit(1)
+        raise JobCancelled('The job was cancelled.')
+
+
+def rejected_result(max_jobs):
+    """Return the result of a job rejected as its user had `max_jobs` jobs
+    queued or running, as a json string.
+    """
+    return json.dumps(dict(
+        success=False, weight=0.0, rejected=True,
+        error=['You have %d answers being checked already, please wait for '
+               'their results before submitting again.' % max_jobs]
+    ))
+
+
+def _job_user(job):
+    """Return the user directory of a job of the server pool."""
+    return job[2]
+
+
+def evaluate_code(json_data, user_dir):
+    """Grade the given job and return the result as a json string."""
+    data = json.loads(json_data)
+    grader = Grader(user_dir)
+    result = grader.evaluate(data)
+    return json.dumps(result)
+
+
+def _read_from_child(fd, child_pid):
+    """Read the result written by a forked child on `fd`.
+
+    The child is killed if it does not finish well after the grader's own
+    timeout. Returns the data read, the exit code of the child and its
+    resource usage.
+    """
+    chunks = []
+    deadline = time.time() + SERVER_TIMEOUT + 2
+    with os.fdopen(fd, 'rb') as reader:
+        while True:
+            remaining = deadline - time.time()
+            ready, _, _ = select.select([reader], [], [], max(remaining, 0))
+            if not ready:
+                try:
+                    os.kill(child_pid, signal.SIGKILL)
+                except OSError:
+                    pass
+                break
+            chunk = os.read(reader.fileno(), 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    _, status, rusage = os.wait4(child_pid, 0)
+    if os.WIFSIGNALED(status):
+        exit_code = -os.WTERMSIG(status)
+    else:
+        exit_code = os.WEXITSTATUS(status)
+    return b''.join(chunks).decode('utf-8'), exit_code, rusage
+
+
+def fork_and_evaluate(json_data, user_dir):
+    """Evaluate the job in a short-lived child forked from this (warm)
+    process, so the child shares the already imported modules copy-on-write
+    and any state left behind by the student's code dies with it.
+
+    The child also hands back its worker counters, which this process takes
+    over.  A cancel signal is passed on to the child, which exits.
+    """
+    global _evaluating, _child_pid, _forked
+    read_fd, write_fd = os.pipe()
+    child_pid = os.fork()
+    if child_pid == 0:
+        os.close(read_fd)
+        exit_code = 1
+        try:
+            _forked = True
+            _evaluating = True
+            result = evaluate_code(json_data, user_dir)
+            payload = json.dumps(dict(
+                result=result, stats=worker_stats.snapshot()
+            ))
+            with os.fdopen(write_fd, 'wb') as writer:
+                writer.write(payload.encode('utf-8'))
+            exit_code = 0
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else 0
+        finally:
+            os._exit(exit_code)
+    _child_pid = child_pid
+    os.close(write_fd)
+    try:
+        payload, exit_code, rusage = _read_from_child(read_fd, child_pid)
+    finally:
+        _child_pid = None
+    if not payload:
+        return json.dumps(dict(
+            success=False, weight=0.0,
+            error=['Process ended with exit code %s.' % exit_code]
+        ))
+    payload = json.loads(payload)
+    worker_stats.replace(payload['stats'])
+    result = json.loads(payload['result'])
+    resources = result.get('resources')
+    if resources:
+        # The answer ran in the child, so its peak RSS is the job's.
+        resources['max_rss_kb'] = max(resources['max_rss_kb'],
+                                      rusage.ru_maxrss)
+    return json.dumps(result)
+
+
+def _rss_mb():
+    """Return the resident memory of this process in MB."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / (1024.0 * 1024)
+    except (IOError, OSError, ValueError, IndexError):
+        # The peak, in KB on Linux, is all there is elsewhere.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def check_code(pid, job_queue, status_queue, fork=False, max_jobs=0,
+               max_rss_mb=0):
+    """Check the code, this runs till the code server is recycled.
+
+    The status of each job, the counters of this process and its resident
+    memory are reported to the server pool on the `status_queue`.  If
+    `fork` is True, each job is evaluated in a child forked from this
+    process.  The evaluators are preloaded first either way.  The code server
+    stops when it gets None instead of a job.  After `max_jobs` jobs, or
+    once its memory exceeds `max_rss_mb` after a job, it asks the server
+    pool to be recycled before reporting the result of the job, so that the
+    pool does not give it another job, and waits for the None.
+
+    On SIGUSR1 the job being evaluated is cancelled: it is stopped as if it
+    timed out.
+    """
+    global _evaluating
+    signal.signal(signal.SIGUSR1, _cancel_job)
+    preload_modules()
+    jobs = 0
     while True:
-        uid, json_data, user_dir = job_queue.get(True)
-        results[uid] = dict(status='running', pid=pid, result=None)
-        data = json.loads(json_data)
-        grader = Grader(user_dir)
-        result = grader.evaluate(data)
-        results[uid] = dict(status='done', result=json.dumps(result))
+        job = job_queue.get(True)
+        if job is None:
+            # The server pool is shrinking.
+            break
+        uid, json_data, user_dir = job
+        status_queue.put(
+            ('result', uid, dict(status='running', pid=pid, result=None))
+        )
+        try:
+            if fork:
+                result = fork_and_evaluate(json_data, user_dir)
+            else:
+                _evaluating = True
+                result = evaluate_code(json_data, user_dir)
+        except JobCancelled:
+            result = cancelled_result()
+        finally:
+            _evaluating = False
+        jobs += 1
+        rss_mb = _rss_mb()
+        status_queue.put(('rss', pid, rss_mb))
+        recycle = None
+        if max_jobs and jobs >= max_jobs:
+            recycle = 'jobs'
+        elif max_rss_mb and rss_mb > max_rss_mb:
+            recycle = 'memory'
+        if recycle:
+            status_queue.put(('recycle', pid, recycle))
+        status_queue.put(
+            ('result', uid, dict(status='done', pid=pid, result=result))
+        )
+        status_queue.put(('stats', pid, worker_stats.snapshot()))
+
+
+###############################################################################
+# `JobServer` class.
+###############################################################################
+class JobServer(object):
+    """Serves the http API of the code server: jobs are submitted to it and
+    their results are kept in a result store till they are fetched.  The
+    `ServerPool` and the `Coordinator` of several pools are job servers.
+    """
+    def __init__(self, port):
+        self.results = create_result_store()
+        self.resource_stats = ResourceStats()
+        self.metrics = JobMetrics()
+        # uid -> futures of the requests waiting for the job to finish.
+        self.waiters = defaultdict(list)
+        self.my_port = port
+        self.ioloop = None
+        self.app = self._make_app()
+
+    def _make_app(self):
+        app = Application([
+            (r"/batch", BatchHandler, dict(server=self)),
+            (r"/batch/results", BatchResultHandler, dict(server=self)),
+            (r"/resources", ResourceHandler, dict(server=self)),
+            (r"/metrics", MetricsHandler, dict(server=self)),
+            (r"/.*", MainHandler, dict(server=self)),
+        ])
+        # Bind right away so that clients can connect before `run` starts
+        # the IOLoop, which may happen in another thread.
+        self.sockets = bind_sockets(self.my_port)
+        return app
+
+    def _notify_waiters(self, uid, result):
+        """Hand a finished result over to the requests waiting for it."""
+        waiters = self.waiters.pop(uid, [])
+        if waiters:
+            self._pop_result(uid)
+        for future in waiters:
+            if not future.done():
+                future.set_result(result)
+
+    def _finish_job(self, json_result, run_time=None):
+        """Add a graded job to the per question sums of resources and to
+        the metrics.
+        """
+        try:
+            data = json.loads(json_result)
+            resources = data.get('resources') or {}
+        except (ValueError, TypeError, AttributeError):
+            data, resources = {}, {}
+        self.resource_stats.add(resources)
+        language = resources.get('language') or 'unknown'
+        test_case_type = resources.get('test_case_type') or 'unknown'
+        self.metrics.completed.inc(
+            language=language, test_case_type=test_case_type
+        )
+        if run_time is not None:
+            self.metrics.run_time.observe(
+                run_time, language=language, test_case_type=test_case_type
+            )
+        for error in data.get('error') or []:
+            if isinstance(error, dict) and \
+                    error.get('exception') == 'TimeoutException':
+                self.metrics.timeouts.inc(language=language)
+                break
+
+    def _update_gauges(self):
+        """Set the gauges of the metrics, before they are served."""
+        store = self.results.stats()
+        self.metrics.results.set(store['size'])
+        for reason, count in store['evictions'].items():
+            self.metrics.evictions.set(count, reason=reason)
+
+    # Public Protocol ##########
+
+    def get_status_text(self):
+        raise NotImplementedError("get_status_text method not implemented")
+
+    def get_status_dict(self):
+        raise NotImplementedError("get_status_dict method not implemented")
+
+    def submit(self, uid, json_data, user_dir, priority=DEFAULT_PRIORITY,
+               supersede=None):
+        raise NotImplementedError("submit method not implemented")
+
+    def cancel(self, uid, queued_only=False):
+        raise NotImplementedError("cancel method not implemented")
+
+    def get_resource_stats(self):
+        """Return the resources used to grade the jobs of each question."""
+        return self.resource_stats.stats()
+
+    def get_metrics(self):
+        """Return the registry of the metrics, with the gauges updated."""
+        self._update_gauges()
+        return self.metrics.registry
+
+    def submit_batch(self, jobs, priority=DEFAULT_PRIORITY):
+        """Submit many jobs with the same priority, `jobs` is a sequence of
+        (uid, json_data, user_dir).
+        """
+        for uid, json_data, user_dir in jobs:
+            self.submit(str(uid), json_data, user_dir, priority)
+
+    def _set_cancelled(self, uid):
+        result = dict(status='done', result=cancelled_result())
+        self.results.set(uid, result)
+        self._notify_waiters(uid, result)
+
+    def _pop_result(self, uid):
+        """Forget a result handed over to a client."""
+        self.results.pop(uid)
+
+    def _fetch_result(self, uid):
+        result = self.results.get(uid, dict(status='unknown'))
+        if result.get('status') == 'done':
+            self._pop_result(uid)
+        return result
+
+    def get_result(self, uid):
+        return json.dumps(self._fetch_result(uid))
+
+    def get_results(self, uids):
+        """Return a dict with the result of each of the given jobs."""
+        return {uid: self._fetch_result(uid) for uid in uids}
+
+    async def _wait_for_result(self, uid, timeout):
+        result = self.results.get(uid, dict(status='unknown'))
+        if result.get('status') not in ('not started', 'running'):
+            return self._fetch_result(uid)
+        future = Future()
+        self.waiters[uid].append(future)
+        try:
+            return await gen.with_timeout(timedelta(seconds=timeout), future)
+        except gen.TimeoutError:
+            return self._fetch_result(uid)
+        finally:
+            if future in self.waiters.get(uid, []):
+                self.waiters[uid].remove(future)
+                if not self.waiters[uid]:
+                    del self.waiters[uid]
+
+    async def wait_for_result(self, uid, timeout):
+        """Wait till the job is done or `timeout` seconds have passed and
+        return the result as `get_result` does.
+        """
+        result = await self._wait_for_result(uid, timeout)
+        return json.dumps(result)
+
+    async def wait_for_results(self, uids, timeout):
+        """Wait till all the jobs are done or `timeout` seconds have passed
+        and return the results as `get_results` does.
+        """
+        deadline = time.time() + timeout
+        results = {}
+        for uid in uids:
+            remaining = max(deadline - time.time(), 0)
+            if remaining > 0:
+                results[uid] = await self._wait_for_result(uid, remaining)
+            else:
+                results[uid] = self._fetch_result(uid)
+        return results
 
 
 ###############################################################################
 # `ServerPool` class.
 ###############################################################################
-class ServerPool(object):
+class ServerPool(JobServer):
     """Manages a pool of processes checking code."""
-    def __init__(self, n, pool_port=50000):
+    def __init__(self, n, pool_port=50000, fork=CODE_SERVER_FORK,
+                 max_n=CODE_SERVERS_MAX, max_jobs=WORKER_MAX_JOBS,
+                 max_rss_mb=WORKER_MAX_RSS_MB,
+                 partitions=CODE_SERVER_PARTITIONS, borrow=CODE_SERVER_BORROW,
+                 fair=CODE_SERVER_FAIR_QUEUING,
+                 user_max_jobs=CODE_SERVER_USER_MAX_JOBS,
+                 record=CODE_SERVER_RECORD, journal=CODE_SERVER_JOURNAL):
         """Create a pool of servers.
 
         Parameters
         ----------
 
         n : int
-            Number of code servers to run
+            Number of code servers to run, the least number if the pool
+            scales.
 
         pool_port : int
             Port at which the server pool should serve.
+
+        fork : bool
+            If True, each code server preloads the evaluators and forks a
+            fresh child to evaluate every job.
+
+        max_n : int
+            Most code servers to run, the pool is scaled with the load
+            between `n` and `max_n` code servers if `max_n` is larger.
+
+        max_jobs : int
+            Jobs after which a code server is replaced, 0 for no limit.
+
+        max_rss_mb : int
+            Resident memory in MB above which a code server is replaced
+            after a job, 0 for no limit.
+
+        partitions : list
+            Partitions of the code servers by language as ``name:weight``,
+            see `partitions.Partitions`.
+
+        borrow : bool
+            If True, a code server with no jobs of its partition queued runs
+            the jobs of the others.
+
+        fair : bool
+            If True, the jobs of each priority are run in turns per user
+            directory.
+
+        user_max_jobs : int
+            Most exam or exercise jobs of a user directory queued or running,
+            further jobs are rejected; 0 for no limit.
+
+        record : str
+            Path of a gzip file to which the jobs submitted and their
+            results are appended, see `recorder.Recorder`; empty to not
+            record them.
+
+        journal : str
+            Path of a SQLite database in which the jobs and results are
+            kept, see `journal.Journal`.  The pool queues the unfinished
+            jobs in it again and serves its results.  Empty to keep them
+            in memory only.
         """
         self.n = n
-        self.manager = Manager()
-        self.results = self.manager.dict()
-        self.my_port = pool_port
-
-        self.job_queue = Queue()
-        processes = []
-        for i in range(n):
-            p = self._make_process(i)
-            processes.append(p)
-        self.processes = processes
-        self.app = self._make_app()
+        self.fork = fork
+        self.autoscaler = Autoscaler(n, max_n)
+        self.grade_cache = GradeCache()
+        # uid -> grade cache key of the jobs which are being evaluated.
+        self.cache_keys = {}
+        # pid -> latest counters reported by that code server.
+        self.worker_stats = {}
 
-    def _make_app(self):
-        app = Application([
-            (r"/.*", MainHandler, dict(server=self)),
-        ])
-        app.listen(self.my_port)
-        return app
+        self.partitions = Partitions(partitions, borrow,
+                                     key=_job_user if fair else None)
+        self.user_max_jobs = user_max_jobs
+        # User directory -> number of its jobs counted against the limit,
+        # and uid -> user directory of those jobs.
+        self.user_jobs = Counter()
+        self.job_users = {}
+        self.recorder = Recorder(record) if record else None
+        self.journal = Journal(journal) if journal else None
+        # The queues of the default partition, the only one unless
+        # partitions are configured.
+        self.scheduler = self.partitions.default.scheduler
+        # pid -> queue on which the code server receives its jobs.
+        self.job_queues = {}
+        # pids of the code servers waiting for a job.
+        self.idle = set()
+        # pid -> time at which the code server became idle.
+        self.idle_since = {}
+        # pid -> uid of the job the code server was given.
+        self.running = {}
+        # uid -> time at which the running job was given to a code server.
+        self.started = {}
+        # uid -> (job, priority, partition) of the running jobs, to queue
+        # them again.
+        self.in_flight = {}
+        # uid -> number of times the job was queued again.
+        self.retries = Counter()
+        # uid -> time at which the running job was cancelled, its result is
+        # dropped.
+        self.cancelled = {}
+        # Supersede key -> uid of the queued job submitted with it, and back.
+        self.supersede_uids = {}
+        self.supersede_keys = {}
+        self.max_retries = JOB_MAX_RETRIES
+        self.hang_timeout = WORKER_HANG_TIMEOUT
+        self.cancel_grace = WORKER_CANCEL_GRACE
+        self.supervisor_interval = SUPERVISOR_INTERVAL
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        # pid -> resident memory in MB of the code server after its last
+        # job.
+        self.rss = {}
+        self.status_queue = Queue()
+        # pid -> code server process, pids are not reused.
+        self.processes = {}
+        pid = 0
+        for name, share in self.partitions.shares(n).items():
+            for i in range(share):
+                self.processes[pid] = self._make_process(pid)
+                self.partitions.add(pid, self.partitions.partitions[name])
+                pid += 1
+        self.next_pid = n
+        # Code servers which were told to stop and have not exited yet.
+        self.retired = []
+        # language/test_case_type -> why its evaluator could not be
+        # imported, known once the pool runs.
+        self.unavailable = {}
+        super(ServerPool, self).__init__(pool_port)
+        if self.journal is not None:
+            self._recover()
 
     def _make_process(self, pid):
+        self.job_queues[pid] = Queue()
         return Process(
-            target=check_code, args=(pid, self.job_queue, self.results)
+            target=check_code,
+            args=(pid, self.job_queues[pid], self.status_queue, self.fork,
+                  self.max_jobs, self.max_rss_mb)
         )
 
     def _start_code_servers(self):
-        for proc in self.processes:
+        for pid, proc in self.processes.items():
             if proc.pid is None:
                 proc.start()
+                self._set_idle(pid)
+        self._dispatch()
+
+    def _set_idle(self, pid):
+        self.idle.add(pid)
+        self.idle_since[pid] = time.time()
+
+    def _dispatch(self):
+        """Give the waiting jobs to the idle code servers, each partition's
+        in the order of its scheduler.
+        """
+        while self.idle:
+            pid, partition = self.partitions.match(self.idle)
+            if pid is None:
+                break
+            job, priority, wait = partition.scheduler.pop()
+            self.autoscaler.record_wait(wait)
+            self.metrics.queue_wait.observe(wait, priority=priority)
+            self.metrics.partition_wait.observe(wait,
+                                                partition=partition.name)
+            partition.record_start(wait)
+            owner = self.partitions.owner(pid)
+            if owner is not partition:
+                partition.borrowed += 1
+                owner.lent += 1
+                self.metrics.borrowed.inc(partition=partition.name)
+            self._forget_supersede(job[0])
+            self.idle.remove(pid)
+            del self.idle_since[pid]
+            self.running[pid] = job[0]
+            self.started[job[0]] = time.time()
+            self.in_flight[job[0]] = (job, priority, partition)
+            if self.journal is not None:
+                self.journal.start(job[0])
+            self.job_queues[pid].put(job)
+
+    def _autoscale(self):
+        """Add or stop code servers as the autoscaler decides."""
+        now = time.time()
+        n_servers = len(self.processes)
+        target = self.autoscaler.decide(
+            n_servers, len(self.partitions), self.partitions.oldest_wait(),
+            [now - since for since in self.idle_since.values()], now
+        )
+        for i in range(target - n_servers):
+            self._add_code_server()
+        if target < n_servers:
+            # Stop the code servers idle for longest, but not the last one
+            # of a partition.
+            longest_idle = sorted(self.idle, key=self.idle_since.get)
+            for pid in longest_idle:
+                if n_servers <= target:
+                    break
+                if len(self.partitions.owner(pid).pids) > 1:
+                    self._retire_code_server(pid)
+                    n_servers -= 1
+        self._dispatch()
+
+    def _add_code_server(self, partition=None):
+        """Start a code server for the given partition, or for the one
+        needing it most.
+        """
+        pid = self.next_pid
+        self.next_pid += 1
+        self.partitions.add(pid, partition or self.partitions.neediest())
+        proc = self.processes[pid] = self._make_process(pid)
+        proc.start()
+        self._set_idle(pid)
+
+    def _retire_code_server(self, pid):
+        """Tell an idle code server to stop."""
+        self.idle.discard(pid)
+        del self.idle_since[pid]
+        self.retired.append(self.processes.pop(pid))
+        self.job_queues.pop(pid).put(None)
+        self.rss.pop(pid, None)
+        self.partitions.remove(pid)
+
+    def _read_status_queue(self):
+        """Hand the status updates sent by the code servers over to the
+        IOLoop, this runs in its own thread.
+        """
+        while True:
+            item = self.status_queue.get(True)
+            if item is None:
+                break
+            kind, key, value = item
+            if kind == 'result':
+                self.ioloop.add_callback(self._update_result, key, value)
+            elif kind == 'stats':
+                self.ioloop.add_callback(self._update_stats, key, value)
+            elif kind == 'rss':
+                self.ioloop.add_callback(self._update_rss, key, value)
+            elif kind == 'recycle':
+                self.ioloop.add_callback(self._recycle_code_server, key,
+                                         value)
+
+    def _update_stats(self, pid, stats):
+        self.worker_stats[pid] = stats
+
+    def _update_rss(self, pid, rss_mb):
+        if pid in self.processes:
+            self.rss[pid] = rss_mb
+        self.metrics.worker_rss.observe(rss_mb)
+
+    def _recycle_code_server(self, pid, reason):
+        """Stop a code server which asked to be recycled and start a new
+        one.  The result of its last job follows and is handled as that of
+        any other job, while the new code server takes the next queued job.
+        """
+        if pid not in self.processes:
+            return
+        partition = self.partitions.owner(pid)
+        self.partitions.remove(pid)
+        self.retired.append(self.processes.pop(pid))
+        self.job_queues.pop(pid).put(None)
+        self.rss.pop(pid, None)
+        self.idle.discard(pid)
+        self.idle_since.pop(pid, None)
+        # The job is done, so the supervisor need not watch it.
+        self.running.pop(pid, None)
+        self.metrics.recycled.inc(reason=reason)
+        self._add_code_server(partition)
+        self._dispatch()
+
+    def _forget_supersede(self, uid):
+        key = self.supersede_keys.pop(uid, None)
+        if key is not None and self.supersede_uids.get(key) == uid:
+            del self.supersede_uids[key]
+
+    def _cancel(self, uid, reason, queued_only):
+        for partition in self.partitions:
+            if partition.scheduler.remove(lambda job: job[0] == uid):
+                self._forget_supersede(uid)
+                self._release_user(uid)
+                self.cache_keys.pop(uid, None)
+                self.retries.pop(uid, None)
+                self.metrics.cancelled.inc(reason=reason, state='queued')
+                self._forget_recorded(uid)
+                self._set_cancelled(uid)
+                return True
+        if queued_only or uid in self.cancelled:
+            return False
+        pids = [pid for pid, running in self.running.items()
+                if running == uid]
+        if not pids:
+            return False
+        self.cancelled[uid] = time.time()
+        self.cache_keys.pop(uid, None)
+        self.metrics.cancelled.inc(reason=reason, state='running')
+        self._forget_recorded(uid)
+        self._set_cancelled(uid)
+        try:
+            os.kill(self.processes[pids[0]].pid, signal.SIGUSR1)
+        except OSError:
+            # The supervisor restarts the code server.
+            pass
+        return True
+
+    def _record_result(self, uid, json_result):
+        if self.recorder is not None:
+            self.recorder.record_result(uid, json_result)
+
+    def _journal_result(self, uid, json_result):
+        if self.journal is not None:
+            self.journal.finish(uid, json_result)
+
+    def _set_cancelled(self, uid):
+        super(ServerPool, self)._set_cancelled(uid)
+        self._journal_result(uid, cancelled_result())
+
+    def _pop_result(self, uid):
+        super(ServerPool, self)._pop_result(uid)
+        if self.journal is not None:
+            self.journal.forget(uid)
+
+    def _evict_expired(self):
+        self.results.evict_expired()
+        if self.journal is not None:
+            self.journal.expire(RESULT_STORE_TTL)
+
+    def _enqueue(self, uid, json_data, user_dir, priority, key, limited):
+        """Queue a job, `key` is its grade cache key and `limited` says if
+        it counts against the limit of jobs of its user.
+        """
+        if key is not None:
+            self.cache_keys[uid] = key
+        if limited:
+            self.user_jobs[user_dir] += 1
+            self.job_users[uid] = user_dir
+        self.results.set(uid, dict(status='not started'))
+        partition = self.partitions.route(json_data)
+        partition.scheduler.put((uid, json_data, user_dir), priority)
+
+    def _recover(self):
+        """Serve the results kept in the journal and queue its unfinished
+        jobs again, left there by the previous run of the pool.
+        """
+        for uid, json_result, updated in self.journal.finished(
+                RESULT_STORE_TTL):
+            self.results.set(uid, dict(status='done', result=json_result),
+                             updated)
+            self.metrics.recovered.inc(state='done')
+        for uid, json_data, user_dir, priority, state in \
+                self.journal.unfinished():
+            if priority not in self.scheduler.priorities:
+                priority = DEFAULT_PRIORITY
+            limited = self.user_max_jobs and user_dir and \
+                priority != 'background'
+            key = self.grade_cache.make_key(json_data)
+            self._enqueue(uid, json_data, user_dir, priority, key, limited)
+            self.metrics.recovered.inc(state=state)
+
+    def _forget_recorded(self, uid):
+        if self.recorder is not None:
+            self.recorder.forget(uid)
 
-    def _handle_dead_process(self, result):
-        if result.get('status') == 'running':
-            pid = result.get('pid')
-            proc = self.processes[pid]
+    def _release_user(self, uid):
+        user_dir = self.job_users.pop(uid, None)
+        if user_dir is not None:
+            self.user_jobs[user_dir] -= 1
+            if not self.user_jobs[user_dir]:
+                del self.user_jobs[user_dir]
+
+    def _release_code_server(self, pid, uid):
+        """Give a new job to the code server which finished `uid`."""
+        if self.running.get(pid) == uid:
+            del self.running[pid]
+            self._set_idle(pid)
+            self._dispatch()
+
+    def _update_result(self, uid, result):
+        if uid in self.cancelled:
+            # The job was cancelled while it ran, its result is not wanted.
+            if result.get('status') == 'done':
+                del self.cancelled[uid]
+                self._release_user(uid)
+                self.started.pop(uid, None)
+                self.in_flight.pop(uid, None)
+                self.retries.pop(uid, None)
+                self._release_code_server(result.get('pid'), uid)
+            return
+        self.results.set(uid, result)
+        if result.get('status') == 'done':
+            key = self.cache_keys.pop(uid, None)
+            if key is not None:
+                self.grade_cache.set(key, result['result'])
+            started = self.started.pop(uid, None)
+            self.in_flight.pop(uid, None)
+            self.retries.pop(uid, None)
+            self._release_user(uid)
+            self._record_result(uid, result['result'])
+            self._journal_result(uid, result['result'])
+            self._finish_job(
+                result['result'],
+                None if started is None else time.time() - started
+            )
+            self._notify_waiters(uid, result)
+            self._release_code_server(result.get('pid'), uid)
+
+    def _supervise(self):
+        """Restart the code servers which died or hung, so that the pool
+        does not run short of code servers and no request waits on a job
+        which will never finish.  A code server which does not fork and
+        still runs a job `cancel_grace` seconds after it was cancelled is
+        restarted too.  Runs periodically on the IOLoop.
+        """
+        now = time.time()
+        for pid, proc in list(self.processes.items()):
+            uid = self.running.get(pid)
             if not proc.is_alive():
-                # If the processes is dead, something bad happened so
-                # restart that process.
-                new_proc = self._make_process(pid)
-                self.processes[pid] = new_proc
-                new_proc.start()
-                result['status'] = 'done'
-                result['result'] = json.dumps(dict(
-                    success=False, weight=0.0,
-                    error=['Process ended with exit code %s.'
-                           % proc.exitcode]
-                ))
+                self._restart_worker(pid, 'died', now)
+            elif uid is not None and \
+                    now - self.started[uid] > self.hang_timeout:
+                proc.kill()
+                proc.join()
+                self._restart_worker(pid, 'hung', now)
+            elif uid in self.cancelled and not self.fork and \
+                    now - self.cancelled[uid] > self.cancel_grace:
+                proc.kill()
+                proc.join()
+                self._restart_worker(pid, 'cancelled', now)
+        # is_alive reaps the code servers which exited.
+        self.retired = [proc for proc in self.retired if proc.is_alive()]
+        self._dispatch()
+
+    def _restart_worker(self, pid, reason, now):
+        """Replace the dead code server `pid` and queue its job again, or
+        fail it if it hung or was retried too often.
+        """
+        proc = self.processes[pid]
+        new_proc = self.processes[pid] = self._make_process(pid)
+        new_proc.start()
+        self.rss.pop(pid, None)
+        self.metrics.worker_restarts.inc(reason=reason)
+        uid = self.running.pop(pid, None)
+        self._set_idle(pid)
+        if reason == 'hung':
+            # The code server was of no use once the job should have timed
+            # out.
+            started = self.started[uid]
+            lost = max(now - started - SERVER_TIMEOUT, 0.0)
+        elif reason == 'cancelled':
+            lost = now - self.cancelled[uid]
+        else:
+            # It died since the previous check, half the interval on average.
+            lost = self.supervisor_interval / 2.0
+        self.metrics.capacity_lost.inc(lost)
+        if uid is None:
+            return
+        job, priority, partition = self.in_flight.pop(uid)
+        started = self.started.pop(uid)
+        if uid in self.cancelled:
+            del self.cancelled[uid]
+            self.retries.pop(uid, None)
+            self._release_user(uid)
+            return
+        if reason == 'died' and self.retries[uid] < self.max_retries:
+            self.retries[uid] += 1
+            self.metrics.requeued.inc()
+            self.results.set(uid, dict(status='not started'))
+            partition.scheduler.put(job, priority)
+            if self.journal is not None:
+                self.journal.accept(uid, job[1], job[2], priority)
+            return
+        self.retries.pop(uid, None)
+        self.cache_keys.pop(uid, None)
+        self._release_user(uid)
+        if reason == 'hung':
+            error = 'Process was killed after running for more than %d '\
+                    'seconds.' % self.hang_timeout
+        else:
+            error = 'Process ended with exit code %s.' % proc.exitcode
+        result = dict(status='done', result=json.dumps(dict(
+            success=False, weight=0.0, error=[error]
+        )))
+        self._record_result(uid, result['result'])
+        self._journal_result(uid, result['result'])
+        self._finish_job(result['result'], now - started)
+        self.results.set(uid, result)
+        self._notify_waiters(uid, result)
 
     # Public Protocol ##########
 
     def get_status(self):
         """Returns current job queue size, total number of processes alive.
         """
-        qs = sum(r['status'] == 'not started'
-                 for r in self.results.values())
-        alive = sum(p.is_alive() for p in self.processes)
-        n_running = sum(r['status'] == 'running'
-                        for r in self.results.values())
+        qs = len(self.partitions)
+        alive = sum(p.is_alive() for p in self.processes.values())
+        n_running = len(self.running)
 
         return qs, alive, n_running
 
-    def submit(self, uid, json_data, user_dir):
-        self.results[uid] = dict(status='not started')
-        self.job_queue.put((uid, json_data, user_dir))
+    def get_status_text(self):
+        q_size, alive, running = self.get_status()
+        store = self.results.stats()
+        depths = ", ".join(
+            "%s %d" % item for item in self.partitions.depths().items()
+        )
+        text = "%d processes, %d running, %d queued (%s), "\
+               "%d results stored, %d evicted" % (
+                   alive, running, q_size, depths, store['size'],
+                   sum(store['evictions'].values())
+               )
+        if self.autoscaler.enabled:
+            text += ", scaled %d times" % len(self.autoscaler.events)
+        return text
 
-    def get_result(self, uid):
-        result = self.results.get(uid, dict(status='unknown'))
-        self._handle_dead_process(result)
-        if result.get('status') == 'done':
-            self.results.pop(uid)
-        return json.dumps(result)
+    def get_status_dict(self):
+        q_size, alive, running = self.get_status()
+        return dict(
+            processes=alive, running=running, queued=q_size,
+            results=self.results.stats(), workers=self.get_worker_stats(),
+            rss_mb={str(pid): round(rss, 1) for pid, rss in self.rss.items()},
+            grade_cache=self.grade_cache.stats(),
+            scheduler=self.get_scheduler_stats(),
+            partitions=self.partitions.stats(),
+            autoscaler=self.autoscaler.stats(),
+            unavailable_evaluators=self.unavailable
+        )
+
+    def _update_gauges(self):
+        super(ServerPool, self)._update_gauges()
+        for priority, depth in self.partitions.depths().items():
+            self.metrics.queued.set(depth, priority=priority)
+        for partition in self.partitions:
+            self.metrics.partition_servers.set(len(partition.pids),
+                                               partition=partition.name)
+        self.metrics.running.set(len(self.running))
+        self.metrics.processes.set(
+            sum(p.is_alive() for p in self.processes.values())
+        )
+
+    def get_scheduler_stats(self):
+        """Return the stats of the schedulers of all the partitions."""
+        promoted = Counter()
+        for partition in self.partitions:
+            promoted.update(partition.scheduler.promoted)
+        submitters = sum(p.scheduler.submitters() for p in self.partitions)
+        return dict(self.scheduler.stats(), queued=self.partitions.depths(),
+                    promoted=dict(promoted), submitters=submitters,
+                    users_at_limit=sum(
+                        n >= self.user_max_jobs
+                        for n in self.user_jobs.values()
+                    ) if self.user_max_jobs else 0)
+
+    def get_worker_stats(self):
+        """Returns the sum of the counters reported by the code servers."""
+        total = Counter()
+        for stats in self.worker_stats.values():
+            total.update(stats)
+        return dict(total)
+
+    def submit(self, uid, json_data, user_dir, priority=DEFAULT_PRIORITY,
+               supersede=None):
+        """Queue a job with the given priority, one of
+        `scheduler.PRIORITIES`.  A ValueError is raised for an unknown
+        priority.
+
+        If `supersede` is given, a job queued earlier with the same key is
+        cancelled, as its result is not wanted any more.  An exam or
+        exercise job of a user directory with `user_max_jobs` jobs queued
+        or running is rejected, its result asks the user to wait.
+        """
+        if priority not in self.scheduler.priorities:
+            raise ValueError("Unknown priority %r." % (priority,))
+        self.metrics.submitted.inc(priority=priority)
+        if self.recorder is not None:
+            self.recorder.record_submit(uid, json_data, user_dir, priority)
+        if supersede:
+            old_uid = self.supersede_uids.get(supersede)
+            if old_uid is not None and old_uid != uid:
+                self._cancel(old_uid, 'superseded', queued_only=True)
+        key = self.grade_cache.make_key(json_data)
+        if key is not None:
+            cached = self.grade_cache.get(key)
+            if cached is not None:
+                # An identical job was graded already.
+                self.metrics.cache_hits.inc()
+                self.results.set(uid, dict(status='done', result=cached))
+                self._record_result(uid, cached)
+                self._journal_result(uid, cached)
+                return
+        limited = self.user_max_jobs and user_dir and \
+            priority != 'background'
+        if limited and self.user_jobs[user_dir] >= self.user_max_jobs:
+            self.metrics.rejected.inc(priority=priority)
+            result = rejected_result(self.user_max_jobs)
+            self.results.set(uid, dict(status='done', result=result))
+            self._record_result(uid, result)
+            self._journal_result(uid, result)
+            return
+        self._enqueue(uid, json_data, user_dir, priority, key, limited)
+        if self.journal is not None:
+            self.journal.accept(uid, json_data, user_dir, priority)
+        if supersede:
+            self.supersede_uids[supersede] = uid
+            self.supersede_keys[uid] = supersede
+        self._dispatch()
+
+    def cancel(self, uid, queued_only=False):
+        """Cancel a job: drop it if it is queued, or stop it if it runs
+        unless `queued_only`.  A running job is stopped as if it timed out
+        and the processes it started are killed.  A code server which does
+        not stop it within `cancel_grace` seconds is replaced.  The result
+        of a cancelled job says so.  Return True if the job was cancelled.
+        """
+        return self._cancel(uid, 'cancelled', queued_only)
 
     def run(self):
         """Run server which returns an available server port where code
         can be executed.
         """
         # We start the code servers here to ensure they are run as nobody.
+        self.ioloop = IOLoop.current()
+        # The code servers are forked from this process, so they start warm.
+        self.unavailable = preload_modules()
         self._start_code_servers()
-        IOLoop.current().start()
+        self.status_reader = Thread(target=self._read_status_queue)
+        self.status_reader.daemon = True
+        self.status_reader.start()
+        self.eviction_callback = PeriodicCallback(
+            self._evict_expired, 60 * 1000
+        )
+        self.eviction_callback.start()
+        self.worker_callback = PeriodicCallback(
+            self._supervise, self.supervisor_interval * 1000
+        )
+        self.worker_callback.start()
+        self.autoscale_callback = PeriodicCallback(
+            self._autoscale, self.autoscaler.interval * 1000
+        )
+        if self.autoscaler.enabled:
+            self.autoscale_callback.start()
+        self.http_server = HTTPServer(self.app, decompress_request=True)
+        self.http_server.add_sockets(self.sockets)
+        self.ioloop.start()
+
+    def _stop_code_servers(self):
+        processes = list(self.processes.values()) + self.retired
+        for proc in processes:
+            if proc.pid is not None:
+                proc.terminate()
+        for proc in processes:
+            if proc.pid is not None:
+                proc.join(2)
+                if proc.is_alive():
+                    proc.kill()
+                    proc.join()
+
+    async def _shutdown(self):
+        self.http_server.stop()
+        # Close the connections kept alive by clients, which would otherwise
+        # wait for an answer from a stopped IOLoop.
+        await self.http_server.close_all_connections()
+        self.eviction_callback.stop()
+        self.worker_callback.stop()
+        self.autoscale_callback.stop()
+        # The supervisor is stopped, so it cannot restart the code servers
+        # while they are being stopped.
+        self._stop_code_servers()
+        self.status_queue.put(None)
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.journal is not None:
+            self.journal.close()
+        self.ioloop.stop()
 
     def stop(self):
         """Stop all the code server processes.
         """
-        for proc in self.processes:
-            proc.terminate()
-        IOLoop.current().stop()
+        if self.ioloop is None:
+            self._stop_code_servers()
+            if self.journal is not None:
+                self.journal.close()
+        else:
+            self.ioloop.add_callback(self._shutdown)
 
 
 class MainHandler(RequestHandler):
     def initialize(self, server):
         self.server = server
 
-    def get(self):
+    async def get(self):
         path = self.request.path[1:]
         if len(path) == 0:
-            q_size, alive, running = self.server.get_status()
-            result = "%d processes, %d running, %d queued" % (
-                alive, running, q_size
-            )
-            self.write(result)
+            if self.get_argument('format', None) == 'json':
+                self.write(self.server.get_status_dict())
+            else:
+                self.write(self.server.get_status_text())
         else:
             uid = path
-            json_result = self.server.get_result(uid)
+            wait = min(float(self.get_argument('wait', 0)), MAX_RESULT_WAIT)
+            if wait > 0:
+                json_result = await self.server.wait_for_result(uid, wait)
+            else:
+                json_result = self.server.get_result(uid)
             self.write(json_result)
 
     def post(self):
+        """Accept a job as form fields, or with the job as the json body
+        and the other fields in the query, as the client functions send it.
+        """
         uid = self.get_argument('uid')
-        json_data = self.get_argument('json_data')
+        if self.request.headers.get('Content-Type', '').startswith(
+                'application/json'):
+            json_data = self.request.body.decode('utf-8')
+        else:
+            json_data = self.get_argument('json_data')
         user_dir = self.get_argument('user_dir')
-        self.server.submit(uid, json_data, user_dir)
+        priority = self.get_argument('priority', DEFAULT_PRIORITY)
+        supersede = self.get_argument('supersede', None)
+        try:
+            self.server.submit(uid, json_data, user_dir, priority, supersede)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+        self.write('OK')
+
+    def delete(self):
+        uid = self.request.path[1:]
+        queued_only = self.get_argument('queued_only', 'false') == 'true'
+        self.write(dict(cancelled=self.server.cancel(uid, queued_only)))
+
+
+class BatchHandler(RequestHandler):
+    """Accepts many jobs in one request, the body is a json object with a
+    'jobs' key holding a list of [uid, json_data, user_dir] and an optional
+    'priority' for all the jobs.
+    """
+    def initialize(self, server):
+        self.server = server
+
+    def post(self):
+        data = json.loads(self.request.body.decode('utf-8'))
+        priority = data.get('priority', DEFAULT_PRIORITY)
+        if priority not in self.server.scheduler.priorities:
+            raise HTTPError(400, "Unknown priority %r." % (priority,))
+        self.server.submit_batch(data['jobs'], priority)
         self.write('OK')
 
 
-def submit(url, uid, json_data, user_dir):
+class ResourceHandler(RequestHandler):
+    """Returns the resources used to grade the jobs of each question."""
+    def initialize(self, server):
+        self.server = server
+
+    def get(self):
+        self.write(self.server.get_resource_stats())
+
+
+class MetricsHandler(RequestHandler):
+    """Serves the metrics in the Prometheus text format, or as json with
+    `?format=json`.
+    """
+    def initialize(self, server):
+        self.server = server
+
+    def get(self):
+        registry = self.server.get_metrics()
+        if self.get_argument('format', None) == 'json':
+            self.write(registry.to_dict())
+        else:
+            self.set_header('Content-Type',
+                            'text/plain; version=0.0.4; charset=utf-8')
+            self.write(registry.to_prometheus())
+
+
+class BatchResultHandler(RequestHandler):
+    """Returns the results of many jobs, the body is a json object with a
+    'uids' key and an optional 'wait' in seconds for which the request is
+    held till all the jobs are done.
+    """
+    def initialize(self, server):
+        self.server = server
+
+    async def post(self):
+        data = json.loads(self.request.body.decode('utf-8'))
+        uids = [str(uid) for uid in data['uids']]
+        wait = min(float(data.get('wait', 0)), MAX_RESULT_WAIT)
+        if wait > 0:
+            results = await self.server.wait_for_results(uids, wait)
+        else:
+            results = self.server.get_results(uids)
+        self.write(json.dumps(results))
+
+
+# The session of the client functions of this process and the pid which
+# created it, a forked process creates its own.
+_session = None
+_session_pid = None
+
+
+def client_session():
+    """Return the session shared by the client functions, which keeps the
+    connections to the code server alive.
+    """
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=CODE_SERVER_CLIENT_POOL_SIZE)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _session, _session_pid = session, os.getpid()
+    return _session
+
+
+def encode_body(text, gzip_size=CODE_SERVER_GZIP_SIZE):
+    """Return the body and headers of a request carrying the json `text`,
+    gzipped if it is longer than `gzip_size` bytes.
+    """
+    body = text.encode('utf-8')
+    headers = {'Content-Type': 'application/json'}
+    if gzip_size and len(body) > gzip_size:
+        body = gzip.compress(body, compresslevel=1)
+        headers['Content-Encoding'] = 'gzip'
+    return body, headers
+
+
+def submit(url, uid, json_data, user_dir, priority=None, supersede=None):
     '''Submit a job to the code server.
 
     Parameters
@@ -205,13 +1301,49 @@ def submit(url, uid, json_data, user_dir):
 
     user_dir : str
         User directory.
+
+    priority : str
+        One of 'exam', 'exercise' or 'background', the server pool runs
+        jobs of higher priority first.  Defaults to 'exercise'.
+
+    supersede : str
+        Key of the job, a job queued earlier with the same key is cancelled.
     '''
-    requests.post(
-        url, data=dict(uid=uid, json_data=json_data, user_dir=user_dir)
-    )
+    params = dict(uid=uid, user_dir=user_dir)
+    if priority is not None:
+        params['priority'] = priority
+    if supersede is not None:
+        params['supersede'] = supersede
+    body, headers = encode_body(json_data)
+    client_session().post(url, params=params, data=body, headers=headers)
+
+
+def cancel(url, uid, queued_only=False):
+    '''Cancel a job submitted to the code server.
 
+    Returns True if the job was queued or running and is cancelled, its
+    result then says so.
 
-def get_result(url, uid, block=False):
+    Parameters
+    ----------
+
+    url : str
+        URL of the server pool.
+
+    uid : str
+        Unique ID of the submission.
+
+    queued_only : bool
+        Set to True to leave the job alone if it is running already.
+
+    '''
+    params = dict(queued_only='true') if queued_only else None
+    r = client_session().delete(urllib.parse.urljoin(url, str(uid)),
+                                params=params)
+    return json.loads(r.content.decode('utf-8'))['cancelled']
+
+
+def get_result(url, uid, block=False, wait=0):
     '''Get the status of a job submitted to the code server.
 
     Returns the result currently known in the form of a dict. The dictionary
@@ -231,19 +1363,116 @@ def get_result(url, uid, block=False):
     block : bool
         Set to True if you wish to block till result is done.
 
+    wait : float
+        Seconds for which the server may hold the request if the job is not
+        done yet.  The server replies as soon as the job is done.
+
     '''
-    def _get_data():
-        r = requests.get(urllib.parse.urljoin(url, str(uid)))
+    def _get_data(wait):
+        params = dict(wait=wait) if wait else None
+        r = client_session().get(urllib.parse.urljoin(url, str(uid)),
+                                 params=params)
         return json.loads(r.content.decode('utf-8'))
-    data = _get_data()
+    if block:
+        wait = WAIT_FOR_RESULT
+    data = _get_data(wait)
     if block:
         while data.get('status') != 'done':
-            time.sleep(0.1)
-            data = _get_data()
+            if data.get('status') == 'unknown':
+                time.sleep(0.1)
+            data = _get_data(wait)
 
     return data
 
 
+def submit_batch(url, jobs, priority=None):
+    '''Submit many jobs to the code server in one request.
+
+    Parameters
+    ----------
+
+    url : str
+        URL of the server pool.
+
+    jobs : list
+        List of (uid, json_data, user_dir) tuples, see `submit`.
+
+    priority : str
+        Priority of all the jobs, see `submit`.
+    '''
+    data = dict(jobs=[list(job) for job in jobs])
+    if priority is not None:
+        data['priority'] = priority
+    body, headers = encode_body(json.dumps(data))
+    client_session().post(urllib.parse.urljoin(url, 'batch'), data=body,
+                          headers=headers)
+
+
+def get_results(url, uids, block=False, wait=0):
+    '''Get the status of many jobs submitted to the code server.
+
+    Returns a dict mapping each uid to its result as returned by
+    `get_result`.
+
+    Parameters
+    ----------
+
+    url : str
+        URL of the server pool.
+
+    uids : list
+        Unique IDs of the submissions.
+
+    block : bool
+        Set to True if you wish to block till all the results are done.
+
+    wait : float
+        Seconds for which the server may hold the request if any of the jobs
+        is not done yet.
+
+    '''
+    def _get_data(uids, wait):
+        body = json.dumps(dict(uids=[str(uid) for uid in uids], wait=wait))
+        r = client_session().post(
+            urllib.parse.urljoin(url, 'batch/results'), data=body
+        )
+        return json.loads(r.content.decode('utf-8'))
+    if block:
+        wait = WAIT_FOR_RESULT
+    results = _get_data(uids, wait)
+    if block:
+        pending = [uid for uid, data in results.items()
+                   if data.get('status') != 'done']
+        while pending:
+            if all(results[uid].get('status') == 'unknown'
+                   for uid in pending):
+                time.sleep(0.1)
+            results.update(_get_data(pending, wait))
+            pending = [uid for uid in pending
+                       if results[uid].get('status') != 'done']
+
+    return results
+
+
+def get_resource_stats(url):
+    '''Get the resources used to grade the jobs of each question.
+
+    Returns a dict mapping each question id to the number of jobs graded,
+    the total and mean wall, user and system time, the longest wall time,
+    the peak RSS in kB and the wall time of each phase (compile, run,
+    compare).
+
+    Parameters
+    ----------
+
+    url : str
+        URL of the server pool.
+
+    '''
+    r = client_session().get(urllib.parse.urljoin(url, 'resources'))
+    return json.loads(r.content.decode('utf-8'))
+
+
 ###############################################################################
 def main(args=None):
     parser = ArgumentParser(description=__doc__)
@@ -255,13 +1484,46 @@ def main(args=None):
         '-p', '--port', dest='port', default=SERVER_POOL_PORT,
         help="Port at which the http server should run."
     )
+    parser.add_argument(
+        '-f', '--fork', dest='fork', action='store_true',
+        default=CODE_SERVER_FORK,
+        help="Evaluate every job in a child forked from a warm process."
+    )
+    parser.add_argument(
+        '-m', '--max', dest='max_n', type=int, default=CODE_SERVERS_MAX,
+        help="Most servers to run, the pool scales between n and this."
+    )
+    parser.add_argument(
+        '--nodes', dest='nodes', nargs='*', default=CODE_SERVER_NODES,
+        help="URLs of server pools to coordinate instead of running code "
+             "servers."
+    )
+    parser.add_argument(
+        '--record', dest='record', default=CODE_SERVER_RECORD,
+        help="Gzip file to append the jobs submitted and their results to, "
+             "for yaksh.replay."
+    )
+    parser.add_argument(
+        '--journal', dest='journal', default=CODE_SERVER_JOURNAL,
+        help="SQLite database keeping the jobs and results across restarts."
+    )
 
     options = parser.parse_args(args)
 
+    if options.nodes:
+        from .coordinator import Coordinator
+        coordinator = Coordinator(options.nodes, port=options.port)
+        coordinator.run()
+        return
+
     # Called before serverpool is created so that the multiprocessing
     # can work properly.
     run_as_nobody()
-    server_pool = ServerPool(n=options.n, pool_port=options.port)
+    server_pool = ServerPool(
+        n=options.n, pool_port=options.port, fork=options.fork,
+        max_n=options.max_n, record=options.record,
+        journal=options.journal
+    )
 
     server_pool.run()
 
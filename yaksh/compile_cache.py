@@ -0,0 +1,254 @@
+"""A cache of compiled submissions.
+
+An entry is keyed by a hash of everything the compilation depends on: the
+compiler command (without the paths), the source files and the keys of the
+entries it links against.  It holds the files the compiler produced along
+with its return code, stdout and stderr, so compilation errors are cached
+too.  Entries are evicted least recently used first once the cache grows
+beyond its size limit.
+
+By default each job gets a cache of its own, in a temporary directory which
+is removed when the job is done, so a submission is compiled once for all
+its test cases.  Setting `COMPILE_CACHE_DIR` shares one cache between all
+the jobs of the code servers on a machine.  The evaluated code runs as the
+same user as the code servers and could change the entries of that cache,
+and so the grades of other submissions, so it should only be shared where
+the submissions are trusted, as for benchmarks or regrading.
+"""
+from __future__ import unicode_literals
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+# Local imports
+from .settings import COMPILE_CACHE_DIR, COMPILE_CACHE_SIZE
+from . import worker_stats
+
+CWD_MARKER = '<yaksh-cwd>'
+# The cache shared by all jobs, enabled by `COMPILE_CACHE_DIR`.
+cache = None
+# The cache of the current job, if the shared cache is disabled.
+job_cache = None
+in_job = False
+
+
+def get_compile_cache():
+    global cache, job_cache
+    if cache is None:
+        cache = CompileCache()
+    if cache.enabled or not in_job:
+        return cache
+    if job_cache is None:
+        job_cache = CompileCache(
+            tempfile.mkdtemp(prefix='yaksh_compile_cache_'),
+            COMPILE_CACHE_SIZE
+        )
+    return job_cache
+
+
+def start_job():
+    global in_job
+    in_job = True
+
+
+def finish_job():
+    """Remove the cache of the job which is done."""
+    global in_job, job_cache
+    in_job = False
+    if job_cache is not None:
+        job_cache.clear()
+        job_cache = None
+
+
+def new_outputs(pattern):
+    """Return a callable listing the files matching `pattern` which were
+    created or modified since this call.  It is passed as the `outputs` of
+    `CompileCache.run` for compilers like javac, whose outputs depend on
+    the source.
+    """
+    before = dict((path, os.stat(path).st_mtime)
+                  for path in glob.glob(pattern))
+
+    def outputs():
+        return [path for path in glob.glob(pattern)
+                if before.get(path) != os.stat(path).st_mtime]
+    return outputs
+
+
+class CachedProcess(object):
+    """Stands in for the Popen object of a compilation served from the
+    cache.
+    """
+    def __init__(self, returncode):
+        self.returncode = returncode
+
+
+class CompileCache(object):
+    # The size of the cache is recounted at least this often, as the other
+    # code servers sharing it add entries too.
+    recount_interval = 60.0
+    # Eviction makes room for this fraction of the size limit, so that the
+    # next entries do not evict again right away.
+    low_water = 0.9
+
+    def __init__(self, cache_dir=COMPILE_CACHE_DIR,
+                 max_size=COMPILE_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size * 1024 * 1024
+        # Size of the entries as last counted plus those stored since, None
+        # till the cache is first counted.
+        self.size = None
+        self.counted_at = 0.0
+
+    @property
+    def enabled(self):
+        return bool(self.cache_dir) and self.max_size > 0
+
+    # Public Protocol ##########
+    def make_key(self, *parts, **kw):
+        """Return a key for the given strings or bytes.  The names and
+        contents of the files given by the `files` keyword argument are
+        included too, for the files a source may include.
+        """
+        digest = hashlib.sha256()
+        for part in parts:
+            if not isinstance(part, bytes):
+                part = part.encode('utf-8')
+            digest.update(hashlib.sha256(part).digest())
+        for path in sorted(self._walk(kw.get('files', ()))):
+            with open(path, 'rb') as f:
+                content = f.read()
+            digest.update(hashlib.sha256(path.encode('utf-8')).digest())
+            digest.update(hashlib.sha256(content).digest())
+        return digest.hexdigest()
+
+    def run(self, key, outputs, run_command, cmd_args, *args, **kw):
+        """Run the compiler unless a compilation with the same key is
+        cached.
+
+        `outputs` are the paths of the files produced by the compiler in
+        the current directory, or a callable which returns them once the
+        compiler has run.  `run_command` is the function used to run the
+        compiler, it is called with `cmd_args`, `args` and `kw` and must
+        return a tuple of (process, stdout, stderr), as does
+        `BaseEvaluator._run_command`.  The same tuple is returned, from the
+        cache on a hit.
+        """
+        if not self.enabled:
+            return run_command(cmd_args, *args, **kw)
+        entry = self._entry_path(key)
+        cached = self._load(entry)
+        if cached is not None:
+            worker_stats.incr('compile_cache_hits')
+            return cached
+        worker_stats.incr('compile_cache_misses')
+        proc, stdout, stderr = run_command(cmd_args, *args, **kw)
+        if callable(outputs):
+            outputs = outputs()
+        self._store(entry, outputs, proc.returncode, stdout, stderr)
+        return proc, stdout, stderr
+
+    def clear(self):
+        if self.cache_dir and os.path.isdir(self.cache_dir):
+            shutil.rmtree(self.cache_dir)
+        self.size = None
+
+    # Private Protocol ##########
+    def _walk(self, files):
+        for name in files:
+            if os.path.isfile(name):
+                yield name
+            elif os.path.isdir(name):
+                for root, dirs, filenames in os.walk(name):
+                    for filename in filenames:
+                        yield os.path.join(root, filename)
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _load(self, entry):
+        cwd = os.getcwd()
+        try:
+            with open(os.path.join(entry, 'meta.json')) as f:
+                meta = json.load(f)
+            for name in meta['outputs']:
+                shutil.copy2(os.path.join(entry, name),
+                             os.path.join(cwd, name))
+            # Mark the entry as recently used.
+            os.utime(entry, None)
+        except (IOError, OSError, ValueError):
+            return None
+        stdout = meta['stdout'].replace(CWD_MARKER, cwd)
+        stderr = meta['stderr'].replace(CWD_MARKER, cwd)
+        return CachedProcess(meta['returncode']), stdout, stderr
+
+    def _store(self, entry, outputs, returncode, stdout, stderr):
+        cwd = os.getcwd()
+        meta = dict(returncode=returncode, outputs=[],
+                    stdout=stdout.replace(cwd, CWD_MARKER),
+                    stderr=stderr.replace(cwd, CWD_MARKER))
+        try:
+            parent = os.path.dirname(entry)
+            if not os.path.isdir(parent):
+                os.makedirs(parent)
+            # Write into a temporary directory and rename it, so that other
+            # code servers never see a half written entry.
+            tmp_entry = tempfile.mkdtemp(dir=parent)
+            for output in outputs:
+                if os.path.isfile(output):
+                    name = os.path.basename(output)
+                    shutil.copy2(output, os.path.join(tmp_entry, name))
+                    meta['outputs'].append(name)
+            with open(os.path.join(tmp_entry, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            size = sum(f.stat().st_size for f in os.scandir(tmp_entry))
+            try:
+                os.rename(tmp_entry, entry)
+            except OSError:
+                # Another code server stored the same entry first.
+                shutil.rmtree(tmp_entry, ignore_errors=True)
+                size = 0
+            self._add_size(size)
+        except (IOError, OSError):
+            pass
+
+    def _add_size(self, size):
+        """Count a stored entry and evict entries if the cache is over its
+        size limit.  The cache is only walked when it is first used, when
+        the count goes over the limit and every `recount_interval` seconds.
+        """
+        now = time.time()
+        if self.size is None or now - self.counted_at > self.recount_interval:
+            self._evict(now)
+        else:
+            self.size += size
+            if self.size > self.max_size:
+                self._evict(now)
+
+    def _evict(self, now):
+        """Count the entries and remove the least recently used ones till
+        the cache fits in `low_water` of its size limit, if it is over the
+        limit.
+        """
+        entries = []
+        total = 0
+        for bucket in os.scandir(self.cache_dir):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                entries.append((entry.stat().st_mtime, size, entry.path))
+                total += size
+        if total > self.max_size:
+            entries.sort()
+            while total > self.max_size * self.low_water and entries:
+                _, size, path = entries.pop(0)
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+                worker_stats.incr('compile_cache_evictions')
+        self.size = total
+        self.counted_at = now
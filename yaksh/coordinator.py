@@ -0,0 +1,403 @@
+"""A coordinator spreading the jobs of the code server over several server
+pools, possibly on different machines.
+
+The coordinator serves the same http API as a `ServerPool`, so Django talks
+to it as it would to a single pool.  Every job is sent to the healthy pool
+with the least load, the number of queued and running jobs per code server
+as last reported by the pool's status page plus the jobs sent to it since.
+The pools keep scheduling the jobs by priority.
+
+The coordinator polls the pools for the results of the jobs it sent them and
+keeps each result till it is fetched.  A pool which fails `max_failures`
+requests in a row, health checks or jobs it could not be sent, is taken out
+and the jobs it had not finished are sent to the other pools.  A job which
+could not be sent is sent again right away.  A pool is put back once a
+health check succeeds.  Jobs wait in the coordinator while no pool is
+healthy.
+
+A job is cancelled in the coordinator if it waits there, or else by the
+pool it was sent to.  A job superseded by a newer one with the same key is
+only cancelled if it was not started, wherever it waits.  The key is sent
+with the job, so that the pool also knows it.
+
+The files of a question are only on the machine running Django, so the
+coordinator should run there too: it reads the files of each job and sends
+their contents with the job, and the grader of the pool writes them to a
+temporary directory.  The pools create the user directories of the jobs
+on their own machines.
+
+Usage::
+
+    $ yaksh -p 55555 --nodes http://10.0.0.2:55555 http://10.0.0.3:55555
+
+"""
+from __future__ import unicode_literals
+from collections import Counter
+import json
+import time
+import urllib
+
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop, PeriodicCallback
+
+# Local imports
+from .code_server import JobServer, encode_body
+from .file_utils import embed_files
+from .scheduler import Scheduler, DEFAULT_PRIORITY
+from .settings import (
+    SERVER_POOL_PORT, COORDINATOR_HEALTH_INTERVAL, COORDINATOR_MAX_FAILURES,
+    COORDINATOR_POLL_INTERVAL
+)
+
+
+def attach_files(json_data):
+    """Return the job with the contents of the files of its question in
+    place of their paths, or as it is if it has no files or they cannot be
+    read here.
+    """
+    data = json.loads(json_data)
+    metadata = data.get('metadata') or {}
+    if not metadata.get('file_paths'):
+        return json_data
+    try:
+        metadata['files'] = embed_files(metadata.pop('file_paths'))
+    except (IOError, OSError):
+        return json_data
+    return json.dumps(data)
+
+
+class Job(object):
+    def __init__(self, uid, json_data, user_dir, priority, supersede=None):
+        self.uid = uid
+        self.json_data = json_data
+        self.user_dir = user_dir
+        self.priority = priority
+        self.supersede = supersede
+        # The node the job was sent to and whether the node accepted it.
+        self.node = None
+        self.accepted = False
+        self.sent_at = None
+
+
+class Node(object):
+    """A server pool known to the coordinator."""
+    def __init__(self, url):
+        self.url = url.rstrip('/') + '/'
+        # A node is trusted till a check fails, so that jobs are not held
+        # back while the first health checks are on their way.
+        self.healthy = True
+        self.failures = 0
+        self.processes = 0
+        self.queued = 0
+        # Priority -> jobs queued on the node.
+        self.depths = {}
+        self.running = 0
+        # Jobs sent since the node last reported its status.
+        self.sent = 0
+        self.submitted = 0
+        # uids of the jobs sent to the node which are not done.
+        self.jobs = set()
+        self.collecting = False
+
+    @property
+    def load(self):
+        busy = self.queued + self.running + self.sent
+        return float(busy) / max(self.processes, 1)
+
+    def update(self, status):
+        self.processes = status['processes']
+        self.queued = status['queued']
+        self.depths = status.get('scheduler', {}).get('queued', {})
+        self.running = status['running']
+        self.sent = 0
+
+    def to_dict(self):
+        return dict(
+            url=self.url, healthy=self.healthy, failures=self.failures,
+            processes=self.processes, queued=self.queued,
+            running=self.running, load=round(self.load, 3),
+            in_flight=len(self.jobs), submitted=self.submitted
+        )
+
+
+class Coordinator(JobServer):
+    def __init__(self, nodes, port=SERVER_POOL_PORT,
+                 health_interval=COORDINATOR_HEALTH_INTERVAL,
+                 max_failures=COORDINATOR_MAX_FAILURES,
+                 poll_interval=COORDINATOR_POLL_INTERVAL):
+        """Create a coordinator of the server pools at the given URLs,
+        serving at `port`.
+        """
+        self.nodes = [Node(url) for url in nodes]
+        self.health_interval = health_interval
+        self.max_failures = max_failures
+        self.poll_interval = poll_interval
+        # uid -> Job, for the jobs which are not done.
+        self.jobs = {}
+        # Jobs waiting for a healthy node.
+        self.scheduler = Scheduler()
+        # Number of jobs sent again after their node failed.
+        self.requeued = 0
+        # Supersede key -> uid of the latest job submitted with it.
+        self.supersede_uids = {}
+        super(Coordinator, self).__init__(port)
+
+    # Private Protocol ##########
+    def _pick_node(self):
+        healthy = [node for node in self.nodes if node.healthy]
+        if not healthy:
+            return None
+        return min(healthy, key=lambda node: node.load)
+
+    def _dispatch(self):
+        while len(self.scheduler):
+            node = self._pick_node()
+            if node is None:
+                return
+            job = self.jobs.get(self.scheduler.get())
+            if job is None:
+                continue
+            job.node = node
+            job.accepted = False
+            job.sent_at = time.time()
+            node.jobs.add(job.uid)
+            node.sent += 1
+            node.submitted += 1
+            self.ioloop.add_callback(self._send, job, node)
+
+    async def _send(self, job, node):
+        params = dict(uid=job.uid, user_dir=job.user_dir,
+                      priority=job.priority)
+        if job.supersede is not None:
+            params['supersede'] = job.supersede
+        query = urllib.parse.urlencode(params)
+        body, headers = encode_body(job.json_data)
+        try:
+            await self.client.fetch(
+                node.url + '?' + query, method='POST', body=body,
+                headers=headers,
+                request_timeout=self.health_interval * self.max_failures
+            )
+        except Exception:
+            if job.node is node:
+                # The node may or may not have the job, it is sent again as
+                # it would be lost if the node does not.
+                node.jobs.discard(job.uid)
+                self._requeue(job)
+            self._node_failed(node)
+            self._dispatch()
+        else:
+            if job.node is node:
+                job.accepted = True
+
+    def _requeue(self, job):
+        job.node = None
+        job.accepted = False
+        self.results.set(job.uid, dict(status='not started'))
+        self.scheduler.put(job.uid, job.priority)
+        self.requeued += 1
+
+    def _node_failed(self, node):
+        """Take the node out once it failed too often and send its jobs to
+        the other nodes.
+        """
+        node.failures += 1
+        if node.failures < self.max_failures:
+            return
+        node.healthy = False
+        for uid in list(node.jobs):
+            job = self.jobs.get(uid)
+            if job is not None and job.node is node:
+                self._requeue(job)
+        node.jobs.clear()
+        self._dispatch()
+
+    async def _check_node(self, node):
+        try:
+            response = await self.client.fetch(
+                node.url + '?format=json', request_timeout=self.health_interval
+            )
+            status = json.loads(response.body.decode('utf-8'))
+        except Exception:
+            self._node_failed(node)
+            return
+        node.failures = 0
+        node.update(status)
+        if not node.healthy:
+            node.healthy = True
+            self._dispatch()
+
+    def _check_health(self):
+        for node in self.nodes:
+            self.ioloop.add_callback(self._check_node, node)
+
+    async def _collect_node(self, node):
+        uids = list(node.jobs)
+        node.collecting = True
+        try:
+            response = await self.client.fetch(
+                node.url + 'batch/results', method='POST',
+                body=json.dumps(dict(uids=uids)),
+                request_timeout=self.health_interval
+            )
+            results = json.loads(response.body.decode('utf-8'))
+        except Exception:
+            self._node_failed(node)
+            return
+        finally:
+            node.collecting = False
+        lost = False
+        for uid, result in results.items():
+            job = self.jobs.get(uid)
+            if job is None or job.node is not node:
+                continue
+            status = result.get('status')
+            if status == 'done':
+                node.jobs.discard(uid)
+                self._forget(job)
+                self.results.set(uid, result)
+                self._finish_job(result.get('result'),
+                                 time.time() - job.sent_at)
+                self._notify_waiters(uid, result)
+            elif status == 'unknown':
+                if job.accepted:
+                    # The pool was restarted and lost the job.
+                    node.jobs.discard(uid)
+                    self._requeue(job)
+                    lost = True
+            else:
+                self.results.set(uid, dict(status=status))
+        if lost:
+            self._dispatch()
+
+    def _forget(self, job):
+        del self.jobs[job.uid]
+        if self.supersede_uids.get(job.supersede) == job.uid:
+            del self.supersede_uids[job.supersede]
+
+    async def _cancel_on_node(self, job, node, queued_only):
+        params = '?queued_only=true' if queued_only else ''
+        try:
+            await self.client.fetch(
+                node.url + urllib.parse.quote(job.uid) + params,
+                method='DELETE', request_timeout=self.health_interval
+            )
+        except Exception:
+            # The job then runs, its result is collected as usual.
+            pass
+
+    def _collect(self):
+        for node in self.nodes:
+            if node.healthy and node.jobs and not node.collecting:
+                self.ioloop.add_callback(self._collect_node, node)
+
+    # Public Protocol ##########
+    def get_status(self):
+        """Return the number of queued jobs, code servers and running jobs
+        of the healthy nodes, as `ServerPool.get_status` does.
+        """
+        healthy = [node for node in self.nodes if node.healthy]
+        queued = sum(node.queued for node in healthy) + len(self.scheduler)
+        processes = sum(node.processes for node in healthy)
+        running = sum(node.running for node in healthy)
+        return queued, processes, running
+
+    def get_depths(self):
+        """Return the number of jobs queued per priority, here and on the
+        healthy nodes.
+        """
+        depths = Counter(self.scheduler.depths())
+        for node in self.nodes:
+            if node.healthy:
+                depths.update(node.depths)
+        return dict(depths)
+
+    def get_status_text(self):
+        q_size, alive, running = self.get_status()
+        n_healthy = sum(node.healthy for node in self.nodes)
+        return "%d processes, %d running, %d queued, %d of %d nodes up, "\
+               "%d jobs requeued" % (
+                   alive, running, q_size, n_healthy, len(self.nodes),
+                   self.requeued
+               )
+
+    def _update_gauges(self):
+        super(Coordinator, self)._update_gauges()
+        queued, processes, running = self.get_status()
+        for priority, depth in self.get_depths().items():
+            self.metrics.queued.set(depth, priority=priority)
+        self.metrics.running.set(running)
+        self.metrics.processes.set(processes)
+
+    def get_status_dict(self):
+        q_size, alive, running = self.get_status()
+        return dict(
+            processes=alive, running=running, queued=q_size,
+            waiting=len(self.scheduler), requeued=self.requeued,
+            results=self.results.stats(),
+            nodes=[node.to_dict() for node in self.nodes]
+        )
+
+    def submit(self, uid, json_data, user_dir, priority=DEFAULT_PRIORITY,
+               supersede=None):
+        if priority not in self.scheduler.priorities:
+            raise ValueError("Unknown priority %r." % (priority,))
+        self.metrics.submitted.inc(priority=priority)
+        if supersede:
+            old_uid = self.supersede_uids.get(supersede)
+            if old_uid is not None and old_uid != uid:
+                self._cancel(old_uid, 'superseded', queued_only=True)
+            self.supersede_uids[supersede] = uid
+        self.results.set(uid, dict(status='not started'))
+        self.jobs[uid] = Job(uid, attach_files(json_data), user_dir,
+                             priority, supersede)
+        self.scheduler.put(uid, priority)
+        self._dispatch()
+
+    def _cancel(self, uid, reason, queued_only):
+        job = self.jobs.get(uid)
+        if job is None:
+            return False
+        if job.node is not None:
+            # The pool cancels it and reports the result as usual.
+            self.ioloop.add_callback(self._cancel_on_node, job, job.node,
+                                     queued_only)
+            return True
+        self.scheduler.remove(lambda queued: queued == uid)
+        self._forget(job)
+        self.metrics.cancelled.inc(reason=reason, state='queued')
+        self._set_cancelled(uid)
+        return True
+
+    def cancel(self, uid, queued_only=False):
+        """Cancel a job waiting here, or ask the pool it was sent to to
+        cancel it.  Return True if the job was known.
+        """
+        return self._cancel(uid, 'cancelled', queued_only)
+
+    def run(self):
+        self.ioloop = IOLoop.current()
+        self.client = AsyncHTTPClient()
+        self.callbacks = [
+            PeriodicCallback(self._check_health, self.health_interval * 1000),
+            PeriodicCallback(self._collect, self.poll_interval * 1000),
+            PeriodicCallback(self.results.evict_expired, 60 * 1000),
+        ]
+        for callback in self.callbacks:
+            callback.start()
+        self.ioloop.add_callback(self._check_health)
+        self.http_server = HTTPServer(self.app, decompress_request=True)
+        self.http_server.add_sockets(self.sockets)
+        self.ioloop.start()
+
+    async def _shutdown(self):
+        self.http_server.stop()
+        await self.http_server.close_all_connections()
+        for callback in self.callbacks:
+            callback.stop()
+        self.ioloop.stop()
+
+    def stop(self):
+        if self.ioloop is not None:
+            self.ioloop.add_callback(self._shutdown)
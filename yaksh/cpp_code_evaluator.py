@@ -9,6 +9,8 @@ from .file_utils import copy_files, delete_files
 from .base_evaluator import BaseEvaluator
 from .grader import CompilationError, TestCaseError
 from .error_messages import prettify_exceptions
+from .compile_cache import get_compile_cache
+from .cpp_harness import create_harness
 
 
 class CppCodeEvaluator(BaseEvaluator):
@@ -21,6 +23,9 @@ class CppCodeEvaluator(BaseEvaluator):
         self.ref_output_path = ""
         self.submit_code_path = ""
         self.test_code_path = ""
+        # The harness shared by the test cases of the job, see `prepare`.
+        self.harness = None
+        self.harness_index = None
 
         # Set metadata values
         self.user_answer = metadata.get('user_answer')
@@ -32,6 +37,16 @@ class CppCodeEvaluator(BaseEvaluator):
         self.weight = test_case_data.get('weight')
         self.hidden = test_case_data.get('hidden')
 
+    @classmethod
+    def prepare(cls, test_case_instances):
+        harness = create_harness([instance.test_case
+                                  for instance in test_case_instances])
+        if harness is None:
+            return
+        for index, instance in enumerate(test_case_instances):
+            instance.harness = harness
+            instance.harness_index = index
+
     def teardown(self):
         # Delete the created file.
         if os.path.exists(self.submit_code_path):
@@ -86,22 +101,69 @@ class CppCodeEvaluator(BaseEvaluator):
                 self.user_output_path,
                 self.ref_output_path
             )
-            self.compiled_user_answer = self._run_command(
+            # The same submission is compiled for every test case, so it
+            # is only compiled the first time.
+            cache = get_compile_cache()
+            cwd = os.getcwd()
+            user_key = cache.make_key(
+                self.compile_command.replace(cwd, ''),
+                self.user_answer.lstrip(), files=self.files
+            )
+            self.compiled_user_answer = cache.run(
+                user_key, [self.user_output_path], self._run_command,
                 self.compile_command,
                 shell=True,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE
             )
 
-            self.compiled_test_code = self._run_command(
-                self.compile_main,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
+            self.user_key = user_key
+            stdnt_stderr = self.compiled_user_answer[2]
+            if self.harness is not None and not stdnt_stderr and \
+                    self.harness.build(self.user_output_path,
+                                       self._run_command, self.files):
+                # The test case is linked into the harness.
+                self.compiled_test_code = (None, '', '')
+            else:
+                self._compile_main()
 
             return self.compiled_user_answer, self.compiled_test_code
 
+    def _compile_main(self):
+        cache = get_compile_cache()
+        main_key = cache.make_key(
+            self.compile_main.replace(os.getcwd(), ''),
+            self.test_case.lstrip(), self.user_key
+        )
+        self.compiled_test_code = cache.run(
+            main_key, [self.ref_output_path], self._run_command,
+            self.compile_main,
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+
+    def _run_test(self):
+        """Return the process, stdout and stderr of the run of the test
+        case, in the harness if it ran it.
+        """
+        if self.harness is not None and self.harness.built:
+            ret = self.harness.run(self.harness_index, self._run_command)
+            if ret is not None:
+                return ret
+            # Not run by the harness, the test case gets its own main.
+            self._compile_main()
+            main_err = self._remove_null_substitute_char(
+                self.compiled_test_code[2]
+            )
+            if main_err:
+                return self.compiled_test_code
+        return self._run_command([self.ref_output_path],
+                                 stdin=None,
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE
+                                 )
+
     def check_code(self):
         """ Function validates student code using instructor code as
         reference.The first argument ref_code_path, is the path to
@@ -133,12 +195,7 @@ class CppCodeEvaluator(BaseEvaluator):
             proc, main_out, main_err = self.compiled_test_code
             main_err = self._remove_null_substitute_char(main_err)
             if main_err == '':
-                ret = self._run_command([self.ref_output_path],
-                                        stdin=None,
-                                        stdout=subprocess.PIPE,
-                                        stderr=subprocess.PIPE
-                                        )
-                proc, stdout, stderr = ret
+                proc, stdout, stderr = self._run_test()
                 if proc.returncode == 0:
                     success, err = True, None
                     mark_fraction = 1.0 if self.partial_grading else 0.0
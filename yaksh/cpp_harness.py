@@ -0,0 +1,290 @@
+"""One executable for all the C/C++ standard test cases of a job.
+
+Each C/C++ standard test case is a `main` linked against the object of the
+submission.  Linking it and starting it again for every test case costs
+more than running a typical test case.  When `CPP_HARNESS` is set, the
+test cases of a job are built into one executable instead:
+
+- the `main` of each test case is compiled as a function, with a small
+  entry point ``yaksh_entry_<i>`` calling it;
+- the other symbols each test case defines get a prefix of their own with
+  objcopy, so that the helpers of different test cases do not clash;
+- a runner calls each entry point in a forked child, with its stdout and
+  stderr written to files, and writes the exit status of each child to a
+  status file.  The stdout of the runner is left to the submission, which
+  may print from a global constructor before the runner starts.
+
+The executable is linked once and run once for the whole job.  A crash or
+a call to `exit` only ends the child of its test case, and the state each
+test case leaves behind dies with its child.  The objects of the test cases
+do not depend on the submission, so each code server keeps them in memory
+and the jobs of a question only compile its test cases once.  In fork mode
+(CODE_SERVER_FORK) they are only kept for the job.
+
+The harness is only an optimization.  Any warning or error while building
+it, or a runner which does not report a test case, sends the evaluators
+back to a `main` per test case.  They then report the same errors as
+before.
+"""
+from __future__ import unicode_literals
+from collections import OrderedDict
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+# Local imports
+from .settings import CPP_HARNESS
+from .compile_cache import get_compile_cache
+
+TOOLS = ('g++', 'nm', 'objcopy')
+TEST_COMMAND = ['g++', '-Werror=return-type', '-Dmain=yaksh_test_main', '-c']
+STATUS_LINE = re.compile(r'^(\d+) (-?\d+)$')
+
+ENTRY_SOURCE = '''
+static int yaksh_call(int (*f)()) {{ return f(); }}
+static int yaksh_call(int (*f)(int, char **))
+{{
+    char name[] = "main";
+    char *argv[] = {{name, 0}};
+    return f(1, argv);
+}}
+extern "C" int yaksh_entry_{index}(void)
+{{
+    return yaksh_call(yaksh_test_main);
+}}
+'''
+
+RUNNER_SOURCE = r'''
+#include <stdio.h>
+#include <stdlib.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/wait.h>
+
+{declarations}
+static int (*yaksh_entries[])(void) = {{{entries}}};
+
+static void yaksh_redirect(const char *dir, const char *name, int i, int fd)
+{{
+    char path[4096];
+    snprintf(path, sizeof(path), "%s/%s_%d", dir, name, i);
+    int f = open(path, O_WRONLY | O_CREAT | O_TRUNC, 0600);
+    dup2(f, fd);
+    close(f);
+}}
+
+int main(int argc, char **argv)
+{{
+    int n = sizeof(yaksh_entries) / sizeof(yaksh_entries[0]);
+    char path[4096];
+    snprintf(path, sizeof(path), "%s/status", argv[1]);
+    FILE *status_file = fopen(path, "w");
+    if (!status_file)
+        return 1;
+    for (int i = 0; i < n; i++) {{
+        fflush(stdout);
+        fflush(stderr);
+        pid_t pid = fork();
+        if (pid == 0) {{
+            fclose(status_file);
+            yaksh_redirect(argv[1], "out", i, 1);
+            yaksh_redirect(argv[1], "err", i, 2);
+            exit(yaksh_entries[i]());
+        }}
+        int status = 0;
+        waitpid(pid, &status, 0);
+        fprintf(status_file, "%d %d\n", i,
+                WIFEXITED(status) ? WEXITSTATUS(status) : -WTERMSIG(status));
+        fflush(status_file);
+    }}
+    fclose(status_file);
+    return 0;
+}}
+'''
+
+# The harnesses of the job being evaluated.
+harnesses = []
+# Key -> bytes of the objects of the test cases and runners compiled, or None
+# if they did not compile cleanly, most recently used last.  They do not
+# depend on the submissions, so they are kept across jobs, in memory where
+# the evaluated code can not change them.
+objects = OrderedDict()
+MAX_OBJECTS = 256
+
+
+def create_harness(test_cases):
+    """Return a harness for the sources of the test cases of a job, or None
+    if harnesses are disabled or the tools they need are missing.
+    """
+    if not CPP_HARNESS or len(test_cases) < 2:
+        return None
+    if not all(shutil.which(tool) for tool in TOOLS):
+        return None
+    harness = Harness(test_cases)
+    harnesses.append(harness)
+    return harness
+
+
+def finish_job():
+    """Remove the files of the harnesses of the job which is done."""
+    while harnesses:
+        harnesses.pop().close()
+
+
+class HarnessProcess(object):
+    """Stands in for the Popen object of the run of a test case."""
+    def __init__(self, returncode):
+        self.returncode = returncode
+
+
+class Harness(object):
+    def __init__(self, test_cases):
+        self.test_cases = test_cases
+        # None till the harness is built, then whether it was.
+        self.built = None
+        self.results = None
+        self.dir = None
+        self.executable = None
+
+    # Private Protocol ##########
+    def _build(self, user_object, run_command, files):
+        self.dir = tempfile.mkdtemp(prefix='yaksh_harness_')
+        # Quoted includes of the test cases are found in the directory of
+        # the job, where their main.c would be.
+        job_dir = os.getcwd()
+        files = [os.path.join(job_dir, name) for name in files or ()]
+        make_key = get_compile_cache().make_key
+        objects = []
+        for index, test_case in enumerate(self.test_cases):
+            source = test_case.lstrip() + ENTRY_SOURCE.format(index=index)
+            command = TEST_COMMAND + ['-I', job_dir]
+            key = make_key(' '.join(TEST_COMMAND), source, files=files)
+            objects.append('test_%d.o' % index)
+            if not self._object(key, objects[-1], source, command,
+                                run_command, index):
+                return False
+
+        entries = ['yaksh_entry_%d' % i for i in range(len(self.test_cases))]
+        source = RUNNER_SOURCE.format(
+            declarations='\n'.join('extern "C" int %s(void);' % entry
+                                   for entry in entries),
+            entries=', '.join(entries)
+        )
+        if not self._object(make_key('runner', source), 'runner.o', source,
+                            ['g++', '-c'], run_command):
+            return False
+
+        self.executable = os.path.join(self.dir, 'harness')
+        proc, out, err = run_command(
+            ['g++', 'runner.o'] + objects + [user_object, '-o',
+                                             self.executable],
+            cwd=self.dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        return proc.returncode == 0 and not err
+
+    def _object(self, key, obj, source, command, run_command, index=None):
+        """Write the object `obj` compiled from `source` to the directory of
+        the harness, from the cache if it is there.  Return True if it
+        compiles without warnings.
+        """
+        path = os.path.join(self.dir, obj)
+        if key in objects:
+            objects.move_to_end(key)
+        else:
+            with open(path[:-len('.o')] + '.cpp', 'w') as f:
+                f.write(source)
+            objects[key] = None
+            if self._compile(obj, command, run_command, index):
+                with open(path, 'rb') as f:
+                    objects[key] = f.read()
+            while len(objects) > MAX_OBJECTS:
+                objects.popitem(last=False)
+            return objects[key] is not None
+        if objects[key] is None:
+            return False
+        with open(path, 'wb') as f:
+            f.write(objects[key])
+        return True
+
+    def _compile(self, obj, command, run_command, index):
+        """Compile the source of `obj` and, for a test case, prefix the
+        symbols it defines except its entry point.
+        """
+        proc, out, err = run_command(
+            command + ['-o', obj, obj[:-len('.o')] + '.cpp'], cwd=self.dir,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        if proc.returncode != 0 or err:
+            return False
+        if index is None:
+            return True
+        proc, out, err = run_command(
+            ['nm', '--defined-only', '-g', obj], cwd=self.dir,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        if proc.returncode != 0:
+            return False
+        entry = 'yaksh_entry_%d' % index
+        args = []
+        for line in out.splitlines():
+            symbol = line.split()[-1]
+            if symbol != entry:
+                args.extend(['--redefine-sym',
+                             '%s=yaksh_t%d_%s' % (symbol, index, symbol)])
+        proc, out, err = run_command(
+            ['objcopy'] + args + [obj], cwd=self.dir,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        return proc.returncode == 0
+
+    def _run(self, run_command):
+        run_command(
+            [self.executable, self.dir], stdin=None,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        # Test cases without a well formed status line, as when the runner
+        # was killed, fall back to a main of their own.
+        self.results = {}
+        for line in self._read('status', None).splitlines():
+            match = STATUS_LINE.match(line)
+            if match:
+                self.results[int(match.group(1))] = int(match.group(2))
+
+    def _read(self, name, index):
+        if index is not None:
+            name = '%s_%d' % (name, index)
+        path = os.path.join(self.dir, name)
+        try:
+            with open(path, 'rb') as f:
+                return f.read().decode('utf-8', 'replace')
+        except IOError:
+            return ''
+
+    # Public Protocol ##########
+    def build(self, user_object, run_command, files=()):
+        """Build the harness against the object of the submission, the first
+        time it is called.  `files` are those the test cases may include.
+        Return True if the harness was built.
+        """
+        if self.built is None:
+            self.built = self._build(user_object, run_command, files)
+        return self.built
+
+    def run(self, index, run_command):
+        """Return the process, stdout and stderr of the run of the test case
+        at `index`, or None if the harness did not run it.  The harness runs
+        all the test cases the first time it is called.
+        """
+        if self.results is None:
+            self._run(run_command)
+        if index not in self.results:
+            return None
+        return (HarnessProcess(self.results[index]),
+                self._read('out', index), self._read('err', index))
+
+    def close(self):
+        if self.dir is not None:
+            shutil.rmtree(self.dir, ignore_errors=True)
+            self.dir = None
@@ -7,7 +7,9 @@ from os.path import isfile
 # Local imports
 from .stdio_evaluator import StdIOEvaluator
 from .file_utils import copy_files, delete_files
+from .resource_usage import AccountedPopen
 from .grader import CompilationError
+from .compile_cache import get_compile_cache
 
 
 class CppStdIOEvaluator(StdIOEvaluator):
@@ -61,18 +63,33 @@ class CppStdIOEvaluator(StdIOEvaluator):
             self.user_output_path,
             self.ref_output_path
             )
-        self.compiled_user_answer = self._run_command(self.compile_command,
-                                                      shell=True,
-                                                      stdin=subprocess.PIPE,
-                                                      stdout=subprocess.PIPE,
-                                                      stderr=subprocess.PIPE
-                                                      )
-        self.compiled_test_code = self._run_command(self.compile_main,
-                                                    shell=True,
-                                                    stdin=subprocess.PIPE,
-                                                    stdout=subprocess.PIPE,
-                                                    stderr=subprocess.PIPE
-                                                    )
+        cache = get_compile_cache()
+        cwd = os.getcwd()
+        user_key = cache.make_key(self.compile_command.replace(cwd, ''),
+                                  self.user_answer.lstrip(),
+                                  files=self.files
+                                  )
+        self.compiled_user_answer = cache.run(user_key,
+                                              [self.user_output_path],
+                                              self._run_command,
+                                              self.compile_command,
+                                              shell=True,
+                                              stdin=subprocess.PIPE,
+                                              stdout=subprocess.PIPE,
+                                              stderr=subprocess.PIPE
+                                              )
+        main_key = cache.make_key(self.compile_main.replace(cwd, ''),
+                                  user_key
+                                  )
+        self.compiled_test_code = cache.run(main_key,
+                                            [self.ref_output_path],
+                                            self._run_command,
+                                            self.compile_main,
+                                            shell=True,
+                                            stdin=subprocess.PIPE,
+                                            stdout=subprocess.PIPE,
+                                            stderr=subprocess.PIPE
+                                            )
         return self.compiled_user_answer, self.compiled_test_code
 
     def check_code(self):
@@ -84,13 +101,13 @@ class CppStdIOEvaluator(StdIOEvaluator):
         if stdnt_stderr == '':
             proc, main_out, main_err = self.compiled_test_code
             main_err = self._remove_null_substitute_char(main_err)
-            proc = subprocess.Popen("./executable",
-                                    shell=True,
-                                    stdin=subprocess.PIPE,
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE,
-                                    preexec_fn=os.setpgrp
-                                    )
+            proc = AccountedPopen("./executable",
+                                  shell=True,
+                                  stdin=subprocess.PIPE,
+                                  stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE,
+                                  preexec_fn=os.setpgrp
+                                  )
             success, err = self.evaluate_stdio(self.user_answer, proc,
                                                self.expected_input,
                                                self.expected_output
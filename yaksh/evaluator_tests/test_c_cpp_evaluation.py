@@ -10,6 +10,7 @@ from psutil import Process
 from yaksh.grader import Grader
 from yaksh.evaluator_tests.test_python_evaluation import EvaluatorBaseTest
 from yaksh.settings import SERVER_TIMEOUT
+from yaksh import worker_stats, compile_cache, cpp_harness
 
 
 class CAssertionEvaluationTestCases(EvaluatorBaseTest):
@@ -85,6 +86,38 @@ class CAssertionEvaluationTestCases(EvaluatorBaseTest):
         # Then
         self.assertTrue(result.get('success'))
 
+    def test_submission_is_compiled_once(self):
+        # Given
+        user_answer = "int add(int a, int b)\n{return a+b;}"
+        kwargs = {
+                  'metadata': {
+                    'user_answer': user_answer,
+                    'file_paths': self.file_paths,
+                    'partial_grading': False,
+                    'language': 'cpp'
+                    }, 'test_case_data': self.test_case_data * 2,
+                  }
+        misses = worker_stats.counters['compile_cache_misses']
+        hits = worker_stats.counters['compile_cache_hits']
+        cache_dir = tempfile.mkdtemp()
+        default_cache = compile_cache.get_compile_cache()
+        compile_cache.cache = compile_cache.CompileCache(cache_dir)
+
+        # When
+        grader = Grader(self.in_dir)
+        try:
+            result = grader.evaluate(kwargs)
+        finally:
+            compile_cache.cache = default_cache
+            shutil.rmtree(cache_dir)
+
+        # Then
+        self.assertTrue(result.get('success'))
+        self.assertEqual(worker_stats.counters['compile_cache_misses'],
+                         misses + 2)
+        self.assertEqual(worker_stats.counters['compile_cache_hits'],
+                         hits + 2)
+
     def test_incorrect_answer(self):
         # Given
         user_answer = "int add(int a, int b)\n{return a-b;}"
@@ -280,6 +313,146 @@ class CAssertionEvaluationTestCases(EvaluatorBaseTest):
         for error in errors:
             self.assertEqual(error['exception'], 'TestCaseError')
 
+    def evaluate_in_harness(self, user_answer, test_cases):
+        test_case_data = [{"test_case": dedent(test_case),
+                           "test_case_type": "standardtestcase",
+                           "weight": 1.0, "hidden": False}
+                          for test_case in test_cases]
+        kwargs = {
+                  'metadata': {
+                    'user_answer': user_answer,
+                    'file_paths': self.file_paths,
+                    'partial_grading': True,
+                    'language': 'cpp'
+                    }, 'test_case_data': test_case_data,
+                  }
+        built = []
+        build = cpp_harness.Harness._build
+
+        def record_build(harness, *args):
+            built.append(build(harness, *args))
+            return built[-1]
+
+        cpp_harness.CPP_HARNESS = True
+        cpp_harness.Harness._build = record_build
+        try:
+            result = Grader(self.in_dir).evaluate(kwargs)
+        finally:
+            cpp_harness.CPP_HARNESS = False
+            cpp_harness.Harness._build = build
+        return result, built
+
+    def test_test_cases_run_in_one_harness(self):
+        # Given
+        user_answer = "int add(int a, int b)\n{return a+b;}"
+        test_case = """
+            #include <stdio.h>
+            #include <stdlib.h>
+
+            extern int add(int, int);
+            int calls = 0;
+
+            template <class T>
+            void check(T expect, T result)
+            {
+                calls++;
+                if (expect != result) {
+                    printf("Incorrect: Expected %d got %d", expect, result);
+                    exit(1);
+                }
+            }
+
+            int main(void)
+            {
+                check(%s, add(%s));
+                return calls - 1;
+            }
+            """
+        crash = """
+            extern int add(int, int);
+
+            int main()
+            {
+                int *p = 0;
+                return *p + add(1, 1);
+            }
+            """
+        test_cases = [test_case.replace('%s', '5', 1).replace('%s', '2, 3'),
+                      test_case.replace('%s', '7', 1).replace('%s', '2, 3'),
+                      crash,
+                      test_case.replace('%s', '0', 1).replace('%s', '0, 0')]
+
+        # When
+        result, built = self.evaluate_in_harness(user_answer, test_cases)
+
+        # Then
+        self.assertEqual(built, [True])
+        self.assertFalse(result.get('success'))
+        self.assertEqual(result.get('weight'), 2.0)
+        errors = result.get('error')
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(errors[0]['exception'], 'AssertionError')
+        self.assert_correct_output("Incorrect: Expected 7 got 5",
+                                   errors[0]['test_case'])
+        self.assertEqual(cpp_harness.harnesses, [])
+
+    def test_harness_ignores_output_before_main(self):
+        # Given
+        # A global constructor prints before the runner starts, some of it
+        # looking like the status of a test case.
+        user_answer = dedent("""\
+            #include <stdio.h>
+            struct Greeter {
+                Greeter() { printf("hello\\n1 0\\n"); fflush(stdout); }
+            } greeter;
+            int add(int a, int b) { return a + b; }
+            """)
+        test_case = """
+            #include <stdlib.h>
+            extern int add(int, int);
+
+            int main()
+            {
+                return add(2, 3) == %s ? 0 : 1;
+            }
+            """
+        test_cases = [test_case % '5', test_case % '6']
+
+        # When
+        result, built = self.evaluate_in_harness(user_answer, test_cases)
+
+        # Then
+        self.assertEqual(built, [True])
+        self.assertFalse(result.get('success'))
+        self.assertEqual(result.get('weight'), 1.0)
+        errors = result.get('error')
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0]['exception'], 'AssertionError')
+
+    def test_harness_falls_back_to_a_main_per_test_case(self):
+        # Given
+        user_answer = "int add(int a, int b)\n{return a+b;}"
+        # Without a return, main can not be turned into a function.
+        test_case = """
+            #include <stdlib.h>
+            extern int add(int, int);
+
+            int main()
+            {
+                if (add(2, 3) != 5)
+                    exit(1);
+            }
+            """
+
+        # When
+        result, built = self.evaluate_in_harness(user_answer,
+                                                 [test_case, test_case])
+
+        # Then
+        self.assertEqual(built, [False])
+        self.assertTrue(result.get('success'))
+        self.assertEqual(result.get('weight'), 2.0)
+
 
 class CppStdIOEvaluationTestCases(EvaluatorBaseTest):
     def setUp(self):
@@ -34,6 +34,25 @@ class RegistryTestCase(unittest.TestCase):
         )
         self.assertEqual(evaluator_class, class_name)
 
+    def test_classes_are_loaded_once(self):
+        # Given
+        registry = _LanguageRegistry()
+        registry.register(
+            'broken', {'standardtestcase': 'yaksh.no_such_module.Evaluator'}
+        )
+
+        # When
+        failed = registry.preload()
+
+        # Then
+        self.assertEqual(list(failed), ['broken/standardtestcase'])
+        self.assertIn('yaksh.python_stdio_evaluator.PythonStdIOEvaluator',
+                      registry._classes)
+        self.assertIs(
+            registry.get_class('python', 'hooktestcase'),
+            registry._classes['yaksh.hook_evaluator.HookEvaluator']
+        )
+
     def tearDown(self):
         self.registry_object = None
 
@@ -9,6 +9,7 @@ from psutil import Process
 
 # Local Import
 from yaksh import grader as gd
+from yaksh import java_runner
 from yaksh.grader import Grader
 from yaksh.evaluator_tests.test_python_evaluation import EvaluatorBaseTest
 
@@ -300,6 +301,69 @@ class JavaAssertionEvaluationTestCases(EvaluatorBaseTest):
             self.assertEqual(error.get('exception'), 'TestCaseError')
 
 
+class JavaRunnerAssertionEvaluationTestCases(
+        JavaAssertionEvaluationTestCases):
+    """Runs the assertion tests in the persistent JVM."""
+    def setUp(self):
+        super(JavaRunnerAssertionEvaluationTestCases, self).setUp()
+        java_runner.JAVA_RUNNER = True
+
+    def tearDown(self):
+        java_runner.get_java_runner().stop()
+        java_runner.JAVA_RUNNER = False
+        super(JavaRunnerAssertionEvaluationTestCases, self).tearDown()
+
+    def evaluate(self, user_answer):
+        kwargs = {
+                  'metadata': {
+                    'user_answer': user_answer,
+                    'file_paths': self.file_paths,
+                    'partial_grading': False,
+                    'language': 'java'
+                    }, 'test_case_data': self.test_case_data,
+                  }
+        return Grader(self.in_dir).evaluate(kwargs)
+
+    def test_output_to_the_real_stdout_runs_in_a_new_jvm(self):
+        # Given
+        user_answer = dedent("""\
+            class Test {
+                int square_num(int a) {
+                    new java.io.PrintStream(new java.io.FileOutputStream(
+                        java.io.FileDescriptor.out), true).println("hello");
+                    return a * a;
+                }
+            }
+            """)
+
+        # When
+        result = self.evaluate(user_answer)
+
+        # Then
+        self.assertTrue(result.get('success'))
+        self.assertIsNone(java_runner.get_java_runner().proc)
+
+    def test_runner_is_replaced_after_threads_are_left_running(self):
+        # Given
+        user_answer = dedent("""\
+            class Test {
+                int square_num(int a) {
+                    new Thread(() -> {
+                        while (true) {}
+                    }).start();
+                    return a * a;
+                }
+            }
+            """)
+
+        # When
+        result = self.evaluate(user_answer)
+
+        # Then
+        self.assertTrue(result.get('success'))
+        self.assertIsNone(java_runner.get_java_runner().proc)
+
+
 class JavaStdIOEvaluationTestCases(EvaluatorBaseTest):
     def setUp(self):
         self.f_path = os.path.join(tempfile.gettempdir(), "test.txt")
@@ -578,6 +642,18 @@ class JavaStdIOEvaluationTestCases(EvaluatorBaseTest):
         self.assertTrue(result.get("success"))
 
 
+class JavaRunnerStdIOEvaluationTestCases(JavaStdIOEvaluationTestCases):
+    """Runs the stdio tests in the persistent JVM."""
+    def setUp(self):
+        super(JavaRunnerStdIOEvaluationTestCases, self).setUp()
+        java_runner.JAVA_RUNNER = True
+
+    def tearDown(self):
+        java_runner.get_java_runner().stop()
+        java_runner.JAVA_RUNNER = False
+        super(JavaRunnerStdIOEvaluationTestCases, self).tearDown()
+
+
 class JavaHookEvaluationTestCases(EvaluatorBaseTest):
 
     def setUp(self):
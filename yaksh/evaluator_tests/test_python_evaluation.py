@@ -7,6 +7,7 @@ from textwrap import dedent
 
 # Local import
 from yaksh.grader import Grader
+from yaksh import python_assertion_evaluator
 from yaksh.settings import SERVER_TIMEOUT
 
 
@@ -475,6 +476,90 @@ class PythonAssertionEvaluationTestCases(EvaluatorBaseTest):
         self.assertEqual(error['exception'], 'AssertionError')
         self.assertIn('did not match the output', error['message'])
 
+    def evaluate_isolated(self, isolation, user_answer, test_cases):
+        kwargs = {'metadata': {
+                  'user_answer': user_answer,
+                  'file_paths': self.file_paths,
+                  'partial_grading': True,
+                  'language': 'python'},
+                  'test_case_data': [{"test_case_type": "standardtestcase",
+                                      "test_case": test_case,
+                                      "weight": 1.0}
+                                     for test_case in test_cases],
+                  }
+        python_assertion_evaluator.PYTHON_TEST_ISOLATION = isolation
+        try:
+            return Grader(self.in_dir).evaluate(kwargs)
+        finally:
+            python_assertion_evaluator.PYTHON_TEST_ISOLATION = 'exec'
+
+    def test_submission_is_executed_once(self):
+        # Given
+        user_answer = dedent("""\
+                             with open('runs.txt', 'a') as f:
+                                 f.write('run\\n')
+                             def add(a, b):
+                                 return a + b
+                             """)
+        test_cases = ['assert add(1, 2) == 3'] * 3
+        runs = os.path.join(self.in_dir, 'runs.txt')
+
+        for isolation, expected_runs in [('exec', 3), ('copy', 1),
+                                         ('fork', 1)]:
+            # When
+            result = self.evaluate_isolated(isolation, user_answer,
+                                            test_cases)
+
+            # Then
+            self.assertTrue(result.get('success'))
+            self.assertEqual(result.get('weight'), 3.0)
+            with open(runs) as f:
+                self.assertEqual(len(f.readlines()), expected_runs)
+            os.remove(runs)
+
+    def test_test_cases_are_isolated(self):
+        # Given
+        user_answer = dedent("""\
+                             calls = 0
+                             seen = []
+                             def add(a, b):
+                                 global calls
+                                 calls += 1
+                                 seen.append(a)
+                                 return a + b
+                             """)
+        test_cases = ['assert add(1, 2) == 3 and calls == 1',
+                      'assert add(2, 2) == 4 and calls == 1',
+                      'assert add(3, 2) == 5 and seen == [3]']
+
+        # When
+        copied = self.evaluate_isolated('copy', user_answer, test_cases)
+        forked = self.evaluate_isolated('fork', user_answer, test_cases)
+
+        # Then
+        # The copies of the names share the list.
+        self.assertFalse(copied.get('success'))
+        self.assertEqual(copied.get('weight'), 2.0)
+        self.assertTrue(forked.get('success'))
+        self.assertEqual(forked.get('weight'), 3.0)
+
+    def test_forked_test_case_which_exits(self):
+        # Given
+        user_answer = "def add(a, b):\n    return a + b"
+        test_cases = ['import sys; sys.exit(1)', 'assert add(1, 2) == 3',
+                      'while True: pass']
+
+        # When
+        result = self.evaluate_isolated('fork', user_answer, test_cases)
+
+        # Then
+        self.assertFalse(result.get('success'))
+        self.assertEqual(result.get('weight'), 1.0)
+        errors = result.get('error')
+        self.assertEqual(errors[0]['exception'], 'RuntimeError')
+        self.assert_correct_output(self.timeout_msg, errors[1]['message'])
+        self.assertEqual(len(errors), 2)
+
 
 class PythonStdIOEvaluationTestCases(EvaluatorBaseTest):
     def setUp(self):
@@ -7,6 +7,7 @@ import shutil
 from psutil import Process
 
 from yaksh.grader import Grader
+from yaksh import interpreter_session
 from yaksh.settings import SERVER_TIMEOUT
 from yaksh.evaluator_tests.test_python_evaluation import EvaluatorBaseTest
 
@@ -198,3 +199,82 @@ class RAssertionEvaluationTestCase(EvaluatorBaseTest):
         if parent_proc:
             children_procs = Process(parent_proc[0].pid)
             self.assertFalse(any(children_procs.children(recursive=True)))
+
+
+class RSessionAssertionEvaluationTestCase(RAssertionEvaluationTestCase):
+    """Runs the assertion tests in an R interpreter session."""
+    def setUp(self):
+        super(RSessionAssertionEvaluationTestCase, self).setUp()
+        interpreter_session.INTERPRETER_SESSIONS = True
+        self.user_answer = dedent(
+            '''
+            odd_or_even <- function(n){
+              if(n %% 2 == 0){
+                return("EVEN")
+              }
+              return("ODD")
+            }
+            '''
+        )
+
+    def tearDown(self):
+        interpreter_session.finish_job()
+        interpreter_session.INTERPRETER_SESSIONS = False
+        super(RSessionAssertionEvaluationTestCase, self).tearDown()
+
+    def evaluate(self, test_cases):
+        kwargs = {'metadata': {
+                  'user_answer': self.user_answer,
+                  'file_paths': self.file_paths,
+                  'partial_grading': True,
+                  'language': 'r'},
+                  'test_case_data': [{"test_case": test_case,
+                                      "test_case_type": "standardtestcase",
+                                      "weight": 1.0}
+                                     for test_case in test_cases],
+                  }
+        return Grader(self.in_dir).evaluate(kwargs)
+
+    def test_quit_only_ends_the_run(self):
+        # Given
+        test_case = dedent(
+            '''
+            source("function.r")
+            stopifnot(odd_or_even(3) == "ODD")
+            quit("no", 31)
+            print("not reached")
+            '''
+        )
+
+        # When
+        result = self.evaluate([test_case, test_case])
+
+        # Then
+        self.assertTrue(result.get('success'))
+        self.assertEqual(result.get('weight'), 2.0)
+
+    def test_session_is_replaced_after_a_crash(self):
+        # Given
+        crash = 'system(paste("kill -9", Sys.getpid()))\nquit("no", 31)\n'
+
+        # When
+        result = self.evaluate([crash, self.test_case])
+
+        # Then
+        self.assertFalse(result.get('success'))
+        self.assertEqual(result.get('weight'), 1.0)
+        self.assertEqual(len(result.get('error')), 1)
+
+    def test_session_is_replaced_after_a_timeout(self):
+        # Given
+        loop = 'while (TRUE) {}\n'
+
+        # When
+        timed_out = self.evaluate([loop])
+        result = self.evaluate([self.test_case])
+
+        # Then
+        self.assertFalse(timed_out.get('success'))
+        self.assert_correct_output(self.timeout_msg,
+                                   timed_out.get('error')[0]['message'])
+        self.assertTrue(result.get('success'))
@@ -9,6 +9,7 @@ from textwrap import dedent
 # Local Import
 from yaksh import grader as gd
 from yaksh.grader import Grader
+from yaksh import interpreter_session
 from yaksh.evaluator_tests.test_python_evaluation import EvaluatorBaseTest
 
 
@@ -142,5 +143,78 @@ class ScilabEvaluationTestCases(EvaluatorBaseTest):
             self.assertFalse(any(children_procs.children(recursive=True)))
 
 
+class ScilabSessionEvaluationTestCases(ScilabEvaluationTestCases):
+    """Runs the tests in a Scilab interpreter session."""
+    def setUp(self):
+        super(ScilabSessionEvaluationTestCases, self).setUp()
+        interpreter_session.INTERPRETER_SESSIONS = True
+        self.user_answer = ("funcprot(0)\nfunction[c]=add(a,b)"
+                            "\n\tc=a+b;\nendfunction")
+
+    def tearDown(self):
+        interpreter_session.finish_job()
+        interpreter_session.INTERPRETER_SESSIONS = False
+        super(ScilabSessionEvaluationTestCases, self).tearDown()
+
+    def evaluate(self, test_cases):
+        kwargs = {
+                  'metadata': {
+                    'user_answer': self.user_answer,
+                    'file_paths': self.file_paths,
+                    'partial_grading': True,
+                    'language': 'scilab'
+                    }, 'test_case_data': [
+                        {"test_case": test_case,
+                         "test_case_type": "standardtestcase",
+                         "weight": 1.0}
+                        for test_case in test_cases
+                    ],
+                  }
+        return Grader(self.in_dir).evaluate(kwargs)
+
+    def test_exit_only_ends_the_run(self):
+        # Given
+        test_case = dedent("""
+            exec("function.sci",-1);
+            if add(3,5) == 8 then
+             exit(5);
+            end
+            disp("not reached")
+            """)
+
+        # When
+        result = self.evaluate([test_case, test_case])
+
+        # Then
+        self.assertTrue(result.get('success'))
+        self.assertEqual(result.get('weight'), 2.0)
+
+    def test_session_is_replaced_after_a_crash(self):
+        # Given
+        crash = 'unix("kill -9 " + string(getpid()));\nexit(5);\n'
+
+        # When
+        result = self.evaluate([crash, self.tc_data])
+
+        # Then
+        self.assertFalse(result.get('success'))
+        self.assertEqual(result.get('weight'), 1.0)
+        self.assertEqual(len(result.get('error')), 1)
+
+    def test_session_is_replaced_after_a_timeout(self):
+        # Given
+        loop = 'while (1==1)\nend\n'
+
+        # When
+        timed_out = self.evaluate([loop])
+        result = self.evaluate([self.tc_data])
+
+        # Then
+        self.assertFalse(timed_out.get('success'))
+        self.assert_correct_output(self.timeout_msg,
+                                   timed_out.get('error')[0]['message'])
+        self.assertTrue(result.get('success'))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,3 +1,4 @@
+import base64
 import shutil
 import os
 import zipfile
@@ -22,6 +23,29 @@ def copy_files(file_paths):
     return files
 
 
+def embed_files(file_paths):
+    """ Read the files of a job, takes tuple with file paths and extract
+    status and returns [name, extract, base64 content] for each file"""
+    files = []
+    for file_path, extract in file_paths:
+        with open(file_path, 'rb') as f:
+            content = base64.b64encode(f.read()).decode('ascii')
+        files.append([os.path.basename(file_path), extract, content])
+    return files
+
+
+def write_files(files, path):
+    """ Write files embedded by embed_files to path and return their
+    file paths and extract status"""
+    file_paths = []
+    for name, extract, content in files:
+        file_path = os.path.join(path, os.path.basename(name))
+        with open(file_path, 'wb') as f:
+            f.write(base64.b64decode(content))
+        file_paths.append([file_path, extract])
+    return file_paths
+
+
 def delete_files(files, file_path=None):
     """ Delete Files from directory """
     for file_name in files:
@@ -0,0 +1,109 @@
+"""A cache of grading results, used by the server pool so that identical
+submissions are not evaluated again.
+
+A result is keyed by a hash of the json data of the job, which holds the
+answer, the language and the test cases, together with the path, size and
+modification time of every file of the question.  Editing a question's test
+cases or files therefore changes the key, and the results graded against the
+old version are never found again; they age out of the cache.
+
+Jobs whose files cannot be fingerprinted, assignment uploads or files served
+from a URL, are not cached.  Neither are results of jobs which timed out or
+whose process died, as these depend on the load of the machine.
+"""
+from __future__ import unicode_literals
+import hashlib
+import json
+import os
+import time
+
+# Local imports
+from .settings import GRADE_CACHE_SIZE, GRADE_CACHE_TTL
+from .result_store import ResultStore
+
+
+class GradeCache(object):
+    def __init__(self, max_size=GRADE_CACHE_SIZE, ttl=GRADE_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        # The store evicts the least recently used results, a hit updates
+        # the result so it is kept longer.
+        self._results = ResultStore(max_size=max_size, ttl=0)
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def __len__(self):
+        return len(self._results)
+
+    # Public Protocol ##########
+    def make_key(self, json_data):
+        """Return the key for the given json data of a job, or None if the
+        job may not be cached.
+        """
+        if not self.enabled:
+            return None
+        try:
+            data = json.loads(json_data)
+            metadata = data['metadata']
+        except (ValueError, TypeError, KeyError):
+            return None
+        if metadata.get('assign_files'):
+            return None
+        digest = hashlib.sha256(
+            json.dumps(data, sort_keys=True).encode('utf-8')
+        )
+        for path, extract in metadata.get('file_paths') or []:
+            try:
+                stat = os.stat(path)
+            except (OSError, TypeError):
+                return None
+            digest.update('{0}:{1}:{2}'.format(
+                path, stat.st_size, stat.st_mtime
+            ).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the cached result, a json string, for the key or None."""
+        item = self._results.get(key)
+        if item is None or self._expired(item):
+            self._results.pop(key)
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._results.set(key, item)
+        return item['result']
+
+    def set(self, key, result):
+        """Cache the json `result` of a job unless it should be graded again
+        when resubmitted.
+        """
+        if self._is_cacheable(result):
+            self._results.set(
+                key, dict(status='done', result=result, graded=time.time())
+            )
+
+    def stats(self):
+        stats = self._results.stats()
+        stats.update(ttl=self.ttl, hits=self.hits, misses=self.misses)
+        return stats
+
+    # Private Protocol ##########
+    def _expired(self, item):
+        return bool(self.ttl) and time.time() - item['graded'] > self.ttl
+
+    def _is_cacheable(self, result):
+        try:
+            errors = json.loads(result).get('error') or []
+        except (ValueError, TypeError, AttributeError):
+            return False
+        for error in errors:
+            # Errors of the code server itself are plain strings.
+            if not isinstance(error, dict):
+                return False
+            if error.get('exception') == 'TimeoutException':
+                return False
+        return True
@@ -3,8 +3,11 @@ from __future__ import unicode_literals
 import sys
 import os
 import contextlib
+from collections import OrderedDict
 from os.path import dirname, abspath
+import shutil
 import signal
+import tempfile
 import traceback
 
 
@@ -12,6 +15,8 @@ import traceback
 from .settings import SERVER_TIMEOUT
 from .language_registry import create_evaluator_instance
 from .error_messages import prettify_exceptions
+from .file_utils import write_files
+from . import resource_usage, compile_cache, interpreter_session, cpp_harness
 
 MY_DIR = abspath(dirname(__file__))
 registry = None
@@ -23,6 +28,13 @@ class TimeoutException(Exception):
     pass
 
 
+class JobCancelled(TimeoutException):
+    """Raised in the code server when the job is cancelled.  It unwinds as a
+    timeout does, so that the evaluators kill the processes they started.
+    """
+    pass
+
+
 class CompilationError(Exception):
     pass
 
@@ -94,15 +106,39 @@ class Grader(object):
         Returns
         -------
 
-        A tuple: (success, error, weight).
+        A dict with the keys success, error, weight and resources, the
+        resources used by each test case as measured by `resource_usage`.
         """
         self.setup()
+        resource_usage.start_job()
+        compile_cache.start_job()
+        metadata = kwargs.get('metadata') or {}
+        files_dir = None
+        if metadata.get('files'):
+            # The files were sent with the job by a coordinator.
+            files_dir = tempfile.mkdtemp(prefix='yaksh_files_')
+            metadata['file_paths'] = write_files(
+                metadata.pop('files'), files_dir
+            )
         test_case_instances = self.get_evaluator_objects(kwargs)
         with change_dir(self.in_dir):
             success, error, weight = self.safe_evaluate(test_case_instances)
         self.teardown()
-
-        result = {'success': success, 'error': error, 'weight': weight}
+        if files_dir is not None:
+            shutil.rmtree(files_dir, ignore_errors=True)
+        compile_cache.finish_job()
+        interpreter_session.finish_job()
+        cpp_harness.finish_job()
+        resources = resource_usage.finish_job()
+        test_case_data = kwargs.get('test_case_data') or [{}]
+        resources.update(
+            question_id=metadata.get('question_id'),
+            language=metadata.get('language'),
+            test_case_type=test_case_data[0].get('test_case_type')
+        )
+
+        result = {'success': success, 'error': error, 'weight': weight,
+                  'resources': resources}
         return result
 
     # Private Protocol ##########
@@ -119,6 +155,14 @@ class Grader(object):
         for test_case in test_case_data:
             test_case_instance = create_evaluator_instance(metadata, test_case)
             test_case_instances.append(test_case_instance)
+        # Let each evaluator class prepare its test cases together.
+        by_class = OrderedDict()
+        for test_case_instance in test_case_instances:
+            by_class.setdefault(type(test_case_instance), []).append(
+                test_case_instance
+            )
+        for cls, instances in by_class.items():
+            cls.prepare(instances)
         return test_case_instances
 
     def safe_evaluate(self, test_case_instances):
@@ -140,8 +184,11 @@ class Grader(object):
             # Run evaluator selection registry here
             for idx, test_case_instance in enumerate(test_case_instances):
                 test_case_success = False
-                test_case_instance.compile_code()
-                eval_result = test_case_instance.check_code()
+                resource_usage.start_test_case()
+                with resource_usage.phase('compile'):
+                    test_case_instance.compile_code()
+                with resource_usage.phase('run'):
+                    eval_result = test_case_instance.check_code()
                 test_case_success, err, mark_fraction = eval_result
                 if not isinstance(err, dict):
                     err = prettify_exceptions('Error', err)
@@ -0,0 +1,272 @@
+"""Long lived Scilab and R interpreters used by the code servers.
+
+Starting `scilab-cli` or `Rscript` takes far longer than running a typical
+test case.  When `INTERPRETER_SESSIONS` is set, a code server keeps one
+interpreter per language running and sends it the code of each test case on
+its stdin.  The code ends by printing a line starting with a token which is
+random for every session, followed by the exit status of the run, so the
+code server knows where the output of a run ends.  stderr goes to a file
+which is read once the token is seen.
+
+A session only serves the test cases of one job and is stopped when the
+job is done.  Clearing the variables cannot undo everything a run may
+change, such as options, attached packages or Scilab globals, so an
+interpreter is never shared by the jobs of different students.  Before
+every run the session is reset: the variables and functions of the previous
+run are cleared, the working directory is changed to that of the job and
+`exit` (Scilab) or `quit` and `q` (R) are replaced by functions which end
+the run with the given status instead of the interpreter.
+
+A session is killed when a run times out, and replaced after
+`INTERPRETER_SESSION_MAX_RUNS` runs or when the interpreter dies.
+"""
+from __future__ import unicode_literals
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import uuid
+
+# Local imports
+from .settings import INTERPRETER_SESSIONS, INTERPRETER_SESSION_MAX_RUNS
+
+pool = None
+
+
+def get_session(language):
+    """Return the session for `language` of this code server, or None if
+    sessions are disabled.
+    """
+    global pool
+    if not INTERPRETER_SESSIONS:
+        return None
+    if pool is None:
+        pool = SessionPool()
+    return pool.get(language)
+
+
+def finish_job():
+    """Stop the sessions used by the job which is done."""
+    if pool is not None:
+        pool.stop()
+
+
+class SessionProcess(object):
+    """Stands in for the Popen object of a run in a session."""
+    def __init__(self, returncode):
+        self.returncode = returncode
+
+
+class InterpreterSession(object):
+    command = []
+
+    def __init__(self, max_runs=INTERPRETER_SESSION_MAX_RUNS):
+        self.max_runs = max_runs
+        self.proc = None
+        self.stderr_fd = None
+        self.token = None
+        self.runs = 0
+
+    # Public Protocol ##########
+    def start(self):
+        if self.proc is not None and self.proc.poll() is None:
+            return
+        self.stop()
+        self.token = uuid.uuid4().hex
+        fd, path = tempfile.mkstemp(prefix='yaksh_session_')
+        os.close(fd)
+        # stderr is appended to, so the file can be truncated between runs.
+        self.stderr_fd = os.open(path, os.O_RDWR | os.O_APPEND)
+        os.remove(path)
+        self.proc = subprocess.Popen(
+            self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=self.stderr_fd, preexec_fn=os.setpgrp
+        )
+
+    def run(self, script_path):
+        """Run the script in the current directory after resetting the
+        session.  Return a Popen like object with the exit status, stdout
+        and stderr, as `BaseEvaluator._run_command` does.
+        """
+        self.start()
+        os.ftruncate(self.stderr_fd, 0)
+        code = self.reset_code(os.getcwd()) + self.run_code(script_path)
+        lines = []
+        status = None
+        try:
+            self.proc.stdin.write(code.encode('utf-8'))
+            self.proc.stdin.flush()
+            for line in iter(self.proc.stdout.readline, b''):
+                line = line.decode('utf-8', 'replace')
+                if line.startswith(self.token):
+                    status = int(line.split()[1])
+                    break
+                lines.append(line)
+        except (IOError, ValueError, IndexError):
+            pass
+        except BaseException:
+            # The run timed out, so kill the runaway code with the
+            # interpreter.
+            self.stop()
+            raise
+        stdout = ''.join(lines)
+        if status is None:
+            # The interpreter died, report its exit status like a fresh
+            # interpreter would.
+            status = self.proc.wait()
+            stderr = self._read_stderr()
+            self.stop()
+        else:
+            # Drop the newline printed before the token.
+            if stdout.endswith('\n'):
+                stdout = stdout[:-1]
+            stderr = self._read_stderr()
+            self.runs += 1
+            if self.max_runs and self.runs >= self.max_runs:
+                self.stop()
+        return SessionProcess(status), stdout, stderr
+
+    def stop(self):
+        if self.proc is not None:
+            try:
+                os.killpg(os.getpgid(self.proc.pid), signal.SIGKILL)
+            except OSError:
+                pass
+            self.proc.wait()
+            self.proc.stdin.close()
+            self.proc.stdout.close()
+            self.proc = None
+        if self.stderr_fd is not None:
+            os.close(self.stderr_fd)
+            self.stderr_fd = None
+        self.runs = 0
+
+    def quote(self, string):
+        """Return `string` as a string literal of the interpreter."""
+        raise NotImplementedError("quote method not implemented")
+
+    def reset_code(self, cwd):
+        raise NotImplementedError("reset_code method not implemented")
+
+    def run_code(self, script_path):
+        raise NotImplementedError("run_code method not implemented")
+
+    # Private Protocol ##########
+    def _read_stderr(self):
+        size = os.fstat(self.stderr_fd).st_size
+        return os.pread(self.stderr_fd, size, 0).decode('utf-8', 'replace')
+
+
+class RSession(InterpreterSession):
+    command = ['R', '--vanilla', '--slave', '--no-readline']
+
+    def quote(self, string):
+        return '"{0}"'.format(
+            string.replace('\\', '\\\\').replace('"', '\\"')
+        )
+
+    def reset_code(self, cwd):
+        return (
+            'rm(list = ls(all.names = TRUE, envir = globalenv()), '
+            'envir = globalenv())\n'
+            'setwd({cwd})\n'
+            'quit <- q <- function(save = "default", status = 0, '
+            'runLast = TRUE) {{\n'
+            '  stop(structure(class = c("yaksh_quit", "condition"),\n'
+            '                 list(message = "quit", call = NULL,\n'
+            '                      status = status)))\n'
+            '}}\n'
+        ).format(cwd=self.quote(cwd))
+
+    def run_code(self, script_path):
+        # Errors and warnings are written the way Rscript writes them.
+        return (
+            'local({{\n'
+            '  status <- tryCatch(withCallingHandlers({{\n'
+            '    source({script})\n'
+            '    0L\n'
+            '  }}, warning = function(w) {{\n'
+            '    cat("Warning message:\\n", conditionMessage(w), "\\n",\n'
+            '        sep = "", file = stderr())\n'
+            '    invokeRestart("muffleWarning")\n'
+            '  }}), yaksh_quit = function(q) as.integer(q$status),\n'
+            '  error = function(e) {{\n'
+            '    call <- conditionCall(e)\n'
+            '    where <- if (is.null(call)) "" else\n'
+            '      paste0(" in ", deparse(call)[1], " ")\n'
+            '    cat("Error", where, ": ", conditionMessage(e),\n'
+            '        "\\nExecution halted\\n", sep = "", file = stderr())\n'
+            '    1L\n'
+            '  }})\n'
+            '  cat("\\n{token} ", status, "\\n", sep = "")\n'
+            '  flush(stdout())\n'
+            '}})\n'
+        ).format(script=self.quote(script_path), token=self.token)
+
+
+class ScilabSession(InterpreterSession):
+    command = ['scilab-cli', '-nb']
+
+    def __init__(self, *args, **kwargs):
+        super(ScilabSession, self).__init__(*args, **kwargs)
+        # scilab-cli does not flush its output when writing to a pipe.
+        if shutil.which('stdbuf'):
+            self.command = ['stdbuf', '-oL'] + self.command
+
+    def quote(self, string):
+        return '"{0}"'.format(string.replace('"', '""').replace("'", "''"))
+
+    def reset_code(self, cwd):
+        return (
+            'clear;\n'
+            'lines(0);\n'
+            'cd({cwd});\n'
+            'funcprot(0);\n'
+            'function exit(varargin)\n'
+            '  yaksh_s = 0;\n'
+            '  if size(varargin) > 0 then yaksh_s = varargin(1); end\n'
+            '  error("{token}-exit " + string(yaksh_s));\n'
+            'endfunction\n'
+        ).format(cwd=self.quote(cwd), token=self.token)
+
+    def run_code(self, script_path):
+        # Errors are written the way scilab-cli writes them.
+        return (
+            'yaksh_status = 0;\n'
+            'try\n'
+            '  exec({script}, 2);\n'
+            'catch\n'
+            '  [yaksh_msg, yaksh_n] = lasterror();\n'
+            '  yaksh_i = strindex(yaksh_msg, "{token}-exit ");\n'
+            '  if yaksh_i <> [] then\n'
+            '    yaksh_status = evstr(part(yaksh_msg, '
+            '(yaksh_i(1) + {skip}):length(yaksh_msg)));\n'
+            '  else\n'
+            '    mprintf("!--error %d\\n%s\\n", yaksh_n, yaksh_msg);\n'
+            '    yaksh_status = 1;\n'
+            '  end\n'
+            'end\n'
+            'mprintf("\\n{token} %d\\n", yaksh_status);\n'
+        ).format(script=self.quote(script_path), token=self.token,
+                 skip=len(self.token) + len('-exit '))
+
+
+class SessionPool(object):
+    """The sessions of the job a code server is running, one per
+    language.
+    """
+    session_classes = {'r': RSession, 'scilab': ScilabSession}
+
+    def __init__(self):
+        self.sessions = {}
+
+    def get(self, language):
+        if language not in self.sessions:
+            self.sessions[language] = self.session_classes[language]()
+        return self.sessions[language]
+
+    def stop(self):
+        for session in self.sessions.values():
+            session.stop()
+        self.sessions.clear()
@@ -9,6 +9,8 @@ from .base_evaluator import BaseEvaluator
 from .file_utils import copy_files, delete_files
 from .grader import CompilationError, TestCaseError
 from .error_messages import prettify_exceptions
+from .compile_cache import get_compile_cache, new_outputs
+from .java_runner import get_java_runner
 
 
 class JavaCodeEvaluator(BaseEvaluator):
@@ -44,7 +46,7 @@ class JavaCodeEvaluator(BaseEvaluator):
             delete_files(self.files)
 
     def get_commands(self, clean_ref_code_path, user_code_directory):
-        compile_command = 'javac  {0}'.format(self.submit_code_path),
+        compile_command = 'javac  {0}'.format(self.submit_code_path)
         compile_main = ('javac {0} -classpath '
                         '{1} -d {2}').format(clean_ref_code_path,
                                              user_code_directory,
@@ -88,19 +90,38 @@ class JavaCodeEvaluator(BaseEvaluator):
                 clean_ref_code_path,
                 user_code_directory
             )
+            self.user_code_directory = user_code_directory
+            self.ref_class_name = ref_file_name
             self.run_command_args = "java -cp {0} {1}".format(
                 user_code_directory,
                 ref_file_name
             )
 
-            self.compiled_user_answer = self._run_command(
+            # The submission is compiled once for all the test cases, every
+            # class file javac writes is cached as a submission may have
+            # more than one class.
+            cache = get_compile_cache()
+            cwd = os.getcwd()
+            user_key = cache.make_key(
+                compile_command.replace(cwd, ''), self.user_answer.lstrip(),
+                files=self.files
+            )
+            self.compiled_user_answer = cache.run(
+                user_key, new_outputs(os.path.join(cwd, '*.class')),
+                self._run_command,
                 compile_command,
                 shell=True,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE
             )
 
-            self.compiled_test_code = self._run_command(
+            main_key = cache.make_key(
+                self.compile_main.replace(cwd, ''), self.test_case.lstrip(),
+                user_key
+            )
+            self.compiled_test_code = cache.run(
+                main_key, new_outputs(os.path.join(cwd, '*.class')),
+                self._run_command,
                 self.compile_main,
                 shell=True,
                 stdout=subprocess.PIPE,
@@ -109,6 +130,19 @@ class JavaCodeEvaluator(BaseEvaluator):
 
             return self.compiled_user_answer, self.compiled_test_code
 
+    def _run_main(self):
+        """Run the test code, in the persistent JVM if it is enabled."""
+        runner = get_java_runner()
+        proc = runner and runner.process(self.user_code_directory,
+                                         self.ref_class_name)
+        if proc is None:
+            return self._run_command(self.run_command_args, shell=True,
+                                     stdin=None,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE)
+        stdout, stderr = proc.communicate()
+        return proc, stdout.decode('utf-8'), stderr.decode('utf-8')
+
     def check_code(self):
         """ Function validates student code using instructor code as
         reference.The first argument ref_code_path, is the path to
@@ -142,11 +176,7 @@ class JavaCodeEvaluator(BaseEvaluator):
             main_err = self._remove_null_substitute_char(main_err)
 
             if main_err == '':
-                ret = self._run_command(self.run_command_args, shell=True,
-                                        stdin=None,
-                                        stdout=subprocess.PIPE,
-                                        stderr=subprocess.PIPE)
-                proc, stdout, stderr = ret
+                proc, stdout, stderr = self._run_main()
                 if proc.returncode == 0:
                     success, err = True, None
                     mark_fraction = 1.0 if self.partial_grading else 0.0
@@ -0,0 +1,350 @@
+"""A persistent JVM which runs the compiled Java submissions of a code server.
+
+Starting a JVM for every test case costs far more than running a typical
+test case.  When `JAVA_RUNNER` is set, a code server starts one JVM running
+the small `YakshRunner` class below and sends it the classpath and main
+class of each run on its stdin.  The runner loads the classes in a fresh
+class loader, so that no static state leaks between runs, runs the main
+method with stdin, stdout and stderr redirected, turns a call to
+`System.exit` into the exit status of the run, and replies with a header
+line followed by the captured output.
+
+A JVM cannot change its working directory, so the JVM is started in the
+directory of the job and replaced when a job from another directory comes
+along; all the test cases of a submission share one JVM.  It is also killed
+when a run times out, and is replaced after `JAVA_RUNNER_MAX_RUNS` runs,
+to bound the memory student code may leave behind, or after a run which
+leaves threads running, which would otherwise run on into the next runs.
+A new one is started on the next run.  If the runner fails otherwise, as
+when the student code writes to the real stdout and breaks the protocol,
+the JVM is killed and the run is made again in a new JVM of its own.
+`System.exit` is intercepted with a SecurityManager, which is not available
+from Java 24 on; the evaluators then fall back to a JVM per run.
+"""
+from __future__ import unicode_literals
+import hashlib
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+
+# Local imports
+from .settings import JAVA_RUNNER, JAVA_RUNNER_MAX_RUNS
+from .grader import TimeoutException
+from .resource_usage import AccountedPopen
+
+READY = b'YAKSH-READY'
+RESULT = b'YAKSH-RESULT'
+
+RUNNER_SOURCE = r'''
+import java.io.*;
+import java.lang.reflect.*;
+import java.net.*;
+import java.nio.charset.StandardCharsets;
+import java.security.Permission;
+
+public class YakshRunner {
+    static class ExitException extends SecurityException {
+        final int status;
+        ExitException(int status) {
+            super("System.exit(" + status + ")");
+            this.status = status;
+        }
+    }
+
+    static String readLine(InputStream in) throws IOException {
+        ByteArrayOutputStream line = new ByteArrayOutputStream();
+        int c;
+        while ((c = in.read()) != '\n') {
+            if (c == -1) return null;
+            line.write(c);
+        }
+        return new String(line.toByteArray(), StandardCharsets.UTF_8);
+    }
+
+    // Threads the run started and left running, which would otherwise run
+    // on into the next runs.
+    static int leftoverThreads() {
+        int n = 0;
+        for (Thread t : Thread.getAllStackTraces().keySet()) {
+            if (t != Thread.currentThread() && t.isAlive() && !t.isDaemon())
+                n++;
+        }
+        return n;
+    }
+
+    static ExitException findExit(Throwable e) {
+        for (; e != null; e = e.getCause()) {
+            if (e instanceof ExitException) return (ExitException) e;
+        }
+        return null;
+    }
+
+    public static void main(String[] args) throws Exception {
+        DataInputStream in = new DataInputStream(
+            new BufferedInputStream(new FileInputStream(FileDescriptor.in)));
+        OutputStream out = new BufferedOutputStream(
+            new FileOutputStream(FileDescriptor.out));
+        PrintStream realErr = System.err;
+        System.setSecurityManager(new SecurityManager() {
+            public void checkExit(int status) {
+                throw new ExitException(status);
+            }
+            public void checkPermission(Permission perm) {}
+            public void checkPermission(Permission perm, Object context) {}
+        });
+        out.write("YAKSH-READY\n".getBytes(StandardCharsets.UTF_8));
+        out.flush();
+
+        String request;
+        // A request is "<classpath>\t<main class>\t<length of stdin>\n"
+        // followed by the stdin of the run.
+        while ((request = readLine(in)) != null) {
+            String[] parts = request.split("\t");
+            byte[] input = new byte[Integer.parseInt(parts[2])];
+            in.readFully(input);
+            ByteArrayOutputStream stdout = new ByteArrayOutputStream();
+            ByteArrayOutputStream stderr = new ByteArrayOutputStream();
+            System.setIn(new ByteArrayInputStream(input));
+            System.setOut(new PrintStream(stdout, true, "UTF-8"));
+            System.setErr(new PrintStream(stderr, true, "UTF-8"));
+            int status = 0;
+            URLClassLoader loader = new URLClassLoader(
+                new URL[] {new File(parts[0]).toURI().toURL()},
+                ClassLoader.getSystemClassLoader().getParent());
+            try {
+                Class<?> cls = Class.forName(parts[1], true, loader);
+                Method main = cls.getMethod("main", String[].class);
+                main.invoke(null, (Object) new String[0]);
+            } catch (Throwable e) {
+                if (e instanceof InvocationTargetException) {
+                    e = e.getCause();
+                }
+                ExitException exit = findExit(e);
+                if (exit != null) {
+                    status = exit.status;
+                } else {
+                    System.err.print("Exception in thread \"main\" ");
+                    e.printStackTrace();
+                    status = 1;
+                }
+            } finally {
+                System.out.flush();
+                System.err.flush();
+                System.setErr(realErr);
+                loader.close();
+            }
+            byte[] outBytes = stdout.toByteArray();
+            byte[] errBytes = stderr.toByteArray();
+            String header = "YAKSH-RESULT " + status + " " + outBytes.length
+                + " " + errBytes.length + " " + leftoverThreads() + "\n";
+            out.write(header.getBytes(StandardCharsets.UTF_8));
+            out.write(outBytes);
+            out.write(errBytes);
+            out.flush();
+        }
+    }
+}
+'''
+
+# The compiled runner is shared by the code servers of a machine, under a
+# name which changes with its source.
+RUNNER_DIR = os.path.join(
+    tempfile.gettempdir(), 'yaksh_java_runner_%s' % hashlib.sha256(
+        RUNNER_SOURCE.encode('utf-8')).hexdigest()[:12]
+)
+
+runner = None
+
+
+def get_java_runner():
+    """Return the JavaRunner of this code server, or None if the persistent
+    JVM is disabled.
+    """
+    global runner
+    if not JAVA_RUNNER:
+        return None
+    if runner is None:
+        runner = JavaRunner()
+    return runner
+
+
+class RunnerError(Exception):
+    pass
+
+
+class RunnerProcess(object):
+    """Stands in for the Popen object of a run on the JavaRunner.  If the
+    runner fails, the run is made again in a new JVM.
+    """
+    def __init__(self, runner, classpath, main_class):
+        self.runner = runner
+        self.classpath = classpath
+        self.main_class = main_class
+        self.pid = runner.proc.pid
+        self.returncode = None
+
+    def communicate(self, input=None):
+        try:
+            self.returncode, stdout, stderr = self.runner.run(
+                self.classpath, self.main_class, input or b''
+            )
+        except RunnerError:
+            return self._run_in_new_jvm(input)
+        return stdout, stderr
+
+    # Private Protocol ##########
+    def _run_in_new_jvm(self, input):
+        proc = AccountedPopen(
+            ['java', '-cp', self.classpath, self.main_class],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, preexec_fn=os.setpgrp
+        )
+        self.pid = proc.pid
+        try:
+            stdout, stderr = proc.communicate(input)
+        except TimeoutException:
+            try:
+                os.killpg(os.getpgid(proc.pid), signal.SIGKILL)
+            except OSError:
+                pass
+            raise
+        self.returncode = proc.returncode
+        return stdout, stderr
+
+
+class JavaRunner(object):
+    def __init__(self, max_runs=JAVA_RUNNER_MAX_RUNS,
+                 runner_dir=RUNNER_DIR):
+        self.max_runs = max_runs
+        self.runner_dir = runner_dir
+        self.proc = None
+        self.cwd = None
+        self.runs = 0
+        # Set once the runner could not be compiled or started.
+        self.broken = False
+
+    # Public Protocol ##########
+    def start(self):
+        """Start the JVM unless it is running, return False if the runner
+        is unavailable.
+        """
+        if self.broken:
+            return False
+        if (self.proc is not None and self.proc.poll() is None and
+                self.cwd == os.getcwd()):
+            return True
+        self.stop()
+        try:
+            self._compile()
+            # The SecurityManager has to be allowed explicitly from Java 18
+            # on, while older releases do not know the option.
+            for options in (['-Djava.security.manager=allow'], []):
+                if self._start_jvm(options):
+                    return True
+        except (OSError, RunnerError):
+            pass
+        self.broken = True
+        return False
+
+    def process(self, classpath, main_class):
+        """Return a Popen like object to run `main_class`, None if the
+        runner is unavailable.
+        """
+        if not self.start():
+            return None
+        return RunnerProcess(self, classpath, main_class)
+
+    def run(self, classpath, main_class, input=b''):
+        """Run the main method of `main_class`, return the exit status,
+        stdout and stderr, the latter two as bytes.
+        """
+        if not self.start():
+            raise RunnerError("The Java runner is unavailable.")
+        request = '{0}\t{1}\t{2}\n'.format(classpath, main_class, len(input))
+        try:
+            self.proc.stdin.write(request.encode('utf-8') + input)
+            self.proc.stdin.flush()
+            header = self.proc.stdout.readline().split()
+            if len(header) != 5 or header[0] != RESULT:
+                raise RunnerError("Unexpected reply from the Java runner.")
+            status, out_len, err_len, threads = [int(x) for x in header[1:]]
+            stdout = self._read(out_len)
+            stderr = self._read(err_len)
+        except TimeoutException:
+            # The student code is still running, so the JVM is replaced.  The
+            # process is reaped when the next run starts a new one, the
+            # caller may still signal its group.
+            self._kill()
+            raise
+        except (RunnerError, IOError, ValueError) as e:
+            # The JVM is in an unknown state, as when the student code
+            # wrote to the real stdout.
+            self.stop()
+            raise RunnerError(str(e))
+        self.runs += 1
+        if threads or (self.max_runs and self.runs >= self.max_runs):
+            # Threads left running by the student code are stopped with
+            # the JVM.
+            self.stop()
+        return status, stdout, stderr
+
+    def stop(self):
+        if self.proc is None:
+            return
+        self._kill()
+        self.proc.wait()
+        for stream in (self.proc.stdin, self.proc.stdout):
+            stream.close()
+        self.proc = None
+        self.runs = 0
+
+    # Private Protocol ##########
+    def _kill(self):
+        try:
+            os.killpg(os.getpgid(self.proc.pid), signal.SIGKILL)
+        except OSError:
+            pass
+
+    def _compile(self):
+        if os.path.exists(os.path.join(self.runner_dir, 'YakshRunner.class')):
+            return
+        parent = os.path.dirname(self.runner_dir)
+        # Compile in a temporary directory and rename it, so that other code
+        # servers never see a half written class.
+        tmp_dir = tempfile.mkdtemp(dir=parent)
+        source = os.path.join(tmp_dir, 'YakshRunner.java')
+        with open(source, 'w') as f:
+            f.write(RUNNER_SOURCE)
+        proc = subprocess.Popen(
+            ['javac', '-nowarn', '-d', tmp_dir, source],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        proc.communicate()
+        if proc.returncode != 0:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise RunnerError("Could not compile the Java runner.")
+        try:
+            os.rename(tmp_dir, self.runner_dir)
+        except OSError:
+            # Another code server compiled it first.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _start_jvm(self, options):
+        self.cwd = os.getcwd()
+        self.proc = subprocess.Popen(
+            ['java'] + options + ['-cp', self.runner_dir, 'YakshRunner'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, preexec_fn=os.setpgrp
+        )
+        if self.proc.stdout.readline().strip() == READY:
+            return True
+        self.stop()
+        return False
+
+    def _read(self, size):
+        data = self.proc.stdout.read(size)
+        if len(data) != size:
+            raise RunnerError("The Java runner exited.")
+        return data
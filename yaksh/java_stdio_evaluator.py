@@ -7,7 +7,10 @@ from os.path import isfile
 # Local imports
 from .stdio_evaluator import StdIOEvaluator
 from .file_utils import copy_files, delete_files
+from .resource_usage import AccountedPopen
 from .grader import CompilationError
+from .compile_cache import get_compile_cache, new_outputs
+from .java_runner import get_java_runner
 
 
 class JavaStdIOEvaluator(StdIOEvaluator):
@@ -53,11 +56,22 @@ class JavaStdIOEvaluator(StdIOEvaluator):
                                                     'Test'
                                                     )
         self.compile_command = self.get_commands()
-        self.compiled_user_answer = self._run_command(self.compile_command,
-                                                      shell=True,
-                                                      stdout=subprocess.PIPE,
-                                                      stderr=subprocess.PIPE
-                                                      )
+        # The submission is compiled once for all the test cases.
+        cache = get_compile_cache()
+        cwd = os.getcwd()
+        user_key = cache.make_key(self.compile_command.replace(cwd, ''),
+                                  self.user_answer.lstrip(), files=self.files
+                                  )
+        self.compiled_user_answer = cache.run(user_key,
+                                              new_outputs(
+                                                  os.path.join(cwd, '*.class')
+                                              ),
+                                              self._run_command,
+                                              self.compile_command,
+                                              shell=True,
+                                              stdout=subprocess.PIPE,
+                                              stderr=subprocess.PIPE
+                                              )
         return self.compiled_user_answer
 
     def check_code(self):
@@ -66,13 +80,16 @@ class JavaStdIOEvaluator(StdIOEvaluator):
         proc, stdnt_out, stdnt_stderr = self.compiled_user_answer
         stdnt_stderr = self._remove_null_substitute_char(stdnt_stderr)
         if stdnt_stderr == '' or "error" not in stdnt_stderr:
-            proc = subprocess.Popen("java Test",
-                                    shell=True,
-                                    stdin=subprocess.PIPE,
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE,
-                                    preexec_fn=os.setpgrp
-                                    )
+            runner = get_java_runner()
+            proc = runner and runner.process(os.getcwd(), 'Test')
+            if proc is None:
+                proc = AccountedPopen("java Test",
+                                      shell=True,
+                                      stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE,
+                                      stderr=subprocess.PIPE,
+                                      preexec_fn=os.setpgrp
+                                      )
             success, err = self.evaluate_stdio(self.user_answer, proc,
                                                self.expected_input,
                                                self.expected_output
@@ -0,0 +1,115 @@
+"""A journal on disk of the jobs of a server pool, to survive its restarts.
+
+The server pool keeps its queues and results in memory.  Without a journal,
+a restart loses them: students see the status "unknown" and regrades
+blocking on `get_result` wait forever.  With a journal, the pool writes
+each job to a SQLite database in WAL mode:
+
+- when it is accepted into a queue;
+- when a code server starts it;
+- when it is done, with its result;
+- when its result is fetched or expires.
+
+A restarted pool queues the unfinished jobs again, those queued and those
+which were running, and serves the results which have not expired.
+
+Accepting and finishing a job are committed at once, so no job or result
+is lost.  The other writes are committed with the next commit, as losing
+them only means a job is marked queued instead of running, or a result is
+kept till it expires.  With ``synchronous=NORMAL`` a commit in WAL mode
+appends to the log without waiting for the disk.  A crash of the process
+loses nothing; a crash of the machine may lose the last commits.
+"""
+from __future__ import unicode_literals
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    uid TEXT PRIMARY KEY,
+    json_data TEXT,
+    user_dir TEXT,
+    priority TEXT,
+    state TEXT NOT NULL,
+    result TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, updated);
+"""
+
+
+class Journal(object):
+    def __init__(self, path):
+        """Open the journal at `path`, creating it if need be."""
+        self.path = path
+        # The pool opens the journal and then uses it from its IOLoop, which
+        # may run in another thread, never from two threads at once.
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+
+    # Public Protocol ##########
+    def accept(self, uid, json_data, user_dir, priority):
+        """Record a job queued, or queued again."""
+        self._db.execute(
+            'INSERT OR REPLACE INTO jobs (uid, json_data, user_dir, priority,'
+            ' state, updated) VALUES (?, ?, ?, ?, ?, ?)',
+            (uid, json_data, user_dir, priority, 'queued', time.time())
+        )
+        self._db.commit()
+
+    def start(self, uid):
+        self._db.execute(
+            "UPDATE jobs SET state = 'running', updated = ? WHERE uid = ?",
+            (time.time(), uid)
+        )
+
+    def finish(self, uid, json_result):
+        """Record the result of a job, its data is not needed any more."""
+        self._db.execute(
+            'INSERT OR REPLACE INTO jobs (uid, state, result, updated) '
+            'VALUES (?, ?, ?, ?)', (uid, 'done', json_result, time.time())
+        )
+        self._db.commit()
+
+    def forget(self, uid):
+        """Forget a job whose result was fetched."""
+        self._db.execute('DELETE FROM jobs WHERE uid = ?', (uid,))
+
+    def expire(self, ttl):
+        """Forget the results which are older than `ttl` seconds."""
+        if not ttl:
+            return
+        self._db.execute(
+            "DELETE FROM jobs WHERE state = 'done' AND updated < ?",
+            (time.time() - ttl,)
+        )
+        self._db.commit()
+
+    def unfinished(self):
+        """Return the (uid, json_data, user_dir, priority, state) of the
+        jobs not done, in the order they were queued.
+        """
+        return self._db.execute(
+            "SELECT uid, json_data, user_dir, priority, state FROM jobs "
+            "WHERE state != 'done' ORDER BY rowid"
+        ).fetchall()
+
+    def finished(self, ttl):
+        """Return the (uid, json_result, time done) of the jobs done less
+        than `ttl` seconds ago, or ever if `ttl` is 0, oldest first.
+        """
+        since = time.time() - ttl if ttl else 0.0
+        return self._db.execute(
+            "SELECT uid, result, updated FROM jobs WHERE state = 'done' "
+            "AND updated >= ? ORDER BY updated", (since,)
+        ).fetchall()
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
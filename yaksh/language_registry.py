@@ -23,25 +23,53 @@ def create_evaluator_instance(metadata, test_case):
     return instance
 
 
+def load_class(path):
+    """Return the class at the dotted `path`."""
+    module_name, class_name = path.rsplit(".", 1)
+    # load the module, will raise ImportError if module cannot be loaded
+    get_module = importlib.import_module(module_name)
+    # get the class, will raise AttributeError if class cannot be found
+    return getattr(get_module, class_name)
+
+
 class _LanguageRegistry(object):
     def __init__(self):
         self._register = {}
         for language, module in code_evaluators.items():
             self._register[language] = None
+        # Dotted path -> class, so that each evaluator class is imported
+        # once per process rather than for every test case.
+        self._classes = {}
 
     # Public Protocol ##########
     def get_class(self, language, test_case_type):
         """ Get the code evaluator class for the given language """
-        if not self._register.get(language):
-            self._register[language] = code_evaluators.get(language)
-        test_case_register = self._register[language]
-        cls = test_case_register.get(test_case_type)
-        module_name, class_name = cls.rsplit(".", 1)
-        # load the module, will raise ImportError if module cannot be loaded
-        get_module = importlib.import_module(module_name)
-        # get the class, will raise AttributeError if class cannot be found
-        get_class = getattr(get_module, class_name)
-        return get_class
+        # Languages not registered follow the settings, which may change.
+        test_case_register = self._register.get(language) or \
+            code_evaluators.get(language)
+        path = test_case_register.get(test_case_type)
+        cls = self._classes.get(path)
+        if cls is None:
+            cls = self._classes[path] = load_class(path)
+        return cls
+
+    def preload(self):
+        """Import the evaluator classes of every language and test case
+        type, so that the first job does not wait for them.  Return a dict
+        of the error of each ``language/test_case_type`` whose class could
+        not be imported.
+        """
+        failed = {}
+        languages = set(code_evaluators) | set(self._register)
+        for language in sorted(languages):
+            test_case_types = self._register.get(language) or \
+                code_evaluators.get(language) or {}
+            for test_case_type in test_case_types:
+                try:
+                    self.get_class(language, test_case_type)
+                except (ImportError, AttributeError) as e:
+                    failed['%s/%s' % (language, test_case_type)] = str(e)
+        return failed
 
     def register(self, language, class_names):
         """ Register a new code evaluator class for language"""
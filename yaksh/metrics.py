@@ -0,0 +1,253 @@
+"""Counters and histograms kept by the code server, served at `/metrics` in
+the Prometheus text format, or as json with `?format=json`.
+
+Recording a value costs a dict lookup and a bisect over the buckets, and a
+scrape only walks the series, so the metrics may be scraped every few
+seconds under full load.
+"""
+from __future__ import unicode_literals
+from bisect import bisect_left
+from collections import OrderedDict
+
+# Seconds, from a fast Python job to one hitting the timeout.
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                10.0, 30.0, 60.0)
+# Megabytes, for the memory of code servers.
+RSS_BUCKETS = (32, 64, 128, 256, 512, 1024, 2048)
+
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{0}="{1}"'.format(name, _escape(value))
+        for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')\
+        .replace('\n', '\\n')
+
+
+class Metric(object):
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        # tuple of label values -> value
+        self.series = OrderedDict()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labels)
+
+    def to_prometheus(self):
+        lines = ['# HELP {0} {1}'.format(self.name, self.help_text),
+                 '# TYPE {0} {1}'.format(self.name, self.kind)]
+        for key, value in self.series.items():
+            lines.extend(self._sample_lines(key, value))
+        return lines
+
+    def to_dict(self):
+        return [dict(labels=dict(zip(self.labels, key)),
+                     value=self._value_dict(value))
+                for key, value in self.series.items()]
+
+    def _sample_lines(self, key, value):
+        return ['{0}{1} {2}'.format(
+            self.name, _label_text(self.labels, key), value
+        )]
+
+    def _value_dict(self, value):
+        return value
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        self.series[key] = self.series.get(key, 0) + value
+
+    def set(self, value, **labels):
+        """Set the total of a counter kept elsewhere."""
+        self.series[self._key(labels)] = value
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        self.series[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=TIME_BUCKETS):
+        super(Histogram, self).__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        self._bounds = [repr(float(b)) for b in self.buckets] + ['+Inf']
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        series = self.series.get(key)
+        if series is None:
+            # Counts per bucket, the last for values above all buckets,
+            # then the sum of the values.
+            series = self.series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def _sample_lines(self, key, series):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self._bounds, series[:-1]):
+            cumulative += count
+            lines.append('{0}_bucket{1} {2}'.format(
+                self.name,
+                _label_text(self.labels + ('le',), key + (bound,)),
+                cumulative
+            ))
+        labels = _label_text(self.labels, key)
+        lines.append('{0}_sum{1} {2}'.format(self.name, labels, series[-1]))
+        lines.append('{0}_count{1} {2}'.format(self.name, labels, cumulative))
+        return lines
+
+    def _value_dict(self, series):
+        return dict(
+            buckets=OrderedDict(zip(self.buckets, series[:-2])),
+            over=series[-2], count=sum(series[:-1]), sum=series[-1]
+        )
+
+
+class Registry(object):
+    def __init__(self):
+        self.metrics = OrderedDict()
+
+    def _add(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError("Metric %r exists already." % metric.name)
+        self.metrics[metric.name] = metric
+        return metric
+
+    # Public Protocol ##########
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=TIME_BUCKETS):
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def to_prometheus(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.to_prometheus())
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self):
+        return OrderedDict(
+            (name, metric.to_dict()) for name, metric in self.metrics.items()
+        )
+
+
+class JobMetrics(object):
+    """The metrics of a job server, a server pool or a coordinator."""
+    def __init__(self):
+        self.registry = registry = Registry()
+        self.submitted = registry.counter(
+            'yaksh_jobs_submitted_total', "Jobs submitted.", ('priority',)
+        )
+        self.completed = registry.counter(
+            'yaksh_jobs_completed_total', "Jobs graded.",
+            ('language', 'test_case_type')
+        )
+        self.timeouts = registry.counter(
+            'yaksh_job_timeouts_total', "Jobs which hit the time limit.",
+            ('language',)
+        )
+        self.cache_hits = registry.counter(
+            'yaksh_grade_cache_hits_total',
+            "Jobs answered from the grade cache."
+        )
+        self.worker_restarts = registry.counter(
+            'yaksh_worker_restarts_total',
+            "Code servers restarted by the supervisor.", ('reason',)
+        )
+        self.requeued = registry.counter(
+            'yaksh_jobs_requeued_total',
+            "Jobs queued again after their code server died."
+        )
+        self.capacity_lost = registry.counter(
+            'yaksh_capacity_lost_seconds_total',
+            "Code server seconds lost to dead or hung code servers."
+        )
+        self.cancelled = registry.counter(
+            'yaksh_jobs_cancelled_total',
+            "Jobs cancelled, or superseded by a newer job, while queued or "
+            "running.", ('reason', 'state')
+        )
+        self.rejected = registry.counter(
+            'yaksh_jobs_rejected_total',
+            "Jobs rejected as their user had too many jobs queued or "
+            "running.", ('priority',)
+        )
+        self.recycled = registry.counter(
+            'yaksh_code_servers_recycled_total',
+            "Code servers replaced after too many jobs or too much memory.",
+            ('reason',)
+        )
+        self.recovered = registry.counter(
+            'yaksh_jobs_recovered_total',
+            "Jobs and results read back from the journal on a restart.",
+            ('state',)
+        )
+        self.worker_rss = registry.histogram(
+            'yaksh_code_server_rss_megabytes',
+            "Resident memory of the code servers after each job.",
+            buckets=RSS_BUCKETS
+        )
+        self.partition_wait = registry.histogram(
+            'yaksh_partition_queue_wait_seconds',
+            "Time jobs waited for a code server, per partition.",
+            ('partition',)
+        )
+        self.borrowed = registry.counter(
+            'yaksh_jobs_borrowed_total',
+            "Jobs run by a code server of another partition.", ('partition',)
+        )
+        self.partition_servers = registry.gauge(
+            'yaksh_partition_code_servers', "Code servers of each partition.",
+            ('partition',)
+        )
+        self.queue_wait = registry.histogram(
+            'yaksh_queue_wait_seconds',
+            "Time jobs waited for a code server.", ('priority',)
+        )
+        self.run_time = registry.histogram(
+            'yaksh_job_run_seconds', "Time taken to grade a job.",
+            ('language', 'test_case_type')
+        )
+        self.queued = registry.gauge(
+            'yaksh_jobs_queued', "Jobs waiting for a code server.",
+            ('priority',)
+        )
+        self.running = registry.gauge(
+            'yaksh_jobs_running', "Jobs being graded."
+        )
+        self.processes = registry.gauge(
+            'yaksh_code_servers', "Code server processes alive."
+        )
+        self.results = registry.gauge(
+            'yaksh_results_stored', "Results held by the result store."
+        )
+        self.evictions = registry.counter(
+            'yaksh_results_evicted_total',
+            "Results dropped by the result store before being fetched.",
+            ('reason',)
+        )
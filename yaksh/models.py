@@ -50,9 +50,12 @@ from django.db.models.fields.files import FieldFile
 from django.core.files.base import ContentFile
 # Local Imports
 from yaksh.code_server import (
-    submit, get_result as get_result_from_code_server
+    submit, submit_batch, get_result as get_result_from_code_server,
+    get_results as get_results_from_code_server
+)
+from yaksh.settings import (
+    SERVER_POOL_PORT, SERVER_HOST_NAME, REGRADE_BATCH_SIZE
 )
-from yaksh.settings import SERVER_POOL_PORT, SERVER_HOST_NAME
 from .file_utils import extract_files, delete_files
 from grades.models import GradingSystem
 
@@ -1448,6 +1451,8 @@ class Question(models.Model):
         metadata['user_answer'] = user_answer
         metadata['language'] = self.language
         metadata['partial_grading'] = self.partial_grading
+        # Lets the code server account the resources used per question.
+        metadata['question_id'] = self.id
         files = FileUpload.objects.filter(question=self)
         if files:
             if settings.USE_AWS:
@@ -2008,6 +2013,49 @@ class QuestionSet(models.Model):
 ###############################################################################
 class AnswerPaperManager(models.Manager):
 
+    def regrade(self, answerpapers, question_id,
+                server_port=SERVER_POOL_PORT):
+        """Regrade a question in all the given answer papers.
+
+        Code answers are sent to the code server in batches of
+        REGRADE_BATCH_SIZE and their results are collected together, instead
+        of making a round trip to the code server for every paper.
+        Returns a list of (success, message) as returned by
+        `AnswerPaper.regrade`.
+        """
+        url = '{0}:{1}'.format(SERVER_HOST_NAME, server_port)
+        details = []
+        jobs = []
+        to_update = {}
+        for answerpaper in answerpapers:
+            question, user_answer, answer, msg = \
+                answerpaper._get_answer_to_regrade(question_id)
+            if user_answer is None:
+                details.append((False, msg))
+                continue
+            if question.type != 'code':
+                details.append(answerpaper.regrade(question_id, server_port))
+                continue
+            json_data = question.consolidate_answer_data(
+                answer, answerpaper.user, True
+            )
+            uid = str(user_answer.id)
+            user_dir = answerpaper.user.profile.get_user_dir()
+            jobs.append((uid, json_data, user_dir))
+            to_update[uid] = (answerpaper, question, user_answer, msg)
+        for start in range(0, len(jobs), REGRADE_BATCH_SIZE):
+            submit_batch(url, jobs[start:start + REGRADE_BATCH_SIZE],
+                         priority='background')
+        results = get_results_from_code_server(
+            url, list(to_update), block=True
+        )
+        for uid, check_result in results.items():
+            answerpaper, question, user_answer, msg = to_update[uid]
+            result = json.loads(check_result.get('result'))
+            answerpaper._save_regrade_result(question, user_answer, result)
+            details.append((True, msg))
+        return details
+
     def get_attempt_numbers(self, questionpaper_id, course_id,
                             status='completed'):
         ''' Return list of attempt numbers'''
@@ -2520,7 +2568,7 @@ class AnswerPaper(models.Model):
         return dict(category_question_map)
 
     def validate_answer(self, user_answer, question, json_data=None, uid=None,
-                        server_port=SERVER_POOL_PORT):
+                        server_port=SERVER_POOL_PORT, priority=None):
         """
             Checks whether the answer submitted by the user is right or wrong.
             If right then returns correct = True, success and
@@ -2528,6 +2576,11 @@ class AnswerPaper(models.Model):
             success is True for MCQ's and multiple correct choices because
             only one attempt are allowed for them.
             For code questions success is True only if the answer is correct.
+            Code is run with the given priority on the code server, by
+            default 'exam' for answers to a quiz and 'exercise' for
+            exercises and trial quizzes.  An answer supersedes the answer
+            to the same question of this paper still waiting for the code
+            server, regrades do not.
         """
 
         result = {'success': False, 'error': ['Incorrect answer'],
@@ -2592,11 +2645,21 @@ class AnswerPaper(models.Model):
             elif question.type == 'code' or question.type == "upload":
                 user_dir = self.user.profile.get_user_dir()
                 url = '{0}:{1}'.format(SERVER_HOST_NAME, server_port)
-                submit(url, uid, json_data, user_dir)
+                if priority is None:
+                    quiz = self.question_paper.quiz
+                    priority = 'exercise' if quiz.is_exercise or \
+                        quiz.is_trial else 'exam'
+                supersede = None if priority == 'background' else \
+                    '{0}:{1}'.format(self.id, question.id)
+                submit(url, uid, json_data, user_dir, priority, supersede)
                 result = {'uid': uid, 'status': 'running'}
         return result
 
-    def regrade(self, question_id, server_port=SERVER_POOL_PORT):
+    def _get_answer_to_regrade(self, question_id):
+        """Returns the question, the latest answer to it, the answer to be
+        graded and a message describing the paper.  The answer objects are
+        None if the question cannot be regraded, the message then says why.
+        """
         try:
             question = self.questions.get(id=question_id)
             msg = 'User: {0}; Quiz: {1}; Question: {2}.\n'.format(
@@ -2606,31 +2669,24 @@ class AnswerPaper(models.Model):
                 self.user, self.question_paper.quiz.description,
                 question_id
             )
-            return False, f'{msg} Question not in the answer paper.'
+            return None, None, None, f'{msg} Question not in the answer paper.'
         user_answer = self.answers.filter(question=question).last()
         if not user_answer or not user_answer.answer:
-            return False, f'{msg} Did not answer.'
+            return question, None, None, f'{msg} Did not answer.'
         if question.type in ['mcc', 'arrange']:
             try:
                 answer = literal_eval(user_answer.answer)
                 if type(answer) is not list:
-                    return (False, f'{msg} {question.type} answer not a list.')
+                    return (question, None, None,
+                            f'{msg} {question.type} answer not a list.')
             except Exception:
-                return (False, f'{msg} {question.type} answer submission error')
+                return (question, None, None,
+                        f'{msg} {question.type} answer submission error')
         else:
             answer = user_answer.answer
-        json_data = question.consolidate_answer_data(answer, self.user, True) \
-            if question.type == 'code' else None
-        result = self.validate_answer(answer, question,
-                                      json_data, user_answer.id,
-                                      server_port=server_port
-                                      )
-        if question.type == "code":
-            url = '{0}:{1}'.format(SERVER_HOST_NAME, server_port)
-            check_result = get_result_from_code_server(url, result['uid'],
-                                                       block=True
-                                                       )
-            result = json.loads(check_result.get('result'))
+        return question, user_answer, answer, msg
+
+    def _save_regrade_result(self, question, user_answer, result):
         user_answer.correct = result.get('success')
         user_answer.error = json.dumps(result.get('error'))
         if result.get('success'):
@@ -2649,6 +2705,27 @@ class AnswerPaper(models.Model):
                 user_answer.marks = 0
         user_answer.save()
         self.update_marks('completed')
+
+    def regrade(self, question_id, server_port=SERVER_POOL_PORT):
+        question, user_answer, answer, msg = self._get_answer_to_regrade(
+            question_id
+        )
+        if user_answer is None:
+            return False, msg
+        json_data = question.consolidate_answer_data(answer, self.user, True) \
+            if question.type == 'code' else None
+        result = self.validate_answer(answer, question,
+                                      json_data, user_answer.id,
+                                      server_port=server_port,
+                                      priority='background'
+                                      )
+        if question.type == "code":
+            url = '{0}:{1}'.format(SERVER_HOST_NAME, server_port)
+            check_result = get_result_from_code_server(url, result['uid'],
+                                                       block=True
+                                                       )
+            result = json.loads(check_result.get('result'))
+        self._save_regrade_result(question, user_answer, result)
         return True, msg
 
     def __str__(self):
@@ -0,0 +1,212 @@
+"""The partitions of the code servers of a server pool by language.
+
+A burst of Java or Scilab answers, which take seconds each, would otherwise
+take every code server and hold up the Python answers taking milliseconds.
+Each partition has its own queues of jobs, by priority as in the
+`Scheduler`, and its own code servers, a share of the pool in proportion to
+its weight.  A partition is named by a language, say ``java``, or by a
+language and a test case type, say ``python/stdiobasedtestcase``; jobs of
+the languages without a partition go to the ``default`` partition.
+
+A code server whose partition has nothing queued takes the jobs of the
+other partitions, if borrowing is on, but only while another code server of
+its partition is idle, so that a partition always has a code server ready
+for its next job.  The jobs taken are those of the partition with the most
+urgent job: the highest priority, then the longest wait.
+"""
+from __future__ import unicode_literals
+from collections import OrderedDict, Counter
+import json
+
+# Local imports
+from .settings import CODE_SERVER_PARTITIONS, CODE_SERVER_BORROW
+from .scheduler import Scheduler
+
+DEFAULT_PARTITION = 'default'
+
+
+def parse_partitions(spec):
+    """Return an OrderedDict of the weight of each partition given as a list
+    of ``name:weight`` or ``name`` for a weight of 1.  A ValueError is
+    raised for a weight which is not a positive integer.
+    """
+    weights = OrderedDict()
+    for item in spec:
+        name, _, weight = item.strip().partition(':')
+        if not name:
+            continue
+        weight = int(weight) if weight else 1
+        if weight < 1:
+            raise ValueError("Weight of partition %r must be positive."
+                             % name)
+        weights[name] = weight
+    return weights
+
+
+def job_keys(json_data):
+    """Return the partition names the job may belong to, most specific
+    first.
+    """
+    try:
+        data = json.loads(json_data)
+        language = data['metadata']['language']
+        test_cases = data.get('test_case_data') or [{}]
+        test_case_type = test_cases[0].get('test_case_type')
+    except (ValueError, TypeError, KeyError, AttributeError, IndexError):
+        return []
+    keys = [language]
+    if test_case_type:
+        keys.insert(0, '%s/%s' % (language, test_case_type))
+    return keys
+
+
+class Partition(object):
+    def __init__(self, name, weight, key=None):
+        self.name = name
+        self.weight = weight
+        self.scheduler = Scheduler(key=key)
+        # pids of the code servers of this partition.
+        self.pids = set()
+        # Jobs started, and the seconds for which they waited.
+        self.started = 0
+        self.wait_sum = 0.0
+        self.max_wait = 0.0
+        # Jobs of this partition run by the code servers of others, and
+        # jobs of others run by the code servers of this one.
+        self.borrowed = 0
+        self.lent = 0
+
+    def urgency(self):
+        """Return a key which is smaller for the partition whose next job
+        should run first.
+        """
+        depths = list(self.scheduler.depths().values())
+        rank = next(i for i, depth in enumerate(depths) if depth)
+        return rank, -self.scheduler.oldest_wait()
+
+    def record_start(self, wait):
+        self.started += 1
+        self.wait_sum += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def stats(self):
+        return dict(
+            weight=self.weight, processes=len(self.pids),
+            queued=self.scheduler.depths(), started=self.started,
+            mean_wait=round(self.wait_sum / max(self.started, 1), 3),
+            max_wait=round(self.max_wait, 3),
+            oldest_wait=round(self.scheduler.oldest_wait(), 3),
+            borrowed=self.borrowed, lent=self.lent
+        )
+
+
+class Partitions(object):
+    def __init__(self, spec=CODE_SERVER_PARTITIONS,
+                 borrow=CODE_SERVER_BORROW, key=None):
+        """Create the partitions given as a list of ``name:weight``, their
+        schedulers queue the jobs by `key`, see `Scheduler`.
+        """
+        weights = parse_partitions(spec)
+        weights.setdefault(DEFAULT_PARTITION, 1)
+        self.partitions = OrderedDict(
+            (name, Partition(name, weight, key)) for name, weight in
+            weights.items()
+        )
+        self.default = self.partitions[DEFAULT_PARTITION]
+        self.borrow = borrow
+        # pid -> partition of the code server.
+        self._owner = {}
+
+    def __len__(self):
+        return sum(len(p.scheduler) for p in self.partitions.values())
+
+    def __iter__(self):
+        return iter(self.partitions.values())
+
+    # Public Protocol ##########
+    def shares(self, n):
+        """Return the number of code servers of each partition when the pool
+        runs `n`: one each, and the others shared by weight, by the largest
+        remainder.
+        """
+        if n < len(self.partitions):
+            raise ValueError("%d code servers cannot serve %d partitions."
+                             % (n, len(self.partitions)))
+        total = float(sum(p.weight for p in self))
+        rest = n - len(self.partitions)
+        quotas = [(p.name, rest * p.weight / total) for p in self]
+        shares = OrderedDict((name, 1 + int(q)) for name, q in quotas)
+        by_remainder = sorted(quotas, key=lambda item: int(item[1]) -
+                              item[1])
+        for name, quota in by_remainder[:n - sum(shares.values())]:
+            shares[name] += 1
+        return shares
+
+    def route(self, json_data):
+        """Return the partition of the job."""
+        if len(self.partitions) == 1:
+            return self.default
+        for key in job_keys(json_data):
+            if key in self.partitions:
+                return self.partitions[key]
+        return self.default
+
+    def add(self, pid, partition):
+        partition.pids.add(pid)
+        self._owner[pid] = partition
+
+    def remove(self, pid):
+        self._owner.pop(pid).pids.discard(pid)
+
+    def owner(self, pid):
+        return self._owner[pid]
+
+    def neediest(self):
+        """Return the partition most in need of another code server: the
+        one with the most queued jobs per code server, or the one furthest
+        below its weight.
+        """
+        total = float(sum(p.weight for p in self))
+        return max(self, key=lambda p: (
+            len(p.scheduler) / float(max(len(p.pids), 1)),
+            p.weight / total - len(p.pids) / float(len(self._owner) or 1)
+        ))
+
+    def match(self, idle):
+        """Return an idle code server and the partition whose next job it
+        should run, or (None, None) if no idle code server may run any of
+        the queued jobs.
+        """
+        waiting = [p for p in self if len(p.scheduler)]
+        if not waiting:
+            return None, None
+        waiting.sort(key=Partition.urgency)
+        for partition in waiting:
+            own = partition.pids & idle
+            if own:
+                return min(own), partition
+        if not self.borrow:
+            return None, None
+        idle_by_partition = Counter(self._owner[pid].name for pid in idle)
+        lenders = [pid for pid in idle
+                   if idle_by_partition[self._owner[pid].name] > 1]
+        if not lenders:
+            return None, None
+        return min(lenders), waiting[0]
+
+    def depths(self):
+        """Return the number of waiting jobs of each priority, over all the
+        partitions.
+        """
+        depths = Counter()
+        for partition in self:
+            depths.update(partition.scheduler.depths())
+        return OrderedDict(
+            (p, depths[p]) for p in self.default.scheduler.priorities
+        )
+
+    def oldest_wait(self):
+        return max(p.scheduler.oldest_wait() for p in self)
+
+    def stats(self):
+        return OrderedDict((p.name, p.stats()) for p in self)
@@ -1,6 +1,10 @@
 #!/usr/bin/env python
+import os
+import pickle
+import signal
 import sys
 import traceback
+import types
 
 # Local imports
 from .file_utils import copy_files, delete_files
@@ -10,6 +14,45 @@ from .error_messages import prettify_exceptions
 from .custom_assertion_message import (
         CustomAssertionError, check_equal, check_almost_equal
 )
+from .settings import PYTHON_TEST_ISOLATION
+
+
+def copy_scope(scope):
+    """Return a copy of the names of an executed submission.  The functions
+    it defined are rebound to the copy, so that the globals they set do not
+    change the original.  Other objects are shared.
+    """
+    copy = dict(scope)
+    for name, value in scope.items():
+        if isinstance(value, types.FunctionType) and \
+                value.__globals__ is scope:
+            func = types.FunctionType(value.__code__, copy, value.__name__,
+                                      value.__defaults__, value.__closure__)
+            func.__kwdefaults__ = value.__kwdefaults__
+            func.__qualname__ = value.__qualname__
+            func.__doc__ = value.__doc__
+            func.__dict__.update(value.__dict__)
+            copy[name] = func
+    return copy
+
+
+class Submission(object):
+    """A submission executed once for all the test cases of a job."""
+    def __init__(self, user_answer):
+        self.user_answer = user_answer
+        self.scope = None
+
+    def execute(self):
+        """Return the names the submission defines, executing it the first
+        time.  A submission which raises is executed again next time, so
+        each test case reports the error.
+        """
+        if self.scope is None:
+            submitted = compile(self.user_answer, '<string>', mode='exec')
+            scope = {}
+            exec(submitted, scope)
+            self.scope = scope
+        return self.scope
 
 
 class PythonAssertionEvaluator(BaseEvaluator):
@@ -18,6 +61,8 @@ class PythonAssertionEvaluator(BaseEvaluator):
     def __init__(self, metadata, test_case_data):
         self.exec_scope = None
         self.files = []
+        # Shared by the test cases of the job, see `prepare`.
+        self.submission = None
 
         # Set metadata values
         self.user_answer = metadata.get('user_answer')
@@ -29,6 +74,14 @@ class PythonAssertionEvaluator(BaseEvaluator):
         self.weight = test_case_data.get('weight')
         self.hidden = test_case_data.get('hidden')
 
+    @classmethod
+    def prepare(cls, test_case_instances):
+        if PYTHON_TEST_ISOLATION not in ('copy', 'fork'):
+            return
+        submission = Submission(test_case_instances[0].user_answer)
+        for instance in test_case_instances:
+            instance.submission = submission
+
     def teardown(self):
         # Delete the created file.
         if self.files:
@@ -39,6 +92,14 @@ class PythonAssertionEvaluator(BaseEvaluator):
             self.files = copy_files(self.file_paths)
         if self.exec_scope:
             return None
+        elif self.submission is not None:
+            scope = self.submission.execute()
+            # A forked test case can not change the scope of its parent.
+            if PYTHON_TEST_ISOLATION == 'fork':
+                self.exec_scope = scope
+            else:
+                self.exec_scope = copy_scope(scope)
+            return self.exec_scope
         else:
             submitted = compile(self.user_answer, '<string>', mode='exec')
             self.exec_scope = {}
@@ -46,6 +107,49 @@ class PythonAssertionEvaluator(BaseEvaluator):
             return self.exec_scope
 
     def check_code(self):
+        if self.submission is not None and PYTHON_TEST_ISOLATION == 'fork':
+            return self._check_in_child()
+        return self._check_code()
+
+    def _check_in_child(self):
+        """Run the test case in a child forked from this process and return
+        its result.  The timeout of the job interrupts the wait, the child
+        is then killed.
+        """
+        sys.stdout.flush()
+        sys.stderr.flush()
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_end)
+            try:
+                data = pickle.dumps(self._check_code())
+                with os.fdopen(write_end, 'wb') as f:
+                    f.write(data)
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(0)
+        os.close(write_end)
+        status = None
+        try:
+            with os.fdopen(read_end, 'rb') as f:
+                data = f.read()
+            status = os.waitpid(pid, 0)[1]
+        finally:
+            if status is None:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+        if data:
+            return pickle.loads(data)
+        err = prettify_exceptions(
+            'RuntimeError',
+            'The test case ended the process running it.',
+            testcase=self.test_case
+        )
+        return False, err, 0.0
+
+    def _check_code(self):
         """ Function validates user answer by running an assertion based test case
         against it
 
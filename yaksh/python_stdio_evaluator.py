@@ -10,6 +10,7 @@ except ImportError:
 from .file_utils import copy_files, delete_files
 from .base_evaluator import BaseEvaluator
 from .error_messages import compare_outputs
+from . import resource_usage
 
 
 @contextmanager
@@ -54,7 +55,8 @@ class PythonStdIOEvaluator(BaseEvaluator):
             input_buffer.write(self.expected_input)
             input_buffer.seek(0)
             sys.stdin = input_buffer
-        with redirect_stdout() as output_buffer:
+        with resource_usage.phase('run'), \
+                redirect_stdout() as output_buffer:
             exec_scope = {}
             exec(submitted, exec_scope)
         self.output_value = output_buffer.getvalue()
@@ -62,8 +64,9 @@ class PythonStdIOEvaluator(BaseEvaluator):
 
     def check_code(self):
         mark_fraction = self.weight
-        success, err = compare_outputs(self.expected_output,
-                                       self.output_value,
-                                       self.expected_input
-                                       )
+        with resource_usage.phase('compare'):
+            success, err = compare_outputs(self.expected_output,
+                                           self.output_value,
+                                           self.expected_input
+                                           )
         return success, err, mark_fraction
@@ -8,6 +8,7 @@ import re
 from .base_evaluator import BaseEvaluator
 from .file_utils import copy_files, delete_files
 from .error_messages import prettify_exceptions
+from .interpreter_session import get_session
 
 
 class RCodeEvaluator(BaseEvaluator):
@@ -54,10 +55,14 @@ class RCodeEvaluator(BaseEvaluator):
             add_err = "Please do not use quit() q() in your code.\
                         \n Otherwise your code will not be evaluated.\n"
 
-        cmd = 'Rscript main.r'
-        ret = self._run_command(cmd, shell=True, stdout=subprocess.PIPE,
-                                stderr=subprocess.PIPE
-                                )
+        session = get_session('r')
+        if session is not None:
+            ret = session.run('main.r')
+        else:
+            cmd = 'Rscript main.r'
+            ret = self._run_command(cmd, shell=True, stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE
+                                    )
         proc, stdout, stderr = ret
 
         if stderr is '':
@@ -0,0 +1,128 @@
+"""A log of the jobs submitted to a server pool and of their results.
+
+The log records real traffic, such as the answers of an exam, so it can be
+replayed against a pool later to plan its capacity; see `yaksh.replay`.
+It is a gzip file of json lines, one per event:
+
+- submit: time, uid, language, priority, user_dir, json_data;
+- result: time, uid, latency, success, weight.
+
+The latency of a job runs from its submission till its result.  The pool
+only puts each event on a queue.  A thread parses the jobs and results,
+then compresses and writes the events, so recording costs the pool little
+while it serves an exam.
+
+A restarted pool appends a new gzip member to the log.  The gzip module
+reads the members of such a file one after the other.
+"""
+from __future__ import unicode_literals
+import gzip
+import json
+from queue import Queue
+from threading import Thread
+import time
+
+# Local imports
+from .partitions import job_keys
+
+# Seconds after which written events are flushed to the file, so that a
+# crash loses little of the log.
+FLUSH_INTERVAL = 5.0
+
+
+def _outcome(json_result):
+    try:
+        result = json.loads(json_result)
+    except (ValueError, TypeError):
+        result = {}
+    return dict(success=result.get('success'), weight=result.get('weight'))
+
+
+class Recorder(object):
+    def __init__(self, path):
+        """Append the events recorded to the gzip file at `path`."""
+        self.path = path
+        # uid -> time at which the recorded job was submitted.
+        self.submitted = {}
+        self.recorded = 0
+        self._queue = Queue()
+        self._file = gzip.open(path, 'at', encoding='utf-8')
+        self._writer = Thread(target=self._write)
+        self._writer.daemon = True
+        self._writer.start()
+
+    # Private Protocol ##########
+    def _write(self):
+        flushed = time.time()
+        while True:
+            event = self._queue.get()
+            if event is None:
+                break
+            if event['event'] == 'submit':
+                keys = job_keys(event['json_data'])
+                event['language'] = keys[-1] if keys else None
+            else:
+                event.update(_outcome(event.pop('result')))
+            self._file.write(json.dumps(event) + '\n')
+            if self._queue.empty() and \
+                    time.time() - flushed > FLUSH_INTERVAL:
+                self._file.flush()
+                flushed = time.time()
+        self._file.close()
+
+    # Public Protocol ##########
+    def record_submit(self, uid, json_data, user_dir, priority):
+        now = time.time()
+        self.submitted[uid] = now
+        self.recorded += 1
+        self._queue.put(dict(
+            event='submit', time=now, uid=uid, priority=priority,
+            user_dir=user_dir, json_data=json_data
+        ))
+
+    def record_result(self, uid, json_result):
+        """Record the result of a job recorded as submitted."""
+        submitted = self.submitted.pop(uid, None)
+        if submitted is None:
+            return
+        now = time.time()
+        self._queue.put(dict(
+            event='result', time=now, uid=uid, latency=now - submitted,
+            result=json_result
+        ))
+
+    def forget(self, uid):
+        """Forget a job which will have no result, as it was cancelled."""
+        self.submitted.pop(uid, None)
+
+    def close(self):
+        """Write the events recorded and close the log."""
+        self._queue.put(None)
+        self._writer.join()
+
+
+def read_log(path):
+    """Return the jobs of the log in the order they were submitted, as
+    dicts of the submit event with the 'result' event added, or None if
+    the job had no result.
+    """
+    jobs = []
+    by_uid = {}
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get('event') == 'submit':
+                    event['result'] = None
+                    jobs.append(event)
+                    by_uid[event['uid']] = event
+                elif event.get('event') == 'result' and \
+                        event['uid'] in by_uid:
+                    by_uid.pop(event['uid'])['result'] = event
+        except EOFError:
+            # The log of a pool which crashed ends short.
+            pass
+    return jobs
@@ -0,0 +1,201 @@
+"""Replays a log of jobs recorded by a server pool against a server pool.
+
+The log is written by a pool started with ``--record`` or
+``CODE_SERVER_RECORD``, see `yaksh.recorder`.  Each job is submitted at its
+recorded offset from the first job, divided by ``--speed``, with its
+priority.  Each user directory of the log is replaced by a scratch
+directory, so the jobs of one user are still queued together.  The report
+is in json, like that of `yaksh.benchmarks.capacity`.  It compares the
+latencies of the replayed jobs with the recorded ones, overall and per
+language.  It also lists the jobs whose result differs from the recorded
+one::
+
+    $ python -m yaksh.replay exam.log.gz -n 8 --speed 2 > replay.json
+
+Recorded latencies only compare with those of a replay at speed 1 on a
+pool of the same size.
+"""
+from __future__ import unicode_literals
+from argparse import ArgumentParser
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Local imports
+from .benchmarks.capacity import (
+    current_commit, outcome, report_on, run_job, summarize
+)
+from .benchmarks.utils import pool_or_url
+from .recorder import read_log
+from .settings import N_CODE_SERVERS, SERVER_POOL_PORT, CODE_SERVER_FORK
+
+# Most differing results listed in the report.
+MAX_MISMATCHES = 50
+
+
+def same_result(recorded, result):
+    """Return True if the replayed result matches the recorded one."""
+    return result is not None and \
+        bool(result.get('success')) == bool(recorded.get('success')) and \
+        result.get('weight') == recorded.get('weight')
+
+
+class Replay(object):
+    def __init__(self, url, jobs, speed=1.0, concurrency=256):
+        """Submit the `jobs` read from a log to the server at `url`, `speed`
+        times as fast as they were recorded.
+        """
+        self.url = url
+        self.jobs = jobs
+        self.speed = speed
+        self.concurrency = concurrency
+        # (recorded job, latency, result) of the replayed jobs.
+        self.done = []
+        self.lags = []
+
+    # Private Protocol ##########
+    def _run_job(self, uid, job, user_dir, due):
+        self.lags.append(max(time.time() - due, 0.0))
+        latency, result = run_job(self.url, uid, job['json_data'], user_dir,
+                                  job.get('priority'))
+        self.done.append((job, latency, result))
+
+    def _compare(self, done, elapsed):
+        recorded = [job['result']['latency'] for job, latency, result in done
+                    if job['result']]
+        report = report_on([(latency, outcome(result))
+                            for job, latency, result in done], elapsed)
+        report['recorded_latency'] = summarize(recorded)
+        return report
+
+    # Public Protocol ##########
+    def run(self):
+        """Replay the jobs and return the report."""
+        root = tempfile.mkdtemp(prefix='yaksh_replay_')
+        user_dirs = {}
+        run_id = '%x' % int(time.time() * 1000)
+        first = self.jobs[0]['time'] if self.jobs else 0.0
+        start = time.time()
+        try:
+            with ThreadPoolExecutor(self.concurrency) as executor:
+                for i, job in enumerate(self.jobs):
+                    due = start + (job['time'] - first) / self.speed
+                    delay = due - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                    user_dir = job.get('user_dir')
+                    if user_dir:
+                        user_dir = user_dirs.setdefault(user_dir, os.path.join(
+                            root, 'user%d' % len(user_dirs)
+                        ))
+                    executor.submit(
+                        self._run_job, 'replay-%s-%d' % (run_id, i), job,
+                        user_dir, due
+                    )
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+        elapsed = time.time() - start
+        span = self.jobs[-1]['time'] - first if self.jobs else 0.0
+
+        mismatches = []
+        unrecorded = 0
+        by_language = defaultdict(list)
+        for job, latency, result in self.done:
+            by_language[job.get('language') or 'unknown'].append(
+                (job, latency, result)
+            )
+            if job['result'] is None:
+                unrecorded += 1
+            elif not same_result(job['result'], result):
+                mismatches.append(OrderedDict([
+                    ('uid', job['uid']),
+                    ('language', job.get('language')),
+                    ('recorded', dict(success=job['result']['success'],
+                                      weight=job['result']['weight'])),
+                    ('replayed', None if result is None else dict(
+                        success=result.get('success'),
+                        weight=result.get('weight')
+                    )),
+                ]))
+
+        report = OrderedDict([
+            ('commit', current_commit()),
+            ('url', self.url),
+            ('speed', self.speed),
+            ('recorded_span', round(span, 3)),
+            ('elapsed', round(elapsed, 3)),
+            ('max_lag', round(max(self.lags or [0.0]), 4)),
+        ])
+        report.update(self._compare(self.done, elapsed))
+        report['unrecorded_results'] = unrecorded
+        report['mismatched'] = len(mismatches)
+        report['mismatches'] = mismatches[:MAX_MISMATCHES]
+        report['languages'] = OrderedDict(
+            (language, self._compare(done, elapsed))
+            for language, done in sorted(by_language.items())
+        )
+        return report
+
+
+###############################################################################
+def main(args=None):
+    parser = ArgumentParser(
+        description="Replay the jobs recorded by a server pool."
+    )
+    parser.add_argument('log', help="Gzip log written by a server pool.")
+    parser.add_argument(
+        '--speed', dest='speed', type=float, default=1.0,
+        help="Times faster than recorded to submit the jobs."
+    )
+    parser.add_argument(
+        '-n', dest='n', type=int, default=N_CODE_SERVERS,
+        help="Number of code servers of the pool started."
+    )
+    parser.add_argument(
+        '-p', '--port', dest='port', type=int, default=SERVER_POOL_PORT + 100,
+        help="Port of the pool started."
+    )
+    parser.add_argument(
+        '-f', '--fork', dest='fork', action='store_true',
+        default=CODE_SERVER_FORK,
+        help="Evaluate every job in a child forked from a warm process."
+    )
+    parser.add_argument(
+        '--url', dest='url', default=None,
+        help="URL of a running server pool or coordinator to use instead "
+             "of starting a pool."
+    )
+    parser.add_argument(
+        '--concurrency', dest='concurrency', type=int, default=256,
+        help="Most jobs submitted and waited for at once."
+    )
+    parser.add_argument(
+        '-o', '--output', dest='output', default=None,
+        help="File to write the report to, instead of the standard output."
+    )
+    options = parser.parse_args(args)
+    if options.speed <= 0:
+        parser.error("The speed must be positive.")
+
+    jobs = read_log(options.log)
+    with pool_or_url(options) as url:
+        replay = Replay(url, jobs, options.speed, options.concurrency)
+        report = replay.run()
+    if options.url is None:
+        report['code_servers'] = options.n
+        report['fork'] = options.fork
+    text = json.dumps(report, indent=2)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        sys.stdout.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,242 @@
+"""Accounting of the resources used to grade a job.
+
+The grader measures every phase of every test case: `compile` and `run`
+(the evaluator's `compile_code` and `check_code`) and `compare`, which the
+stdio evaluators mark around the comparison of the outputs.  For each phase
+it records the wall time, the user and system CPU time of the code server
+and of the children it waited for, and the peak resident set size of those
+children, taken from `wait4` when they are reaped.  Code run inside the code
+server, as Python answers are, adds to the CPU time but its memory is only
+measured when the job runs in a forked child (`CODE_SERVER_FORK`).
+Persistent interpreters (the Java runner and interpreter sessions) are not
+reaped per job and so are not measured.
+
+The figures are returned with the result of the job under `resources` and
+the server pool sums them up per question in `ResourceStats`.
+"""
+from __future__ import unicode_literals
+from collections import OrderedDict
+import contextlib
+import os
+import resource
+import signal
+import subprocess
+import time
+
+account = None
+# The pids of the children started with `AccountedPopen` which were not
+# reaped yet, so that they can be killed when the job is cancelled.
+children = set()
+
+
+def _now():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (time.time(), own.ru_utime + children.ru_utime,
+            own.ru_stime + children.ru_stime)
+
+
+class Usage(object):
+    """The resources used by a phase, a test case or a whole job."""
+    def __init__(self):
+        self.wall = 0.0
+        self.user = 0.0
+        self.sys = 0.0
+        self.max_rss_kb = 0
+
+    def add(self, start, end):
+        self.wall += end[0] - start[0]
+        self.user += end[1] - start[1]
+        self.sys += end[2] - start[2]
+
+    def to_dict(self):
+        return dict(
+            wall=round(self.wall, 4), user=round(self.user, 4),
+            sys=round(self.sys, 4), max_rss_kb=self.max_rss_kb
+        )
+
+
+class JobAccount(object):
+    def __init__(self):
+        self.total = Usage()
+        # One OrderedDict of phase -> Usage per test case.
+        self.test_cases = []
+        self._start = _now()
+        # [usage, start] of the phases being measured, innermost last.
+        self._stack = []
+
+    def start_test_case(self):
+        self.test_cases.append(OrderedDict())
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Measure the block as the phase `name` of the current test case.
+        Phases may nest, the time of the inner phase is not counted in the
+        outer one.
+        """
+        if not self.test_cases:
+            self.start_test_case()
+        usage = self.test_cases[-1].setdefault(name, Usage())
+        start = _now()
+        if self._stack:
+            outer = self._stack[-1]
+            outer[0].add(outer[1], start)
+        self._stack.append([usage, start])
+        try:
+            yield usage
+        finally:
+            end = _now()
+            usage.add(self._stack.pop()[1], end)
+            if self._stack:
+                self._stack[-1][1] = end
+
+    def record_child(self, rusage):
+        """Record the peak RSS of a child reaped during the job."""
+        max_rss = rusage.ru_maxrss
+        self.total.max_rss_kb = max(self.total.max_rss_kb, max_rss)
+        if self._stack:
+            usage = self._stack[-1][0]
+            usage.max_rss_kb = max(usage.max_rss_kb, max_rss)
+
+    def finish(self):
+        self.total.add(self._start, _now())
+        return self.to_dict()
+
+    def to_dict(self):
+        data = self.total.to_dict()
+        data['test_cases'] = [
+            OrderedDict((name, usage.to_dict())
+                        for name, usage in phases.items())
+            for phases in self.test_cases
+        ]
+        return data
+
+
+def start_job():
+    global account
+    account = JobAccount()
+    children.clear()
+    return account
+
+
+def finish_job():
+    """Return the resources used by the current job as a dict."""
+    global account
+    if account is None:
+        return None
+    data = account.finish()
+    account = None
+    return data
+
+
+def start_test_case():
+    if account is not None:
+        account.start_test_case()
+
+
+def phase(name):
+    """Measure the block as a phase of the current job, if any."""
+    if account is None:
+        # Suppresses nothing, it is only a context manager doing nothing.
+        return contextlib.suppress()
+    return account.phase(name)
+
+
+def record_child(rusage):
+    if account is not None:
+        account.record_child(rusage)
+
+
+def kill_children():
+    """Kill the children of the job which are still running, with their
+    process group if they lead one, as a timeout does.
+    """
+    for pid in list(children):
+        try:
+            if os.getpgid(pid) == pid:
+                os.killpg(pid, signal.SIGKILL)
+            else:
+                os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+    children.clear()
+
+
+class AccountedPopen(subprocess.Popen):
+    """A Popen which records the resources used by the child with the
+    current job when `wait`, or `communicate` once the output is read,
+    reaps the child.  Children reaped otherwise, by `poll` or a wait with a
+    timeout, are not accounted.  The children not reaped yet are listed in
+    `children`.
+    """
+    def __init__(self, *args, **kw):
+        super(AccountedPopen, self).__init__(*args, **kw)
+        children.add(self.pid)
+
+    def wait(self, timeout=None):
+        try:
+            return self._reap(timeout)
+        finally:
+            if self.returncode is not None:
+                children.discard(self.pid)
+
+    def _reap(self, timeout):
+        if self.returncode is not None or timeout is not None:
+            return super(AccountedPopen, self).wait(timeout)
+        try:
+            _, status, rusage = os.wait4(self.pid, 0)
+        except ChildProcessError:
+            # Reaped already, Popen knows what to do.
+            return super(AccountedPopen, self).wait()
+        record_child(rusage)
+        if os.WIFSIGNALED(status):
+            self.returncode = -os.WTERMSIG(status)
+        else:
+            self.returncode = os.WEXITSTATUS(status)
+        return self.returncode
+
+
+class ResourceStats(object):
+    """Sums of the resources used to grade the jobs of each question."""
+    def __init__(self):
+        # question id -> dict of sums
+        self.questions = {}
+
+    def add(self, resources):
+        if not resources or resources.get('question_id') is None:
+            return
+        stats = self.questions.setdefault(
+            str(resources['question_id']), self._new_stats(resources)
+        )
+        stats['jobs'] += 1
+        for field in ('wall', 'user', 'sys'):
+            stats[field] += resources[field]
+        stats['max_wall'] = max(stats['max_wall'], resources['wall'])
+        stats['max_rss_kb'] = max(stats['max_rss_kb'],
+                                  resources['max_rss_kb'])
+        for test_case in resources['test_cases']:
+            for name, usage in test_case.items():
+                stats['phases'][name] = (
+                    stats['phases'].get(name, 0.0) + usage['wall']
+                )
+
+    def stats(self):
+        """Return the sums and means per question."""
+        result = {}
+        for question_id, stats in self.questions.items():
+            result[question_id] = dict(stats)
+            result[question_id]['phases'] = {
+                name: round(wall, 4) for name, wall in stats['phases'].items()
+            }
+            for field in ('wall', 'user', 'sys'):
+                result[question_id][field] = round(stats[field], 4)
+                result[question_id]['mean_' + field] = round(
+                    stats[field] / stats['jobs'], 4
+                )
+        return result
+
+    def _new_stats(self, resources):
+        return dict(
+            language=resources.get('language'), jobs=0, wall=0.0, user=0.0,
+            sys=0.0, max_wall=0.0, max_rss_kb=0, phases={}
+        )
@@ -0,0 +1,111 @@
+from __future__ import unicode_literals
+from collections import OrderedDict, Counter
+import importlib
+import time
+
+# Local imports
+from .settings import RESULT_STORE, RESULT_STORE_MAX_SIZE, RESULT_STORE_TTL
+
+
+def create_result_store(class_path=RESULT_STORE, **kwargs):
+    """Create an instance of the result store class given by its dotted
+    path, this is how other result stores may be plugged in.
+    """
+    module_name, class_name = class_path.rsplit(".", 1)
+    module = importlib.import_module(module_name)
+    cls = getattr(module, class_name)
+    return cls(**kwargs)
+
+
+class ResultStore(object):
+    """Holds the status and results of the jobs submitted to the server pool.
+
+    The results live in the memory of the server pool process, the code
+    servers report to it through a queue, so every access is a local O(1)
+    operation.  The store holds at most `max_size` results and forgets a
+    result `ttl` seconds after it was last updated, so results which are
+    never fetched do not pile up.  Only the results of jobs which are done
+    are evicted, in the order they were last updated: the status of a job
+    which is queued or running is kept however full the store is, or the
+    job would be reported unknown while it is still graded.
+    """
+    def __init__(self, max_size=RESULT_STORE_MAX_SIZE, ttl=RESULT_STORE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        # uid -> (time of last update, result) of the jobs which are done,
+        # and of the others.
+        self._done = OrderedDict()
+        self._pending = {}
+        self._status_counts = Counter()
+        self.evictions = Counter(size=0, ttl=0)
+
+    def __len__(self):
+        return len(self._done) + len(self._pending)
+
+    def __contains__(self, uid):
+        return uid in self._done or uid in self._pending
+
+    # Public Protocol ##########
+    def set(self, uid, result, updated=None):
+        """Set the result of the job `uid`, `result` is a dict with at least
+        a 'status' key.  `updated` is the time of the result, now by default;
+        results given an earlier time must be set oldest first, before the
+        others.
+        """
+        self._remove(uid)
+        status = result.get('status')
+        results = self._done if status == 'done' else self._pending
+        results[uid] = (updated or time.time(), result)
+        self._status_counts[status] += 1
+        self.evict_expired()
+        while self.max_size and len(self) > self.max_size and self._done:
+            self._evict_oldest('size')
+
+    def get(self, uid, default=None):
+        item = self._done.get(uid) or self._pending.get(uid)
+        if item is None:
+            return default
+        return item[1]
+
+    def pop(self, uid, default=None):
+        result = self._remove(uid)
+        return default if result is None else result
+
+    def count(self, status):
+        """Return the number of jobs with the given status."""
+        return self._status_counts[status]
+
+    def evict_expired(self):
+        """Remove the results of the jobs done which have not been updated
+        for `ttl` seconds.
+        """
+        if not self.ttl:
+            return
+        expiry = time.time() - self.ttl
+        while self._done:
+            updated, _ = next(iter(self._done.values()))
+            if updated > expiry:
+                break
+            self._evict_oldest('ttl')
+
+    def stats(self):
+        return {
+            'size': len(self),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'evictions': dict(self.evictions),
+        }
+
+    # Private Protocol ##########
+    def _remove(self, uid):
+        item = self._done.pop(uid, None) or self._pending.pop(uid, None)
+        if item is None:
+            return None
+        result = item[1]
+        self._status_counts[result.get('status')] -= 1
+        return result
+
+    def _evict_oldest(self, reason):
+        uid = next(iter(self._done))
+        self._remove(uid)
+        self.evictions[reason] += 1
@@ -0,0 +1,181 @@
+"""The queues of jobs waiting for a code server in the server pool.
+
+Every job belongs to one of the priority classes in `PRIORITIES`, highest
+first: answers of students sitting an exam, exercises and trial quizzes, and
+background work like regrading.  A free code server is given the oldest job
+of the highest class with waiting jobs, unless a job has waited longer than
+`max_wait` seconds; the job which waited longest is then served first, so
+that a stream of exam answers cannot hold back a regrade forever.
+
+With a `key`, the jobs of a class are queued per key, the submitter of the
+job, and the submitters take turns: one job of each submitter with waiting
+jobs runs before the second of any, so that a student sending answers in a
+loop only delays their own.
+"""
+from __future__ import unicode_literals
+from collections import OrderedDict, deque, Counter
+import time
+
+# Local imports
+from .settings import SCHEDULER_MAX_WAIT
+
+PRIORITIES = ('exam', 'exercise', 'background')
+DEFAULT_PRIORITY = 'exercise'
+
+
+class FifoQueue(deque):
+    """A queue of (time queued, job), oldest first."""
+    def oldest(self):
+        return self[0][0]
+
+    def pop_oldest(self):
+        return self.popleft()
+
+    def remove_jobs(self, match):
+        """Remove the jobs for which `match(job)` is true, return how many
+        were removed.
+        """
+        kept = [item for item in self if not match(item[1])]
+        removed = len(self) - len(kept)
+        if removed:
+            self.clear()
+            self.extend(kept)
+        return removed
+
+
+class FairQueue(object):
+    """A queue of (time queued, job) served round robin over the keys of the
+    jobs.
+    """
+    def __init__(self, key):
+        self.key = key
+        # key -> FifoQueue, in the order in which the keys take turns.
+        self._queues = OrderedDict()
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def append(self, item):
+        key = self.key(item[1])
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = FifoQueue()
+        queue.append(item)
+        self._len += 1
+
+    def oldest(self):
+        return min(queue.oldest() for queue in self._queues.values())
+
+    def popleft(self):
+        key, queue = next(iter(self._queues.items()))
+        return self._pop(key, queue)
+
+    def pop_oldest(self):
+        key, queue = min(self._queues.items(),
+                         key=lambda item: item[1].oldest())
+        return self._pop(key, queue)
+
+    def _pop(self, key, queue):
+        item = queue.popleft()
+        self._len -= 1
+        # The key's turn is over, it waits behind the others.
+        del self._queues[key]
+        if queue:
+            self._queues[key] = queue
+        return item
+
+    def remove_jobs(self, match):
+        removed = 0
+        for key, queue in list(self._queues.items()):
+            removed += queue.remove_jobs(match)
+            if not queue:
+                del self._queues[key]
+        self._len -= removed
+        return removed
+
+    def keys(self):
+        """Return the keys with waiting jobs."""
+        return list(self._queues)
+
+
+class Scheduler(object):
+    def __init__(self, priorities=PRIORITIES, max_wait=SCHEDULER_MAX_WAIT,
+                 key=None):
+        self.priorities = tuple(priorities)
+        self.max_wait = max_wait
+        self.key = key
+        # priority -> queue of (time queued, job)
+        self._queues = OrderedDict(
+            (p, FairQueue(key) if key else FifoQueue()) for p in priorities
+        )
+        # Jobs taken out of order by the starvation guard, per priority.
+        self.promoted = Counter()
+
+    def __len__(self):
+        return sum(len(q) for q in self._queues.values())
+
+    # Public Protocol ##########
+    def put(self, job, priority=DEFAULT_PRIORITY):
+        if priority not in self._queues:
+            raise ValueError("Unknown priority %r." % (priority,))
+        self._queues[priority].append((time.time(), job))
+
+    def remove(self, match):
+        """Remove the waiting jobs for which `match(job)` is true and return
+        their priorities.
+        """
+        removed = []
+        for priority, queue in self._queues.items():
+            removed.extend([priority] * queue.remove_jobs(match))
+        return removed
+
+    def get(self):
+        """Return the next job to run, or None if no job is waiting."""
+        return self.pop()[0]
+
+    def pop(self):
+        """Return the next job to run, its priority and the seconds for
+        which it waited, or (None, None, 0.0) if no job is waiting.
+        """
+        waiting = [(p, q) for p, q in self._queues.items() if q]
+        if not waiting:
+            return None, None, 0.0
+        priority, queue = waiting[0]
+        if self.max_wait:
+            expiry = time.time() - self.max_wait
+            queued, starved = min((q.oldest(), p) for p, q in waiting)
+            if queued < expiry and starved != priority:
+                self.promoted[starved] += 1
+                queued, job = self._queues[starved].pop_oldest()
+                return job, starved, time.time() - queued
+        queued, job = queue.popleft()
+        return job, priority, time.time() - queued
+
+    def oldest_wait(self):
+        """Return the seconds for which the oldest waiting job has waited."""
+        heads = [q.oldest() for q in self._queues.values() if q]
+        return time.time() - min(heads) if heads else 0.0
+
+    def depths(self):
+        """Return the number of waiting jobs of each priority."""
+        return OrderedDict((p, len(q)) for p, q in self._queues.items())
+
+    def submitters(self):
+        """Return the number of keys with waiting jobs, 0 if the jobs are
+        not queued per key.
+        """
+        if not self.key:
+            return 0
+        keys = set()
+        for queue in self._queues.values():
+            keys.update(queue.keys())
+        return len(keys)
+
+    def stats(self):
+        return {
+            'queued': self.depths(),
+            'promoted': dict(self.promoted),
+            'max_wait': self.max_wait,
+            'submitters': self.submitters(),
+        }
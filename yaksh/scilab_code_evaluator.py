@@ -7,6 +7,7 @@ import re
 # Local imports
 from .base_evaluator import BaseEvaluator
 from .file_utils import copy_files, delete_files
+from .interpreter_session import get_session
 
 
 class ScilabCodeEvaluator(BaseEvaluator):
@@ -54,13 +55,17 @@ class ScilabCodeEvaluator(BaseEvaluator):
                         code.\n Otherwise your code will not be evaluated\
                         correctly.\n"
 
-        cmd = 'printf "lines(0)\nexec(\'{0}\',2);\nquit();"'.format(
-            clean_ref_path
-        )
-        cmd += ' | scilab-cli -nb'
-        ret = self._run_command(cmd, shell=True, stdout=subprocess.PIPE,
-                                stderr=subprocess.PIPE
-                                )
+        session = get_session('scilab')
+        if session is not None:
+            ret = session.run(clean_ref_path)
+        else:
+            cmd = 'printf "lines(0)\nexec(\'{0}\',2);\nquit();"'.format(
+                clean_ref_path
+            )
+            cmd += ' | scilab-cli -nb'
+            ret = self._run_command(cmd, shell=True, stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE
+                                    )
         proc, stdout, stderr = ret
 
         # Get only the error.
@@ -2,22 +2,201 @@
 settings for yaksh app.
 """
 
-from decouple import config
+from decouple import config, Csv
 
 # The number of code server processes to run..
 N_CODE_SERVERS = config('N_CODE_SERVERS', default=5, cast=int)
 
+# Let the server pool run up to CODE_SERVERS_MAX code servers, starting with
+# N_CODE_SERVERS.  Code servers are added while jobs wait in the queue for
+# more than half of AUTOSCALE_TARGET_WAIT seconds (95th percentile over the
+# last AUTOSCALE_WINDOW seconds), and stopped again after being idle for
+# AUTOSCALE_IDLE_TIME seconds.  The pool checks every AUTOSCALE_INTERVAL
+# seconds.  Autoscaling is off unless CODE_SERVERS_MAX > N_CODE_SERVERS.
+CODE_SERVERS_MAX = config('CODE_SERVERS_MAX', default=0, cast=int)
+AUTOSCALE_TARGET_WAIT = config('AUTOSCALE_TARGET_WAIT', default=2.0,
+                               cast=float)
+AUTOSCALE_WINDOW = config('AUTOSCALE_WINDOW', default=30, cast=int)
+AUTOSCALE_IDLE_TIME = config('AUTOSCALE_IDLE_TIME', default=60, cast=float)
+AUTOSCALE_INTERVAL = config('AUTOSCALE_INTERVAL', default=1.0, cast=float)
+
+# Evaluate every job in a child forked from a code server process which has
+# already imported the evaluators.  This avoids paying the import cost on
+# every job and isolates the state left behind by the submitted code.
+CODE_SERVER_FORK = config('CODE_SERVER_FORK', default=False, cast=bool)
+
 # The server pool port.  This is the server which returns available server
 # ports so as to minimize load.  This is some random number where no other
 # service is running.  It should be > 1024 and less < 65535 though.
 SERVER_POOL_PORT = config('SERVER_POOL_PORT', default=55555, cast=int)
 
+# Run the code server as a coordinator spreading the jobs over the server
+# pools at these URLs, for example
+# CODE_SERVER_NODES=http://10.0.0.2:55555,http://10.0.0.3:55555
+# Django then talks to the coordinator at SERVER_POOL_PORT.  Every
+# COORDINATOR_HEALTH_INTERVAL seconds the coordinator checks the load of the
+# pools, a pool failing COORDINATOR_MAX_FAILURES checks in a row is taken out
+# and its jobs are sent to the others.  Results are collected from the pools
+# every COORDINATOR_POLL_INTERVAL seconds.
+CODE_SERVER_NODES = config('CODE_SERVER_NODES', default='', cast=Csv())
+COORDINATOR_HEALTH_INTERVAL = config('COORDINATOR_HEALTH_INTERVAL',
+                                     default=2.0, cast=float)
+COORDINATOR_MAX_FAILURES = config('COORDINATOR_MAX_FAILURES', default=2,
+                                  cast=int)
+COORDINATOR_POLL_INTERVAL = config('COORDINATOR_POLL_INTERVAL', default=0.2,
+                                   cast=float)
+
+# The class used by the server pool to hold the status and results of jobs
+# and the limits it is created with.  A result is forgotten
+# RESULT_STORE_TTL seconds after it was last updated, if it is not fetched
+# before that.
+RESULT_STORE = config('RESULT_STORE',
+                      default='yaksh.result_store.ResultStore')
+RESULT_STORE_MAX_SIZE = config('RESULT_STORE_MAX_SIZE', default=10000,
+                               cast=int)
+RESULT_STORE_TTL = config('RESULT_STORE_TTL', default=3600, cast=int)
+
+# The longest time in seconds the server pool holds a request for a result
+# which is not ready yet (long polling).  Clients blocking for a result use
+# WAIT_FOR_RESULT.  The quiz pages wait RESULT_POLL_WAIT seconds for the
+# result of an answer.  Django serves them synchronously, so a wait holds a
+# Django worker for its whole length and the browser keeps polling anyway.
+# It is 0 by default, which does not wait.  Only set it if Django has spare
+# workers, as it saves a few polls per answer at their cost.
+MAX_RESULT_WAIT = config('MAX_RESULT_WAIT', default=60, cast=int)
+WAIT_FOR_RESULT = config('WAIT_FOR_RESULT', default=30, cast=int)
+RESULT_POLL_WAIT = config('RESULT_POLL_WAIT', default=0, cast=float)
+
+# The client functions of the code server, used by Django, keep up to
+# CODE_SERVER_CLIENT_POOL_SIZE connections to it alive per process.  They
+# send a job as a raw json body, gzipped when it is longer than
+# CODE_SERVER_GZIP_SIZE bytes; 0 to never gzip.
+CODE_SERVER_CLIENT_POOL_SIZE = config('CODE_SERVER_CLIENT_POOL_SIZE',
+                                      default=10, cast=int)
+CODE_SERVER_GZIP_SIZE = config('CODE_SERVER_GZIP_SIZE', default=8192,
+                               cast=int)
+
+# Jobs are run by priority: exam answers first, then exercises and trial
+# quizzes, then regrades.  A job which waited longer than SCHEDULER_MAX_WAIT
+# seconds is run before any other, so that no job waits forever.
+SCHEDULER_MAX_WAIT = config('SCHEDULER_MAX_WAIT', default=60, cast=int)
+
+# Number of grading results the server pool keeps so that identical
+# submissions are not evaluated again, and the number of seconds for which a
+# result is reused.  The cache is off by default, set the size above 0 to
+# turn it on.  A result is only reused for the same answer, test cases and
+# question files, so it is safe when grading depends on nothing else, as for
+# the standard assertion and stdio test cases of most questions.  It is not
+# safe for hook test cases whose hook uses random numbers or the time, nor
+# for test cases reading state from outside the question, such as other
+# files, the network or the environment: these would get a stale result.
+GRADE_CACHE_SIZE = config('GRADE_CACHE_SIZE', default=0, cast=int)
+GRADE_CACHE_TTL = config('GRADE_CACHE_TTL', default=86400, cast=int)
+
+# Number of answers sent to the code server in one request while regrading.
+REGRADE_BATCH_SIZE = config('REGRADE_BATCH_SIZE', default=200, cast=int)
+
 # Server host name
 SERVER_HOST_NAME = config('SERVER_HOST_NAME', default='http://localhost')
 
 # Timeout for the code to run in seconds.  This is an integer!
 SERVER_TIMEOUT = config('SERVER_TIMEOUT', default=4, cast=int)
 
+# The server pool checks its code servers every SUPERVISOR_INTERVAL seconds.
+# A code server which died is restarted and its job is queued again, up to
+# JOB_MAX_RETRIES times, before the job fails.  A code server busy with a job
+# for WORKER_HANG_TIMEOUT seconds, well past SERVER_TIMEOUT, is killed and the
+# job fails.
+SUPERVISOR_INTERVAL = config('SUPERVISOR_INTERVAL', default=1.0, cast=float)
+JOB_MAX_RETRIES = config('JOB_MAX_RETRIES', default=1, cast=int)
+WORKER_HANG_TIMEOUT = config('WORKER_HANG_TIMEOUT',
+                             default=SERVER_TIMEOUT + 20, cast=int)
+
+# A cancelled job is stopped by raising an exception in it, which the code of
+# the submission may catch.  A code server still running the job
+# WORKER_CANCEL_GRACE seconds after it was cancelled is killed and replaced.
+# With CODE_SERVER_FORK the child running the job exits at once instead.
+WORKER_CANCEL_GRACE = config('WORKER_CANCEL_GRACE', default=2.0, cast=float)
+
+# A code server is replaced by a fresh one after WORKER_MAX_JOBS jobs, or once
+# its resident memory exceeds WORKER_MAX_RSS_MB after a job, as the Python
+# answers it runs leave modules and garbage behind.  Set either to 0 to not
+# recycle on it.
+WORKER_MAX_JOBS = config('WORKER_MAX_JOBS', default=500, cast=int)
+WORKER_MAX_RSS_MB = config('WORKER_MAX_RSS_MB', default=512, cast=int)
+
+# Split the code servers of the server pool by the language of the jobs, so
+# that a burst of slow Java or Scilab answers cannot hold up the Python ones,
+# for example CODE_SERVER_PARTITIONS=python:3,java:1,scilab:1
+# Each partition gets a share of the code servers by its weight, at least
+# one.  A partition is named by a language, or by a language and a test case
+# type as in python/stdiobasedtestcase.  Other jobs go to the `default`
+# partition, of weight 1 unless it is listed.  A code server with nothing to
+# do takes the jobs of other partitions unless CODE_SERVER_BORROW is False.
+CODE_SERVER_PARTITIONS = config('CODE_SERVER_PARTITIONS', default='',
+                                cast=Csv())
+CODE_SERVER_BORROW = config('CODE_SERVER_BORROW', default=True, cast=bool)
+
+# Jobs of the same priority are run in turns per user, one job of each user
+# with waiting jobs before the second of any, unless CODE_SERVER_FAIR_QUEUING
+# is False.  A user may have CODE_SERVER_USER_MAX_JOBS exam or exercise jobs
+# queued or running, more are rejected with a message asking them to wait;
+# 0 for no limit.  Users are told apart by their user directory.
+CODE_SERVER_FAIR_QUEUING = config('CODE_SERVER_FAIR_QUEUING', default=True,
+                                  cast=bool)
+CODE_SERVER_USER_MAX_JOBS = config('CODE_SERVER_USER_MAX_JOBS', default=0,
+                                   cast=int)
+
+# Append every job submitted to the server pool and its result to the gzip
+# file CODE_SERVER_RECORD, to replay the load later with yaksh.replay.  The
+# file holds the answers of the users, keep it private.  Empty to not record.
+CODE_SERVER_RECORD = config('CODE_SERVER_RECORD', default='')
+
+# Keep the jobs and results of the server pool in the SQLite database
+# CODE_SERVER_JOURNAL as well, so that a restarted pool queues the unfinished
+# jobs again and still serves the results.  Empty to keep them in memory only.
+CODE_SERVER_JOURNAL = config('CODE_SERVER_JOURNAL', default='')
+
+# Compiled C/C++ and Java submissions are cached for the test cases of a job
+# and the cache is limited to COMPILE_CACHE_SIZE MB.  Set the size to 0 to
+# disable the cache.  If COMPILE_CACHE_DIR is set, the code servers on this
+# machine share a cache in that directory across jobs instead.  Student code
+# can write to that directory and so change the grades of other submissions,
+# only set it if the submissions are trusted.
+COMPILE_CACHE_DIR = config('COMPILE_CACHE_DIR', default='')
+COMPILE_CACHE_SIZE = config('COMPILE_CACHE_SIZE', default=256, cast=int)
+
+# Run compiled Java submissions in a JVM kept running by each code server
+# instead of starting a JVM for every test case.  The JVM is replaced after
+# JAVA_RUNNER_MAX_RUNS runs.  In fork mode (CODE_SERVER_FORK) every job
+# starts its own JVM, so there is little to gain.
+JAVA_RUNNER = config('JAVA_RUNNER', default=False, cast=bool)
+JAVA_RUNNER_MAX_RUNS = config('JAVA_RUNNER_MAX_RUNS', default=200, cast=int)
+
+# Run the test cases of a Scilab or R job in one interpreter instead of
+# starting an interpreter for every test case.  Each job starts interpreters
+# of its own, which are stopped when it is done, so they are never shared by
+# the jobs of different students and a job with a single test case gains
+# nothing.  An interpreter is also replaced when it dies, when a run times
+# out, and after INTERPRETER_SESSION_MAX_RUNS runs.
+INTERPRETER_SESSIONS = config('INTERPRETER_SESSIONS', default=False,
+                              cast=bool)
+INTERPRETER_SESSION_MAX_RUNS = config('INTERPRETER_SESSION_MAX_RUNS',
+                                      default=100, cast=int)
+
+# Build the standard test cases of a C or C++ job into one executable, linked
+# and run once, instead of linking and running a program per test case.  Any
+# problem building it falls back to a program per test case.
+CPP_HARNESS = config('CPP_HARNESS', default=False, cast=bool)
+
+# How the Python assertion test cases of a job are isolated from each other.
+# With 'exec' the submission is executed again for every test case.  With
+# 'copy' it is executed once and every test case runs in a copy of its
+# names, but objects such as lists are shared, so changes to them are seen
+# by the next test cases.  With 'fork' it is executed once and every test
+# case runs in a child forked from the process, which changes nothing.
+PYTHON_TEST_ISOLATION = config('PYTHON_TEST_ISOLATION', default='exec')
+
 # The root of the URL, for example you might be in the situation where you
 # are not hosted as host.org/exam/  but as host.org/foo/exam/ for whatever
 # reason set this to the root you have to serve at.  In the above example
@@ -6,6 +6,7 @@ import signal
 from .base_evaluator import BaseEvaluator
 from .grader import TimeoutException
 from .error_messages import compare_outputs
+from . import resource_usage
 
 
 class StdIOEvaluator(BaseEvaluator):
@@ -26,8 +27,9 @@ class StdIOEvaluator(BaseEvaluator):
             os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
             raise
         expected_output = expected_output.replace("\r", "")
-        success, err = compare_outputs(expected_output,
-                                       user_output,
-                                       expected_input
-                                       )
+        with resource_usage.phase('compare'):
+            success, err = compare_outputs(expected_output,
+                                           user_output,
+                                           expected_input
+                                           )
         return success, err
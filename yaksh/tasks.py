@@ -59,8 +59,8 @@ def regrade_papers(data):
             answerpapers = AnswerPaper.objects.filter(
                 questions=question_id,
                 question_paper_id=questionpaper_id, course_id=course_id)
+            AnswerPaper.objects.regrade(answerpapers, question_id)
             for answerpaper in answerpapers:
-                answerpaper.regrade(question_id)
                 course_status = CourseStatus.objects.filter(
                     user=answerpaper.user, course=answerpaper.course)
                 if course_status.exists():
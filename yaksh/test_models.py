@@ -1688,6 +1688,33 @@ class AnswerPaperTestCases(unittest.TestCase):
         self.assertEqual(self.answer.marks, 0)
         self.assertFalse(self.answer.correct)
 
+    def test_regrade_code_answers_in_batch(self):
+        # Given
+        self.answer = Answer(question=self.question1,
+                             answer=dedent("""
+                                    def add(a,b):
+                                        return a-b
+                                    """),
+                             correct=True, marks=1
+                             )
+        self.answer.save()
+        self.answerpaper.answers.add(self.answer)
+        answerpapers = AnswerPaper.objects.filter(id=self.answerpaper.id)
+
+        # When
+        details = AnswerPaper.objects.regrade(answerpapers,
+                                              self.question1.id,
+                                              self.SERVER_POOL_PORT
+                                              )
+
+        # Then
+        self.answer = self.answerpaper.answers.filter(question=self.question1
+                                                      ).last()
+        self.assertEqual(len(details), 1)
+        self.assertTrue(details[0][0])
+        self.assertEqual(self.answer.marks, 0)
+        self.assertFalse(self.answer.correct)
+
     def test_validate_and_regrade_mcq_correct_answer(self):
         # Given
         mcq_answer = str(self.mcq_based_testcase.id)
@@ -0,0 +1,75 @@
+from __future__ import unicode_literals
+import unittest
+
+from yaksh.autoscaler import Autoscaler, percentile
+
+
+class TestAutoscaler(unittest.TestCase):
+
+    def setUp(self):
+        self.autoscaler = Autoscaler(
+            2, 8, target_wait=2.0, window=30, idle_time=10
+        )
+
+    def test_percentile(self):
+        self.assertEqual(percentile([], 0.95), 0.0)
+        self.assertEqual(percentile(list(range(1, 101)), 0.95), 95)
+        self.assertEqual(percentile([3, 1, 2], 0.5), 2)
+
+    def test_scales_up_for_queued_jobs(self):
+        # When
+        deep = self.autoscaler.decide(2, 3, 0.0, [], now=100)
+        waiting = self.autoscaler.decide(4, 1, 1.5, [], now=101)
+        capped = self.autoscaler.decide(6, 5, 1.5, [], now=102)
+
+        # Then
+        self.assertEqual(deep, 5)
+        self.assertEqual(waiting, 5)
+        self.assertEqual(capped, 8)
+        self.assertEqual(
+            [event['action'] for event in self.autoscaler.events],
+            ['up', 'up', 'up']
+        )
+
+    def test_short_waits_do_not_scale_up(self):
+        # When
+        target = self.autoscaler.decide(4, 1, 0.5, [], now=100)
+
+        # Then
+        self.assertEqual(target, 4)
+        self.assertEqual(len(self.autoscaler.events), 0)
+
+    def test_scales_down_after_idle_time(self):
+        # Given
+        self.autoscaler.decide(2, 4, 0.0, [], now=100)
+        self.autoscaler.record_wait(1.5, now=100)
+
+        # When
+        too_soon = self.autoscaler.decide(6, 0, 0.0, [10, 10], now=105)
+        recent_waits = self.autoscaler.decide(6, 0, 0.0, [10, 10], now=115)
+        idle = self.autoscaler.decide(6, 0, 0.0, [10, 10], now=131)
+        busy = self.autoscaler.decide(6, 0, 0.0, [5], now=132)
+        minimum = self.autoscaler.decide(2, 0, 0.0, [20, 20], now=133)
+
+        # Then
+        self.assertEqual(too_soon, 6)
+        self.assertEqual(recent_waits, 6)
+        self.assertEqual(idle, 5)
+        self.assertEqual(busy, 6)
+        self.assertEqual(minimum, 2)
+
+    def test_disabled_without_room_to_scale(self):
+        # Given
+        autoscaler = Autoscaler(4, 2)
+
+        # When
+        target = autoscaler.decide(4, 10, 100.0, [])
+
+        # Then
+        self.assertFalse(autoscaler.enabled)
+        self.assertEqual(target, 4)
+        self.assertEqual(autoscaler.max_servers, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
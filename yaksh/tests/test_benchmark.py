@@ -0,0 +1,128 @@
+from __future__ import unicode_literals
+import json
+from threading import Thread
+import unittest
+
+from yaksh.benchmarks import capacity
+from yaksh.benchmarks.capacity import (
+    Benchmark, benchmark_client, benchmark_recovery, make_job, parse_mix,
+    timed_out
+)
+from yaksh.code_server import ServerPool
+from yaksh import settings
+from yaksh.settings import SERVER_POOL_PORT
+
+
+class TestBenchmarkJobs(unittest.TestCase):
+
+    def test_parse_mix(self):
+        # When
+        mix = parse_mix('python:3, c ,')
+
+        # Then
+        self.assertEqual(list(mix.items()), [('python', 3.0), ('c', 1.0)])
+        with self.assertRaises(ValueError):
+            parse_mix('cobol:1')
+
+    def test_jobs_are_unique(self):
+        # When
+        first = json.loads(make_job('c', 'uid1'))
+        second = json.loads(make_job('c', 'uid2'))
+
+        # Then
+        self.assertEqual(first['metadata']['language'], 'c')
+        self.assertTrue(first['metadata']['user_answer'].endswith('// uid1\n'))
+        self.assertNotEqual(first['metadata']['user_answer'],
+                            second['metadata']['user_answer'])
+        self.assertEqual(first['test_case_data'], second['test_case_data'])
+
+    def test_timed_out(self):
+        # Given
+        error = {'exception': 'TimeoutException', 'message': 'Killed'}
+
+        # Then
+        self.assertTrue(timed_out({'success': False, 'error': [error]}))
+        self.assertFalse(timed_out({'success': False, 'error': ['Wrong']}))
+
+    def test_kinds_without_their_tools_are_skipped(self):
+        # Given
+        capacity.KINDS['missing'] = dict(
+            capacity.KINDS['python'], tools=['no-such-compiler-here']
+        )
+        self.addCleanup(capacity.KINDS.pop, 'missing')
+
+        # When
+        bench = Benchmark('http://localhost:1', parse_mix('python,missing'),
+                          rate=1, duration=0)
+
+        # Then
+        self.assertEqual(list(bench.mix), ['python'])
+        self.assertEqual(bench.skipped, {'missing': ['no-such-compiler-here']})
+
+    def test_recovery(self):
+        # When
+        report = benchmark_recovery(20, SERVER_POOL_PORT + 14,
+                                    parse_mix('python,c'))
+
+        # Then
+        self.assertEqual(report['jobs'], 20)
+        self.assertEqual(report['queued'], 20)
+        self.assertGreater(report['recovery'], 0.0)
+
+
+class TestBenchmarkRun(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        evaluators = settings.code_evaluators['python']
+        cls.evaluator = evaluators['standardtestcase']
+        evaluators['standardtestcase'] = \
+            "yaksh.python_assertion_evaluator.PythonAssertionEvaluator"
+        cls.port = SERVER_POOL_PORT + 8
+        cls.server_pool = ServerPool(n=2, pool_port=cls.port)
+        cls.server_thread = Thread(target=cls.server_pool.run)
+        cls.server_thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server_pool.stop()
+        cls.server_thread.join()
+        settings.code_evaluators['python']['standardtestcase'] = \
+            cls.evaluator
+
+    def test_report(self):
+        # Given
+        bench = Benchmark(
+            'http://localhost:%s' % self.port,
+            parse_mix('python:1,python_stdio:1'), rate=20, duration=0.5,
+            users=3
+        )
+
+        # When
+        report = bench.run()
+
+        # Then
+        self.assertEqual(report['submitted'], 10)
+        self.assertEqual(report['completed'], 10)
+        self.assertEqual(report['failures'], 0)
+        self.assertEqual(report['timeouts'], 0)
+        self.assertEqual(report['latency']['count'], 10)
+        self.assertLessEqual(report['latency']['p50'],
+                             report['latency']['p99'])
+        self.assertEqual(
+            sum(kind['submitted'] for kind in report['kinds'].values()), 10
+        )
+
+    def test_client(self):
+        # When
+        report = benchmark_client('http://localhost:%s' % self.port, 5)
+
+        # Then
+        for name in ('form_submit', 'form_get_result', 'submit',
+                     'get_result'):
+            self.assertEqual(report[name]['count'], 5)
+        self.assertEqual(set(report['saved_per_request']),
+                         {'submit', 'get_result'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,24 +1,39 @@
 from __future__ import unicode_literals
 import json
+import os
+import shutil
+import tempfile
 try:
     from Queue import Queue
 except ImportError:
     from queue import Queue
 from threading import Thread
+import time
 import unittest
 import urllib
 
-from yaksh.code_server import ServerPool, SERVER_POOL_PORT, submit, get_result
+import requests
+
+from yaksh.code_server import (
+    ServerPool, SERVER_POOL_PORT, submit, get_result, submit_batch,
+    get_results, get_resource_stats, cancel, client_session, encode_body
+)
+from yaksh.grade_cache import GradeCache
 from yaksh import settings
 
 
 class TestCodeServer(unittest.TestCase):
+    fork = False
 
     @classmethod
     def setUpClass(cls):
-        settings.code_evaluators['python']['standardtestcase'] = \
+        evaluators = settings.code_evaluators['python']
+        cls.evaluator = evaluators['standardtestcase']
+        evaluators['standardtestcase'] = \
             "yaksh.python_assertion_evaluator.PythonAssertionEvaluator"
-        server_pool = ServerPool(n=5, pool_port=SERVER_POOL_PORT)
+        server_pool = ServerPool(
+            n=5, pool_port=SERVER_POOL_PORT, fork=cls.fork
+        )
         cls.server_pool = server_pool
         cls.server_thread = t = Thread(target=server_pool.run)
         t.start()
@@ -28,7 +43,7 @@ class TestCodeServer(unittest.TestCase):
         cls.server_pool.stop()
         cls.server_thread.join()
         settings.code_evaluators['python']['standardtestcase'] = \
-            "python_assertion_evaluator.PythonAssertionEvaluator"
+            cls.evaluator
 
     def setUp(self):
         self.url = 'http://localhost:%s' % SERVER_POOL_PORT
@@ -84,6 +99,35 @@ class TestCodeServer(unittest.TestCase):
         data = json.loads(result.get('result'))
         self.assertTrue(data['success'])
 
+    def test_job_bodies(self):
+        # Given
+        testdata = json.dumps({
+            'metadata': {
+                'user_answer': 'def f(): return 1  # %s' % ('x' * 100),
+                'language': 'python',
+                'partial_grading': False
+            },
+            'test_case_data': [{'test_case': 'assert f() == 1',
+                                'test_case_type': 'standardtestcase',
+                                'weight': 0.0}]
+        })
+        body, headers = encode_body(testdata, gzip_size=100)
+
+        # When
+        requests.post(self.url, data=dict(uid='form', json_data=testdata,
+                                          user_dir=''))
+        client_session().post(self.url, params=dict(uid='gzip', user_dir=''),
+                              data=body, headers=headers)
+        results = get_results(self.url, ['form', 'gzip'], block=True)
+
+        # Then
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertLess(len(body), len(testdata))
+        for uid in ('form', 'gzip'):
+            self.assertTrue(json.loads(results[uid]['result'])['success'])
+        self.assertNotIn('Content-Encoding',
+                         encode_body(testdata, gzip_size=0)[1])
+
     def test_wrong_answer(self):
         # Given
         testdata = {
@@ -106,6 +150,146 @@ class TestCodeServer(unittest.TestCase):
         self.assertFalse(data['success'])
         self.assertTrue('AssertionError' in data['error'][0]['exception'])
 
+    def test_resources_are_accounted_per_question(self):
+        # Given
+        testdata = {
+            'metadata': {
+                'user_answer': 'def f(): return sum(range(10000))',
+                'language': 'python',
+                'partial_grading': False,
+                'question_id': 42
+            },
+            'test_case_data': [{'test_case': 'assert f() == 49995000',
+                                'test_case_type': 'standardtestcase',
+                                'weight': 1.0},
+                               {'test_case': 'assert f() > 0',
+                                'test_case_type': 'standardtestcase',
+                                'weight': 1.0}]
+        }
+
+        # When
+        submit(self.url, 'res', json.dumps(testdata), '')
+        result = get_result(self.url, 'res', block=True)
+        stats = get_resource_stats(self.url)
+
+        # Then
+        resources = json.loads(result.get('result'))['resources']
+        self.assertEqual(resources['question_id'], 42)
+        self.assertEqual(resources['language'], 'python')
+        self.assertEqual(len(resources['test_cases']), 2)
+        self.assertEqual(sorted(resources['test_cases'][0]),
+                         ['compile', 'run'])
+        self.assertGreater(resources['wall'], 0)
+        self.assertEqual(stats['42']['jobs'], 1)
+        self.assertEqual(stats['42']['language'], 'python')
+
+    def test_metrics(self):
+        # Given
+        testdata = {
+            'metadata': {
+                'user_answer': 'def f(): return "metrics"',
+                'language': 'python',
+                'partial_grading': False
+            },
+            'test_case_data': [{'test_case': 'assert f() == "metrics"',
+                                'test_case_type': 'standardtestcase',
+                                'weight': 0.0}]
+        }
+        submit(self.url, 'metrics-job', json.dumps(testdata), '')
+        get_result(self.url, 'metrics-job', block=True)
+
+        # When
+        response = requests.get(self.url + '/metrics')
+        data = requests.get(self.url + '/metrics?format=json').json()
+
+        # Then
+        self.assertTrue(
+            response.headers['Content-Type'].startswith('text/plain')
+        )
+        text = response.text
+        self.assertIn('# TYPE yaksh_queue_wait_seconds histogram', text)
+        self.assertIn('yaksh_code_servers 5', text)
+        self.assertIn('yaksh_jobs_queued{priority="exam"} 0', text)
+        series = [s for s in data['yaksh_job_run_seconds']
+                  if s['labels'] == {'language': 'python',
+                                     'test_case_type': 'standardtestcase'}]
+        self.assertEqual(len(series), 1)
+        self.assertGreaterEqual(series[0]['value']['count'], 1)
+        self.assertGreaterEqual(
+            data['yaksh_jobs_submitted_total'][0]['value'], 1
+        )
+
+    def test_cancel_running_job(self):
+        # Given
+        testdata = {
+            'metadata': {
+                'user_answer': 'while True: pass',
+                'language': 'python',
+                'partial_grading': False
+            },
+            'test_case_data': [{'test_case': 'assert True',
+                                'test_case_type': 'standardtestcase',
+                                'weight': 0.0}]
+        }
+        submit(self.url, 'cancel-me', json.dumps(testdata), '')
+        while get_result(self.url, 'cancel-me')['status'] != 'running':
+            time.sleep(0.05)
+
+        # When
+        start = time.time()
+        cancelled = cancel(self.url, 'cancel-me')
+        result = get_result(self.url, 'cancel-me')
+        while self.server_pool.cancelled:
+            time.sleep(0.05)
+
+        # Then
+        self.assertTrue(cancelled)
+        self.assertEqual(result['status'], 'done')
+        self.assertTrue(json.loads(result['result'])['cancelled'])
+        self.assertLess(time.time() - start, settings.SERVER_TIMEOUT)
+        self.assertFalse(cancel(self.url, 'cancel-me'))
+
+    def test_cancel_job_which_catches_the_cancel(self):
+        # Given
+        self.server_pool.cancel_grace = 0.2
+        testdata = {
+            'metadata': {
+                'user_answer': 'import time\n'
+                               'while True:\n'
+                               '    try:\n'
+                               '        while True:\n'
+                               '            time.sleep(0.01)\n'
+                               '    except Exception:\n'
+                               '        pass',
+                'language': 'python',
+                'partial_grading': False
+            },
+            'test_case_data': [{'test_case': 'assert True',
+                                'test_case_type': 'standardtestcase',
+                                'weight': 0.0}]
+        }
+        submit(self.url, 'catch-me', json.dumps(testdata), '')
+        while get_result(self.url, 'catch-me')['status'] != 'running':
+            time.sleep(0.05)
+
+        # When
+        start = time.time()
+        cancelled = cancel(self.url, 'catch-me')
+        result = get_result(self.url, 'catch-me')
+        while self.server_pool.cancelled:
+            time.sleep(0.05)
+        data = requests.get(self.url + '/metrics?format=json').json()
+
+        # Then
+        self.assertTrue(cancelled)
+        self.assertTrue(json.loads(result['result'])['cancelled'])
+        self.assertLess(time.time() - start, settings.SERVER_TIMEOUT)
+        restarts = {s['labels']['reason']: s['value']
+                    for s in data['yaksh_worker_restarts_total']}
+        # A forked child exits on the cancel, the code server is kept.
+        self.assertEqual(restarts.get('cancelled', 0), 0 if self.fork else 1)
+        self.assertEqual(self.server_pool.running, {})
+
     def test_question_with_no_testcases(self):
         # Given
         testdata = {
@@ -168,7 +352,7 @@ class TestCodeServer(unittest.TestCase):
             t.start()
 
         for t in threads:
-            if t.isAlive():
+            if t.is_alive():
                 t.join()
 
         # Then
@@ -178,6 +362,125 @@ class TestCodeServer(unittest.TestCase):
             self.assertFalse(data['success'])
             self.assertTrue('infinite loop' in data['error'][0]['message'])
 
+    def test_long_poll_returns_when_job_is_done(self):
+        # Given
+        testdata = {
+            'metadata': {
+                'user_answer': 'import time; time.sleep(1)',
+                'language': 'python',
+                'partial_grading': False
+            },
+            'test_case_data': [{'test_case': 'assert True',
+                                'test_case_type': 'standardtestcase',
+                                'weight': 0.0}]
+        }
+
+        # When
+        submit(self.url, 'poll', json.dumps(testdata), '')
+        start = time.time()
+        result = get_result(self.url, 'poll', wait=10)
+        elapsed = time.time() - start
+
+        # Then
+        self.assertEqual(result.get('status'), 'done')
+        self.assertTrue(json.loads(result.get('result'))['success'])
+        self.assertLess(elapsed, 5)
+
+    def test_long_poll_times_out(self):
+        # Given
+        testdata = {
+            'metadata': {
+                'user_answer': 'import time; time.sleep(2)',
+                'language': 'python',
+                'partial_grading': False
+            },
+            'test_case_data': [{'test_case': 'assert True',
+                                'test_case_type': 'standardtestcase',
+                                'weight': 0.0}]
+        }
+
+        # When
+        submit(self.url, 'slow', json.dumps(testdata), '')
+        result = get_result(self.url, 'slow', wait=0.2)
+
+        # Then
+        self.assertIn(result.get('status'), ['running', 'not started'])
+
+        # When
+        result = get_result(self.url, 'slow', block=True)
+
+        # Then
+        self.assertTrue(json.loads(result.get('result'))['success'])
+
+    def test_batch_submission(self):
+        # Given
+        def make_data(user_answer):
+            return json.dumps({
+                'metadata': {
+                    'user_answer': user_answer,
+                    'language': 'python',
+                    'partial_grading': False
+                },
+                'test_case_data': [{'test_case': 'assert f() == 1',
+                                    'test_case_type': 'standardtestcase',
+                                    'weight': 0.0}]
+            })
+        jobs = [
+            ('b%d' % i, make_data('def f(): return %d' % (i % 2)), '')
+            for i in range(6)
+        ]
+
+        # When
+        submit_batch(self.url, jobs)
+        results = get_results(self.url, [job[0] for job in jobs],
+                              block=True)
+
+        # Then
+        self.assertEqual(sorted(results), sorted(job[0] for job in jobs))
+        for i in range(6):
+            result = results['b%d' % i]
+            self.assertEqual(result.get('status'), 'done')
+            data = json.loads(result.get('result'))
+            self.assertEqual(data['success'], i % 2 == 1)
+
+        # When
+        results = get_results(self.url, ['b0', 'missing'])
+
+        # Then
+        self.assertEqual(results['b0'].get('status'), 'unknown')
+        self.assertEqual(results['missing'].get('status'), 'unknown')
+
+    def test_identical_submissions_are_graded_once(self):
+        # Given
+        self.addCleanup(setattr, self.server_pool, 'grade_cache',
+                        self.server_pool.grade_cache)
+        self.server_pool.grade_cache = GradeCache(max_size=10, ttl=60)
+        testdata = json.dumps({
+            'metadata': {
+                'user_answer': 'import time; time.sleep(0.5)\n'
+                               'def f(): return 42',
+                'language': 'python',
+                'partial_grading': False
+            },
+            'test_case_data': [{'test_case': 'assert f() == 42',
+                                'test_case_type': 'standardtestcase',
+                                'weight': 0.0}]
+        })
+        submit(self.url, 'first', testdata, '')
+        first = get_result(self.url, 'first', block=True)
+
+        # When
+        submit(self.url, 'again', testdata, '')
+        again = get_result(self.url, 'again')
+
+        # Then
+        self.assertEqual(again.get('status'), 'done')
+        self.assertEqual(again.get('result'), first.get('result'))
+        self.assertTrue(json.loads(again.get('result'))['success'])
+        self.assertGreaterEqual(
+            self.server_pool.grade_cache.stats()['hits'], 1
+        )
+
     def test_server_pool_status(self):
         # Given
         url = "http://localhost:%s/" % SERVER_POOL_PORT
@@ -190,6 +493,20 @@ class TestCodeServer(unittest.TestCase):
         expect = '5 processes, 0 running, 0 queued'
         self.assertTrue(expect in data)
 
+    def test_server_pool_status_as_json(self):
+        # Given
+        url = "http://localhost:%s/?format=json" % SERVER_POOL_PORT
+
+        # When
+        response = urllib.request.urlopen(url)
+        data = json.loads(response.read().decode('utf-8'))
+
+        # Then
+        self.assertEqual(data['processes'], 5)
+        self.assertEqual(data['queued'], 0)
+        self.assertIn('evictions', data['results'])
+        self.assertIsInstance(data['workers'], dict)
+
     def test_killing_process_revives_it(self):
         # Given
         testdata = {
@@ -225,5 +542,661 @@ class TestCodeServer(unittest.TestCase):
         self.assertTrue(expect in data)
 
 
+class TestServerPoolPriorities(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        evaluators = settings.code_evaluators['python']
+        cls.evaluator = evaluators['standardtestcase']
+        evaluators['standardtestcase'] = \
+            "yaksh.python_assertion_evaluator.PythonAssertionEvaluator"
+        cls.port = SERVER_POOL_PORT + 1
+        cls.server_pool = ServerPool(n=1, pool_port=cls.port)
+        cls.server_thread = t = Thread(target=cls.server_pool.run)
+        t.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server_pool.stop()
+        cls.server_thread.join()
+        settings.code_evaluators['python']['standardtestcase'] = \
+            cls.evaluator
+
+    def setUp(self):
+        self.url = 'http://localhost:%s' % self.port
+
+    def make_data(self, user_answer):
+        return json.dumps({
+            'metadata': {
+                'user_answer': user_answer,
+                'language': 'python',
+                'partial_grading': False
+            },
+            'test_case_data': [{'test_case': 'assert True',
+                                'test_case_type': 'standardtestcase',
+                                'weight': 0.0}]
+        })
+
+    def record_dispatch_order(self):
+        """Return the list to which the uids of the jobs are appended as
+        the pool hands them to its code server.
+        """
+        scheduler = self.server_pool.scheduler
+        pop = scheduler.pop
+        order = []
+
+        def recording_pop():
+            job, priority, wait = pop()
+            order.append(job[0])
+            return job, priority, wait
+        scheduler.pop = recording_pop
+        self.addCleanup(delattr, scheduler, 'pop')
+        return order
+
+    def test_exam_jobs_run_before_background_jobs(self):
+        # Given
+        order = self.record_dispatch_order()
+        submit(self.url, 'busy', self.make_data('import time; time.sleep(1)'),
+               '')
+        submit_batch(
+            self.url, [('bg%d' % i, self.make_data('x = %d' % i), '')
+                       for i in range(3)],
+            priority='background'
+        )
+        submit(self.url, 'exam', self.make_data('x = "exam"'), '',
+               priority='exam')
+
+        # When
+        status = urllib.request.urlopen(self.url).read().decode('utf-8')
+        results = get_results(self.url, ['exam', 'bg0', 'bg1', 'bg2'],
+                              block=True)
+
+        # Then
+        self.assertIn('4 queued (exam 1, exercise 0, background 3)', status)
+        self.assertTrue(all(result['status'] == 'done'
+                            for result in results.values()))
+        self.assertEqual(order, ['busy', 'exam', 'bg0', 'bg1', 'bg2'])
+
+    def test_unknown_priority_is_rejected(self):
+        # When
+        response = requests.post(self.url, data=dict(
+            uid='bad', json_data=self.make_data('x = 1'), user_dir='',
+            priority='urgent'
+        ))
+
+        # Then
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(get_result(self.url, 'bad')['status'], 'unknown')
+
+
+class TestServerPoolAutoscaling(unittest.TestCase):
+
+    def setUp(self):
+        self.port = SERVER_POOL_PORT + 2
+        self.server_pool = ServerPool(n=1, pool_port=self.port, max_n=4)
+        autoscaler = self.server_pool.autoscaler
+        autoscaler.target_wait = 0.4
+        autoscaler.idle_time = 0.5
+        autoscaler.window = 1
+        autoscaler.interval = 0.1
+        self.server_thread = t = Thread(target=self.server_pool.run)
+        t.start()
+        self.url = 'http://localhost:%s' % self.port
+
+    def tearDown(self):
+        self.server_pool.stop()
+        self.server_thread.join()
+
+    def test_pool_grows_under_load_and_shrinks_when_idle(self):
+        # Given
+        def make_data(uid):
+            return json.dumps({
+                'metadata': {
+                    'user_answer': 'import time; time.sleep(0.5)  # ' + uid,
+                    'language': 'python',
+                    'partial_grading': False
+                },
+                'test_case_data': [{'test_case': 'assert True',
+                                    'test_case_type': 'standardtestcase',
+                                    'weight': 0.0}]
+            })
+        uids = ['burst%d' % i for i in range(6)]
+
+        # When
+        for uid in uids:
+            submit(self.url, uid, make_data(uid), '')
+        results = get_results(self.url, uids, block=True)
+        grown = self.server_pool.autoscaler.events[0]
+        time.sleep(2)
+        status = json.loads(urllib.request.urlopen(
+            self.url + '?format=json'
+        ).read().decode('utf-8'))
+
+        # Then
+        self.assertTrue(all(result['status'] == 'done'
+                            for result in results.values()))
+        self.assertEqual(grown['action'], 'up')
+        self.assertEqual(grown['servers'][1], 4)
+        self.assertEqual(status['processes'], 1)
+        actions = [e['action'] for e in status['autoscaler']['events']]
+        self.assertEqual(actions.count('down'), 3)
+
+
+class TestServerPoolSupervisor(unittest.TestCase):
+
+    def setUp(self):
+        evaluators = settings.code_evaluators['python']
+        self.evaluator = evaluators['standardtestcase']
+        evaluators['standardtestcase'] = \
+            "yaksh.python_assertion_evaluator.PythonAssertionEvaluator"
+        self.port = SERVER_POOL_PORT + 3
+        self.server_pool = ServerPool(n=2, pool_port=self.port)
+        self.server_pool.supervisor_interval = 0.1
+        self.server_pool.hang_timeout = 2
+        self.server_thread = t = Thread(target=self.server_pool.run)
+        t.start()
+        self.url = 'http://localhost:%s' % self.port
+        # The code servers are started once the pool serves.
+        urllib.request.urlopen(self.url).read()
+
+    def tearDown(self):
+        self.server_pool.stop()
+        self.server_thread.join()
+        settings.code_evaluators['python']['standardtestcase'] = \
+            self.evaluator
+
+    def make_data(self, user_answer):
+        return json.dumps({
+            'metadata': {
+                'user_answer': user_answer,
+                'language': 'python',
+                'partial_grading': False
+            },
+            'test_case_data': [{'test_case': 'assert True',
+                                'test_case_type': 'standardtestcase',
+                                'weight': 0.0}]
+        })
+
+    def get_metrics(self):
+        return requests.get(self.url + '/metrics?format=json').json()
+
+    def wait_till_running(self, uid):
+        for i in range(100):
+            pids = [pid for pid, running in
+                    list(self.server_pool.running.items())
+                    if running == uid]
+            if pids and get_result(self.url, uid)['status'] == 'running':
+                return self.server_pool.processes[pids[0]]
+            time.sleep(0.05)
+        self.fail("Job %s did not start." % uid)
+
+    def test_idle_worker_is_restarted(self):
+        # Given
+        proc = self.server_pool.processes[0]
+
+        # When
+        proc.kill()
+        time.sleep(0.5)
+        status = json.loads(urllib.request.urlopen(
+            self.url + '?format=json'
+        ).read().decode('utf-8'))
+
+        # Then
+        self.assertEqual(status['processes'], 2)
+        self.assertIsNot(self.server_pool.processes[0], proc)
+        restarts = self.get_metrics()['yaksh_worker_restarts_total']
+        self.assertEqual(restarts[0]['labels'], {'reason': 'died'})
+        self.assertEqual(restarts[0]['value'], 1)
+
+    def test_job_of_dead_worker_is_requeued(self):
+        # Given
+        submit(self.url, 'slow', self.make_data(
+            'import time; time.sleep(1)'
+        ), '')
+        proc = self.wait_till_running('slow')
+
+        # When
+        proc.kill()
+        result = get_result(self.url, 'slow', block=True)
+
+        # Then
+        self.assertTrue(json.loads(result['result'])['success'])
+        metrics = self.get_metrics()
+        self.assertEqual(metrics['yaksh_jobs_requeued_total'][0]['value'], 1)
+        self.assertGreater(
+            metrics['yaksh_capacity_lost_seconds_total'][0]['value'], 0
+        )
+
+    def test_hung_worker_is_killed(self):
+        # Given
+        answer = 'import signal, time\n'\
+                 'signal.signal(signal.SIGALRM, signal.SIG_IGN)\n'\
+                 'time.sleep(30)'
+
+        # When
+        submit(self.url, 'hung', self.make_data(answer), '')
+        result = get_result(self.url, 'hung', block=True)
+
+        # Then
+        data = json.loads(result['result'])
+        self.assertFalse(data['success'])
+        self.assertIn('killed after running', data['error'][0])
+        restarts = self.get_metrics()['yaksh_worker_restarts_total']
+        self.assertEqual(restarts[0]['labels'], {'reason': 'hung'})
+        self.assertEqual(len(self.server_pool.processes), 2)
+
+
+class TestServerPoolRecycling(unittest.TestCase):
+
+    def setUp(self):
+        evaluators = settings.code_evaluators['python']
+        self.evaluator = evaluators['standardtestcase']
+        evaluators['standardtestcase'] = \
+            "yaksh.python_assertion_evaluator.PythonAssertionEvaluator"
+        self.port = SERVER_POOL_PORT + 4
+        self.url = 'http://localhost:%s' % self.port
+
+    def tearDown(self):
+        self.server_pool.stop()
+        self.server_thread.join()
+        settings.code_evaluators['python']['standardtestcase'] = \
+            self.evaluator
+
+    def start_pool(self, **kw):
+        self.server_pool = ServerPool(n=1, pool_port=self.port, **kw)
+        self.server_thread = t = Thread(target=self.server_pool.run)
+        t.start()
+
+    def run_jobs(self, n):
+        uids = ['job%d' % i for i in range(n)]
+        for uid in uids:
+            submit(self.url, uid, json.dumps({
+                'metadata': {
+                    'user_answer': 'x = "%s"' % uid,
+                    'language': 'python',
+                    'partial_grading': False
+                },
+                'test_case_data': [{'test_case': 'assert True',
+                                    'test_case_type': 'standardtestcase',
+                                    'weight': 0.0}]
+            }), '')
+        return get_results(self.url, uids, block=True)
+
+    def get_recycled(self):
+        metrics = requests.get(self.url + '/metrics?format=json').json()
+        return metrics['yaksh_code_servers_recycled_total']
+
+    def test_code_server_is_recycled_after_max_jobs(self):
+        # Given
+        self.start_pool(max_jobs=2)
+
+        # When
+        results = self.run_jobs(5)
+
+        # Then
+        self.assertTrue(all(json.loads(result['result'])['success']
+                            for result in results.values()))
+        recycled = self.get_recycled()
+        self.assertEqual(recycled[0]['labels'], {'reason': 'jobs'})
+        self.assertEqual(recycled[0]['value'], 2)
+        self.assertEqual(list(self.server_pool.processes), [2])
+
+    def test_code_server_is_recycled_above_max_rss(self):
+        # Given
+        self.start_pool(max_rss_mb=1)
+
+        # When
+        results = self.run_jobs(2)
+        status = json.loads(urllib.request.urlopen(
+            self.url + '?format=json'
+        ).read().decode('utf-8'))
+
+        # Then
+        self.assertTrue(all(result['status'] == 'done'
+                            for result in results.values()))
+        recycled = self.get_recycled()
+        self.assertEqual(recycled[0]['labels'], {'reason': 'memory'})
+        self.assertEqual(recycled[0]['value'], 2)
+        self.assertEqual(status['processes'], 1)
+        rss = requests.get(self.url + '/metrics?format=json').json()[
+            'yaksh_code_server_rss_megabytes'
+        ]
+        self.assertEqual(rss[0]['value']['count'], 2)
+
+
+class TestServerPoolPartitions(unittest.TestCase):
+
+    def setUp(self):
+        evaluators = settings.code_evaluators['python']
+        self.evaluator = evaluators['standardtestcase']
+        evaluators['standardtestcase'] = \
+            "yaksh.python_assertion_evaluator.PythonAssertionEvaluator"
+        self.port = SERVER_POOL_PORT + 5
+        self.url = 'http://localhost:%s' % self.port
+        self.server_pool = ServerPool(
+            n=2, pool_port=self.port,
+            partitions=['python/stdiobasedtestcase'], borrow=False
+        )
+        self.server_thread = t = Thread(target=self.server_pool.run)
+        t.start()
+
+    def tearDown(self):
+        self.server_pool.stop()
+        self.server_thread.join()
+        settings.code_evaluators['python']['standardtestcase'] = \
+            self.evaluator
+
+    def test_partition_does_not_wait_behind_others(self):
+        # Given
+        slow = json.dumps({
+            'metadata': {
+                'user_answer': 'import time; time.sleep(1)',
+                'language': 'python',
+                'partial_grading': False
+            },
+            'test_case_data': [{'test_case': 'assert True',
+                                'test_case_type': 'standardtestcase',
+                                'weight': 0.0}]
+        })
+        stdio = json.dumps({
+            'metadata': {
+                'user_answer': 'print(input())',
+                'language': 'python',
+                'partial_grading': False
+            },
+            'test_case_data': [{'expected_input': '42',
+                                'expected_output': '42',
+                                'test_case_type': 'stdiobasedtestcase',
+                                'weight': 0.0}]
+        })
+
+        # When
+        submit(self.url, 'slow0', slow, '')
+        submit(self.url, 'slow1', slow, '')
+        submit(self.url, 'stdio', stdio, '')
+        result = get_result(self.url, 'stdio', block=True)
+        waiting = get_result(self.url, 'slow1')
+        get_results(self.url, ['slow0', 'slow1'], block=True)
+        status = json.loads(urllib.request.urlopen(
+            self.url + '?format=json'
+        ).read().decode('utf-8'))
+
+        # Then
+        self.assertTrue(json.loads(result['result'])['success'])
+        self.assertEqual(waiting['status'], 'not started')
+        partitions = status['partitions']
+        self.assertEqual(partitions['python/stdiobasedtestcase']['started'],
+                         1)
+        self.assertEqual(partitions['default']['started'], 2)
+        self.assertEqual(partitions['default']['processes'], 1)
+        self.assertEqual(partitions['default']['lent'], 0)
+
+
+class TestServerPoolCancel(unittest.TestCase):
+
+    def setUp(self):
+        evaluators = settings.code_evaluators['python']
+        self.evaluator = evaluators['standardtestcase']
+        evaluators['standardtestcase'] = \
+            "yaksh.python_assertion_evaluator.PythonAssertionEvaluator"
+        self.port = SERVER_POOL_PORT + 6
+        self.url = 'http://localhost:%s' % self.port
+        self.server_pool = ServerPool(n=1, pool_port=self.port)
+        self.server_thread = t = Thread(target=self.server_pool.run)
+        t.start()
+        # Keep the code server busy while the other jobs are queued.
+        submit(self.url, 'busy', self.make_data('time.sleep(0.5)'), '')
+
+    def tearDown(self):
+        self.server_pool.stop()
+        self.server_thread.join()
+        settings.code_evaluators['python']['standardtestcase'] = \
+            self.evaluator
+
+    def make_data(self, user_answer):
+        return json.dumps({
+            'metadata': {
+                'user_answer': 'import time\n' + user_answer,
+                'language': 'python',
+                'partial_grading': False
+            },
+            'test_case_data': [{'test_case': 'assert True',
+                                'test_case_type': 'standardtestcase',
+                                'weight': 0.0}]
+        })
+
+    def get_cancelled(self):
+        metrics = requests.get(self.url + '/metrics?format=json').json()
+        return {(s['labels']['reason'], s['labels']['state']): s['value']
+                for s in metrics['yaksh_jobs_cancelled_total']}
+
+    def test_cancel_queued_job(self):
+        # Given
+        submit(self.url, 'queued', self.make_data('x = 1'), '')
+
+        # When
+        cancelled = cancel(self.url, 'queued')
+        results = get_results(self.url, ['busy', 'queued'], block=True)
+
+        # Then
+        self.assertTrue(cancelled)
+        self.assertTrue(json.loads(results['busy']['result'])['success'])
+        self.assertTrue(json.loads(results['queued']['result'])['cancelled'])
+        self.assertFalse(cancel(self.url, 'unknown'))
+        self.assertEqual(self.get_cancelled(),
+                         {('cancelled', 'queued'): 1})
+
+    def test_newer_job_supersedes_queued_one(self):
+        # Given
+        submit(self.url, 'old', self.make_data('x = 1'), '', supersede='k')
+
+        # When
+        submit(self.url, 'new', self.make_data('x = 2'), '', supersede='k')
+        results = get_results(self.url, ['old', 'new'], block=True)
+
+        # Then
+        self.assertTrue(json.loads(results['old']['result'])['cancelled'])
+        self.assertTrue(json.loads(results['new']['result'])['success'])
+        self.assertEqual(self.get_cancelled(),
+                         {('superseded', 'queued'): 1})
+        self.assertEqual(self.server_pool.supersede_uids, {})
+
+
+class TestServerPoolFairness(unittest.TestCase):
+
+    def setUp(self):
+        evaluators = settings.code_evaluators['python']
+        self.evaluator = evaluators['standardtestcase']
+        evaluators['standardtestcase'] = \
+            "yaksh.python_assertion_evaluator.PythonAssertionEvaluator"
+        self.port = SERVER_POOL_PORT + 7
+        self.url = 'http://localhost:%s' % self.port
+        self.server_pool = ServerPool(n=1, pool_port=self.port,
+                                      user_max_jobs=2)
+        self.server_thread = t = Thread(target=self.server_pool.run)
+        t.start()
+        self.user_dirs = {}
+        for user in ('a', 'b', 'c'):
+            self.user_dirs[user] = tempfile.mkdtemp(prefix='yaksh_test_')
+            self.addCleanup(shutil.rmtree, self.user_dirs[user], True)
+
+    def tearDown(self):
+        self.server_pool.stop()
+        self.server_thread.join()
+        settings.code_evaluators['python']['standardtestcase'] = \
+            self.evaluator
+
+    def make_data(self, user_answer):
+        return json.dumps({
+            'metadata': {
+                'user_answer': user_answer,
+                'language': 'python',
+                'partial_grading': False
+            },
+            'test_case_data': [{'test_case': 'assert True',
+                                'test_case_type': 'standardtestcase',
+                                'weight': 0.0}]
+        })
+
+    def submit_as(self, user, uid, user_answer='x = 1', priority=None):
+        submit(self.url, uid, self.make_data(user_answer + '  # ' + uid),
+               self.user_dirs[user], priority)
+
+    def test_users_take_turns_and_floods_are_rejected(self):
+        # Given
+        scheduler = self.server_pool.scheduler
+        pop = scheduler.pop
+        order = []
+
+        def recording_pop():
+            job, priority, wait = pop()
+            order.append(job[0])
+            return job, priority, wait
+        scheduler.pop = recording_pop
+        self.addCleanup(delattr, scheduler, 'pop')
+        self.submit_as('c', 'busy', 'import time; time.sleep(0.5)')
+
+        # When
+        for i in range(3):
+            self.submit_as('a', 'a%d' % i)
+        self.submit_as('b', 'b0')
+        self.submit_as('a', 'regrade', priority='background')
+        results = get_results(self.url, ['a0', 'a1', 'a2', 'b0', 'regrade'],
+                              block=True)
+        metrics = requests.get(self.url + '/metrics?format=json').json()
+
+        # Then
+        self.assertEqual(order, ['busy', 'a0', 'b0', 'a1', 'regrade'])
+        rejected = json.loads(results['a2']['result'])
+        self.assertTrue(rejected['rejected'])
+        self.assertIn('please wait', rejected['error'][0])
+        self.assertTrue(json.loads(results['a1']['result'])['success'])
+        self.assertEqual(metrics['yaksh_jobs_rejected_total'][0]['value'], 1)
+        self.assertEqual(self.server_pool.user_jobs, {})
+
+
+class TestServerPoolJournal(unittest.TestCase):
+
+    def setUp(self):
+        evaluators = settings.code_evaluators['python']
+        self.evaluator = evaluators['standardtestcase']
+        evaluators['standardtestcase'] = \
+            "yaksh.python_assertion_evaluator.PythonAssertionEvaluator"
+        self.tmp = tempfile.mkdtemp(prefix='yaksh_test_')
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.journal = os.path.join(self.tmp, 'journal.db')
+        self.port = SERVER_POOL_PORT + 13
+        self.url = 'http://localhost:%s' % self.port
+
+    def tearDown(self):
+        settings.code_evaluators['python']['standardtestcase'] = \
+            self.evaluator
+
+    def start_pool(self):
+        self.server_pool = ServerPool(n=1, pool_port=self.port,
+                                      journal=self.journal)
+        self.server_thread = Thread(target=self.server_pool.run)
+        self.server_thread.start()
+
+    def stop_pool(self):
+        self.server_pool.stop()
+        self.server_thread.join()
+
+    def make_data(self, user_answer):
+        return json.dumps({
+            'metadata': {
+                'user_answer': user_answer,
+                'language': 'python',
+                'partial_grading': False
+            },
+            'test_case_data': [{'test_case': 'assert True',
+                                'test_case_type': 'standardtestcase',
+                                'weight': 0.0}]
+        })
+
+    def wait_for_status(self, uid, status):
+        for i in range(100):
+            result = self.server_pool.results.get(uid) or {}
+            if result.get('status') == status:
+                return
+            time.sleep(0.05)
+        self.fail("Job %s did not reach status %s." % (uid, status))
+
+    def test_jobs_and_results_survive_a_restart(self):
+        # Given
+        self.start_pool()
+        try:
+            submit(self.url, 'fetched', self.make_data('x = 1'), self.tmp)
+            get_result(self.url, 'fetched', block=True)
+            submit(self.url, 'kept', self.make_data('x = 2'), self.tmp)
+            self.wait_for_status('kept', 'done')
+            submit(self.url, 'busy', self.make_data(
+                'import time; time.sleep(0.5)'), self.tmp)
+            submit(self.url, 'queued', self.make_data('x = 3'), self.tmp)
+            self.wait_for_status('busy', 'running')
+        finally:
+            self.stop_pool()
+
+        # When
+        self.start_pool()
+        try:
+            metrics = self.server_pool.get_metrics().to_dict()
+            results = get_results(self.url, ['kept', 'busy', 'queued'],
+                                  block=True)
+            fetched = get_result(self.url, 'fetched')
+        finally:
+            self.stop_pool()
+
+        # Then
+        for uid in ('kept', 'busy', 'queued'):
+            self.assertEqual(results[uid]['status'], 'done')
+            self.assertTrue(json.loads(results[uid]['result'])['success'])
+        self.assertEqual(fetched['status'], 'unknown')
+        recovered = {item['labels']['state']: item['value']
+                     for item in metrics['yaksh_jobs_recovered_total']}
+        self.assertEqual(recovered, dict(done=1, running=1, queued=1))
+
+
+class TestForkingCodeServer(TestCodeServer):
+    fork = True
+
+    def test_state_does_not_leak_between_jobs(self):
+        # Given
+        testdata = {
+            'metadata': {
+                'user_answer': 'import os; os.environ["YAKSH_LEAK"] = "1"',
+                'language': 'python',
+                'partial_grading': False
+            },
+            'test_case_data': [{'test_case': 'assert 1 == 1',
+                                'test_case_type': 'standardtestcase',
+                                'weight': 0.0}]
+        }
+        check = {
+            'metadata': {
+                'user_answer': 'import os',
+                'language': 'python',
+                'partial_grading': False
+            },
+            'test_case_data': [
+                {'test_case': 'assert "YAKSH_LEAK" not in os.environ',
+                 'test_case_type': 'standardtestcase',
+                 'weight': 0.0}
+            ]
+        }
+
+        # When
+        for i in range(5):
+            submit(self.url, 'leak%d' % i, json.dumps(testdata), '')
+        for i in range(5):
+            get_result(self.url, 'leak%d' % i, block=True)
+        submit(self.url, 'check', json.dumps(check), '')
+        result = get_result(self.url, 'check', block=True)
+
+        # Then
+        data = json.loads(result.get('result'))
+        self.assertTrue(data['success'])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,191 @@
+from __future__ import unicode_literals
+import os
+import shutil
+import tempfile
+import unittest
+
+from yaksh.compile_cache import CompileCache, new_outputs
+from yaksh import compile_cache, worker_stats
+
+
+class FakeProcess(object):
+    def __init__(self, returncode):
+        self.returncode = returncode
+
+
+class TestCompileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.work_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.work_dir)
+        self.cache = CompileCache(self.cache_dir, max_size=1)
+        self.calls = []
+        worker_stats.counters.clear()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.cache_dir)
+        shutil.rmtree(self.work_dir)
+        worker_stats.counters.clear()
+
+    def fake_compiler(self, cmd_args, returncode=0, content=b'binary'):
+        self.calls.append(cmd_args)
+        if returncode == 0:
+            with open('output', 'wb') as f:
+                f.write(content)
+        stderr = '' if returncode == 0 else os.getcwd() + '/a.c: error'
+        return FakeProcess(returncode), '', stderr
+
+    def test_same_key_compiles_once(self):
+        # Given
+        key = self.cache.make_key('g++ -c', 'int f() { return 1; }')
+
+        # When
+        first = self.cache.run(key, ['output'], self.fake_compiler, 'cc')
+        os.remove('output')
+        second = self.cache.run(key, ['output'], self.fake_compiler, 'cc')
+
+        # Then
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(first[0].returncode, second[0].returncode)
+        with open('output', 'rb') as f:
+            self.assertEqual(f.read(), b'binary')
+        self.assertEqual(worker_stats.counters['compile_cache_hits'], 1)
+        self.assertEqual(worker_stats.counters['compile_cache_misses'], 1)
+
+    def test_compilation_errors_are_cached(self):
+        # Given
+        key = self.cache.make_key('g++ -c', 'int f() {')
+
+        # When
+        first = self.cache.run(key, ['output'], self.fake_compiler, 'cc',
+                               returncode=1)
+        other_dir = tempfile.mkdtemp()
+        os.chdir(other_dir)
+        second = self.cache.run(key, ['output'], self.fake_compiler, 'cc',
+                                returncode=1)
+        shutil.rmtree(other_dir)
+
+        # Then
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(second[0].returncode, 1)
+        self.assertEqual(first[2], self.work_dir + '/a.c: error')
+        self.assertEqual(second[2], other_dir + '/a.c: error')
+        self.assertFalse(os.path.exists(os.path.join(other_dir, 'output')))
+
+    def test_keys_depend_on_all_parts(self):
+        # Given
+        with open('header.h', 'w') as f:
+            f.write('#define N 1')
+        key = self.cache.make_key('g++', 'code', files=['header.h'])
+
+        # When
+        with open('header.h', 'w') as f:
+            f.write('#define N 2')
+
+        # Then
+        self.assertNotEqual(
+            key, self.cache.make_key('g++', 'code', files=['header.h'])
+        )
+        self.assertNotEqual(
+            self.cache.make_key('g++', 'code'),
+            self.cache.make_key('g++ -O2', 'code')
+        )
+
+    def test_evicts_least_recently_used_entries(self):
+        # Given
+        big = b'x' * (600 * 1024)
+        keys = [self.cache.make_key(str(i)) for i in range(3)]
+
+        # When
+        for key in keys[:2]:
+            self.cache.run(key, ['output'], self.fake_compiler, 'cc',
+                           content=big)
+        self.cache.run(keys[2], ['output'], self.fake_compiler, 'cc')
+
+        # Then
+        self.assertEqual(worker_stats.counters['compile_cache_evictions'], 1)
+        self.cache.run(keys[0], ['output'], self.fake_compiler, 'cc')
+        self.assertEqual(len(self.calls), 4)
+
+    def test_cache_is_walked_only_when_over_limit(self):
+        # Given
+        walks = []
+        evict = self.cache._evict
+
+        def counting_evict(now):
+            walks.append(now)
+            evict(now)
+        self.cache._evict = counting_evict
+        keys = [self.cache.make_key(str(i)) for i in range(5)]
+
+        # When
+        for key in keys[:4]:
+            self.cache.run(key, ['output'], self.fake_compiler, 'cc')
+        self.cache.run(keys[4], ['output'], self.fake_compiler, 'cc',
+                       content=b'x' * (1100 * 1024))
+
+        # Then
+        self.assertEqual(len(walks), 2)
+        self.assertEqual(worker_stats.counters['compile_cache_evictions'], 5)
+
+    def test_job_cache_is_removed_when_job_finishes(self):
+        # Given
+        shared = compile_cache.cache
+        compile_cache.cache = CompileCache('', max_size=1)
+        self.addCleanup(setattr, compile_cache, 'cache', shared)
+        key = self.cache.make_key('code')
+
+        # When
+        compile_cache.start_job()
+        job_cache = compile_cache.get_compile_cache()
+        job_cache.run(key, ['output'], self.fake_compiler, 'cc')
+        job_cache.run(key, ['output'], self.fake_compiler, 'cc')
+        compile_cache.finish_job()
+
+        # Then
+        self.assertTrue(job_cache.enabled)
+        self.assertEqual(len(self.calls), 1)
+        self.assertFalse(os.path.exists(job_cache.cache_dir))
+        self.assertIs(compile_cache.get_compile_cache(),
+                      compile_cache.cache)
+
+    def test_outputs_found_after_compilation(self):
+        # Given
+        with open('Old.class', 'w') as f:
+            f.write('old')
+        key = self.cache.make_key('javac', 'class Test {}')
+
+        def javac(cmd_args):
+            for name in ('Test.class', 'Test$Inner.class'):
+                with open(name, 'w') as f:
+                    f.write(name)
+            return FakeProcess(0), '', ''
+
+        # When
+        self.cache.run(key, new_outputs('*.class'), javac, 'javac')
+        for name in os.listdir('.'):
+            os.remove(name)
+        self.cache.run(key, new_outputs('*.class'), javac, 'javac')
+
+        # Then
+        self.assertEqual(sorted(os.listdir('.')),
+                         ['Test$Inner.class', 'Test.class'])
+
+    def test_disabled_cache_always_compiles(self):
+        # Given
+        cache = CompileCache(self.cache_dir, max_size=0)
+        key = cache.make_key('code')
+
+        # When
+        cache.run(key, ['output'], self.fake_compiler, 'cc')
+        cache.run(key, ['output'], self.fake_compiler, 'cc')
+
+        # Then
+        self.assertEqual(len(self.calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,198 @@
+from __future__ import unicode_literals
+import json
+import os
+import shutil
+import tempfile
+from threading import Thread
+import time
+import unittest
+import urllib
+
+from yaksh.code_server import (
+    ServerPool, SERVER_POOL_PORT, submit, get_result, submit_batch,
+    get_results, cancel
+)
+from yaksh.coordinator import Coordinator
+from yaksh import settings
+
+
+class TestCoordinator(unittest.TestCase):
+
+    def setUp(self):
+        evaluators = settings.code_evaluators['python']
+        self.evaluator = evaluators['standardtestcase']
+        evaluators['standardtestcase'] = \
+            "yaksh.python_assertion_evaluator.PythonAssertionEvaluator"
+        self.pools = []
+        self.threads = []
+        node_urls = []
+        for port in (SERVER_POOL_PORT + 10, SERVER_POOL_PORT + 11):
+            pool = ServerPool(n=1, pool_port=port)
+            self._start(pool)
+            self.pools.append(pool)
+            node_urls.append('http://localhost:%s' % port)
+        self.port = SERVER_POOL_PORT + 12
+        self.coordinator = Coordinator(
+            node_urls, port=self.port, health_interval=0.2, max_failures=1,
+            poll_interval=0.05
+        )
+        self._start(self.coordinator)
+        self.url = 'http://localhost:%s' % self.port
+
+    def tearDown(self):
+        self.coordinator.stop()
+        for pool in self.pools:
+            pool.stop()
+        for thread in self.threads:
+            thread.join()
+        settings.code_evaluators['python']['standardtestcase'] = \
+            self.evaluator
+
+    def _start(self, server):
+        thread = Thread(target=server.run)
+        thread.start()
+        self.threads.append(thread)
+
+    def make_data(self, user_answer):
+        return json.dumps({
+            'metadata': {
+                'user_answer': user_answer,
+                'language': 'python',
+                'partial_grading': False
+            },
+            'test_case_data': [{'test_case': 'assert f() == 1',
+                                'test_case_type': 'standardtestcase',
+                                'weight': 0.0}]
+        })
+
+    def test_jobs_are_spread_over_nodes(self):
+        # Given
+        answer = 'import time\ndef f():\n    time.sleep(0.2)\n    return 1'
+        uids = ['job%d' % i for i in range(4)]
+
+        # When
+        submit_batch(
+            self.url, [(uid, self.make_data(answer + '  # %s' % uid), '')
+                       for uid in uids]
+        )
+        results = get_results(self.url, uids, block=True)
+        status = json.loads(urllib.request.urlopen(
+            self.url + '?format=json'
+        ).read().decode('utf-8'))
+
+        # Then
+        for uid in uids:
+            self.assertEqual(results[uid]['status'], 'done')
+            self.assertTrue(json.loads(results[uid]['result'])['success'])
+        submitted = [node['submitted'] for node in status['nodes']]
+        self.assertEqual(sum(submitted), 4)
+        self.assertTrue(all(n > 0 for n in submitted))
+
+    def test_jobs_of_failed_node_are_requeued(self):
+        # Given
+        answer = 'import time\ndef f():\n    time.sleep(0.5)\n    return 1'
+        uids = ['fail%d' % i for i in range(4)]
+        for uid in uids:
+            submit(self.url, uid, self.make_data(answer + '  # %s' % uid), '')
+        # Wait for the jobs to reach the nodes.
+        time.sleep(0.3)
+
+        # When
+        self.pools[0].stop()
+        results = get_results(self.url, uids, block=True)
+        status = json.loads(urllib.request.urlopen(
+            self.url + '?format=json'
+        ).read().decode('utf-8'))
+
+        # Then
+        for uid in uids:
+            self.assertEqual(results[uid]['status'], 'done')
+            self.assertTrue(json.loads(results[uid]['result'])['success'])
+        self.assertGreaterEqual(status['requeued'], 1)
+        self.assertFalse(status['nodes'][0]['healthy'])
+
+    def test_files_are_sent_with_the_job(self):
+        # Given
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, 'w') as f:
+            f.write('42')
+        data = json.loads(self.make_data(
+            'def f():\n    with open("%s") as f:\n'
+            '        return int(f.read()) - 41' % os.path.basename(path)
+        ))
+        data['metadata']['file_paths'] = [[path, False]]
+        user_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, user_dir, True)
+
+        # When
+        submit(self.url, 'files', json.dumps(data), user_dir)
+        # The pools only have the contents sent with the job.
+        os.remove(path)
+        result = get_result(self.url, 'files', block=True)
+
+        # Then
+        self.assertTrue(json.loads(result['result'])['success'])
+
+    def test_cancel_job_sent_to_node(self):
+        # Given
+        submit(self.url, 'loop', self.make_data('while True: pass'), '')
+        while get_result(self.url, 'loop')['status'] != 'running':
+            time.sleep(0.05)
+
+        # When
+        start = time.time()
+        cancelled = cancel(self.url, 'loop')
+        result = get_result(self.url, 'loop', block=True)
+
+        # Then
+        self.assertTrue(cancelled)
+        self.assertTrue(json.loads(result['result'])['cancelled'])
+        self.assertLess(time.time() - start, settings.SERVER_TIMEOUT)
+
+    def test_newer_job_supersedes_one_sent_to_node(self):
+        # Given
+        busy = 'import time\ndef f():\n    time.sleep(1)\n    return 1'
+        for uid in ('busy0', 'busy1'):
+            submit(self.url, uid, self.make_data(busy + '  # ' + uid), '')
+        submit(self.url, 'old', self.make_data('def f(): return 1'), '',
+               supersede='k')
+        while not any('old' in pool.in_flight or
+                      pool.supersede_uids.get('k') == 'old'
+                      for pool in self.pools):
+            time.sleep(0.02)
+
+        # When
+        submit(self.url, 'new', self.make_data('def f(): return 1  # new'),
+               '', supersede='k')
+        deadline = time.time() + 1
+        while time.time() < deadline and \
+                not any(pool.supersede_uids.get('k') == 'new'
+                        for pool in self.pools):
+            time.sleep(0.02)
+        forwarded = any(pool.supersede_uids.get('k') == 'new'
+                        for pool in self.pools)
+        results = get_results(self.url, ['old', 'new', 'busy0', 'busy1'],
+                              block=True)
+        queued = json.loads(urllib.request.urlopen(
+            self.url + '/metrics?format=json'
+        ).read().decode('utf-8'))['yaksh_jobs_queued']
+
+        # Then
+        self.assertTrue(forwarded)
+        self.assertTrue(json.loads(results['old']['result'])['cancelled'])
+        self.assertTrue(json.loads(results['new']['result'])['success'])
+        self.assertEqual(
+            {s['labels']['priority'] for s in queued},
+            set(self.coordinator.scheduler.priorities)
+        )
+
+    def test_unknown_job(self):
+        # When
+        result = get_result(self.url, 'unknown')
+
+        # Then
+        self.assertEqual(result['status'], 'unknown')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+from __future__ import unicode_literals
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from yaksh.grade_cache import GradeCache
+
+
+def make_job(user_answer='def f(): return 1', test_case='assert f() == 1',
+             **metadata):
+    metadata.update(user_answer=user_answer, language='python',
+                    partial_grading=False)
+    return json.dumps({
+        'metadata': metadata,
+        'test_case_data': [{'test_case': test_case,
+                            'test_case_type': 'standardtestcase',
+                            'weight': 1.0}]
+    })
+
+
+def make_result(error=None):
+    return json.dumps(dict(success=not error, weight=0.0, error=error or []))
+
+
+class TestGradeCache(unittest.TestCase):
+
+    def test_identical_jobs_share_a_result(self):
+        # Given
+        cache = GradeCache(max_size=10, ttl=60)
+        key = cache.make_key(make_job())
+
+        # When
+        cache.set(key, make_result())
+
+        # Then
+        self.assertEqual(cache.get(cache.make_key(make_job())), make_result())
+        self.assertIsNone(cache.get(cache.make_key(make_job('def f(): 1'))))
+        self.assertIsNone(
+            cache.get(cache.make_key(make_job(test_case='assert f() == 2')))
+        )
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 2)
+
+    def test_changed_files_change_the_key(self):
+        # Given
+        cache = GradeCache(max_size=10, ttl=60)
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        job = make_job(file_paths=[[path, False]])
+        key = cache.make_key(job)
+
+        # When
+        with open(path, 'w') as f:
+            f.write('changed')
+
+        # Then
+        self.assertNotEqual(cache.make_key(job), key)
+        self.assertIsNone(cache.make_key(make_job(file_paths=[['/x', 0]])))
+        self.assertIsNone(
+            cache.make_key(make_job(assign_files=['http://host/a.zip']))
+        )
+
+    def test_timeouts_and_server_errors_are_not_cached(self):
+        # Given
+        cache = GradeCache(max_size=10, ttl=60)
+        timeout = make_result([{'exception': 'TimeoutException',
+                                'message': 'Code took more than 4 seconds'}])
+        died = make_result(['Process ended with exit code 1.'])
+
+        # When
+        cache.set('timeout', timeout)
+        cache.set('died', died)
+        cache.set('wrong', make_result([{'exception': 'AssertionError'}]))
+
+        # Then
+        self.assertIsNone(cache.get('timeout'))
+        self.assertIsNone(cache.get('died'))
+        self.assertIsNotNone(cache.get('wrong'))
+
+    def test_eviction(self):
+        # Given
+        cache = GradeCache(max_size=2, ttl=0.1)
+        cache.set('a', make_result())
+        cache.set('b', make_result())
+
+        # When
+        cache.get('a')
+        cache.set('c', make_result())
+
+        # Then
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        time.sleep(0.15)
+        self.assertIsNone(cache.get('c'))
+
+    def test_disabled_cache(self):
+        # Given
+        cache = GradeCache(max_size=0, ttl=60)
+
+        # Then
+        self.assertIsNone(cache.make_key(make_job()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+from __future__ import unicode_literals
+import os
+import shutil
+import signal
+import tempfile
+import unittest
+
+from yaksh.grader import TimeoutException
+from yaksh.interpreter_session import InterpreterSession, SessionPool
+
+
+class ShellSession(InterpreterSession):
+    """A session driving sh, which reads its commands line by line like the
+    Scilab and R interpreters do.
+    """
+    command = ['sh']
+
+    def quote(self, string):
+        return "'{0}'".format(string)
+
+    def reset_code(self, cwd):
+        return 'cd {0}\n'.format(self.quote(cwd))
+
+    def run_code(self, script_path):
+        return 'sh {0}; s=$?; echo; echo "{1} $s"\n'.format(
+            self.quote(script_path), self.token
+        )
+
+
+class TestInterpreterSession(unittest.TestCase):
+
+    def setUp(self):
+        self.in_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.in_dir)
+        self.session = ShellSession(max_runs=3)
+
+    def tearDown(self):
+        self.session.stop()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.in_dir)
+
+    def write_script(self, code):
+        with open('main.sh', 'w') as f:
+            f.write(code)
+        return 'main.sh'
+
+    def test_runs_share_the_interpreter(self):
+        # Given
+        script = self.write_script('echo out; echo err >&2; exit 5\n')
+
+        # When
+        proc, stdout, stderr = self.session.run(script)
+        pid = self.session.proc.pid
+        second = self.session.run(script)
+
+        # Then
+        self.assertEqual(proc.returncode, 5)
+        self.assertEqual(stdout, 'out\n')
+        self.assertEqual(stderr, 'err\n')
+        self.assertEqual(second[1:], ('out\n', 'err\n'))
+        self.assertEqual(self.session.proc.pid, pid)
+
+    def test_session_is_replaced_after_max_runs(self):
+        # Given
+        script = self.write_script('exit 0\n')
+        self.session.run(script)
+        pid = self.session.proc.pid
+
+        # When
+        for i in range(3):
+            self.session.run(script)
+
+        # Then
+        self.assertNotEqual(self.session.proc.pid, pid)
+        self.assertEqual(self.session.runs, 1)
+
+    def test_crashed_interpreter_is_replaced(self):
+        # Given
+        script = self.write_script('echo dying; kill -9 $PPID\n')
+
+        # When
+        proc, stdout, stderr = self.session.run(script)
+
+        # Then
+        self.assertNotEqual(proc.returncode, 0)
+        self.assertIsNone(self.session.proc)
+        proc, stdout, stderr = self.session.run(self.write_script('exit 2'))
+        self.assertEqual(proc.returncode, 2)
+
+    def test_timeout_kills_the_interpreter(self):
+        # Given
+        script = self.write_script('sleep 30\n')
+
+        def alarm(signum, frame):
+            raise TimeoutException('Code took too long to run.')
+
+        old = signal.signal(signal.SIGALRM, alarm)
+        signal.alarm(1)
+
+        # When/Then
+        try:
+            with self.assertRaises(TimeoutException):
+                self.session.run(script)
+        finally:
+            signal.alarm(0)
+            signal.signal(signal.SIGALRM, old)
+        self.assertIsNone(self.session.proc)
+
+
+class TestSessionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.in_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.in_dir)
+        self.pool = SessionPool()
+        self.pool.session_classes = {'sh': ShellSession}
+
+    def tearDown(self):
+        self.pool.stop()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.in_dir)
+
+    def test_sessions_are_not_shared_between_jobs(self):
+        # Given
+        with open('main.sh', 'w') as f:
+            f.write('exit 0\n')
+        session = self.pool.get('sh')
+        session.run('main.sh')
+        pid = session.proc.pid
+
+        # When
+        self.pool.stop()
+        next_session = self.pool.get('sh')
+        next_session.run('main.sh')
+
+        # Then
+        self.assertIsNone(session.proc)
+        self.assertNotEqual(next_session.proc.pid, pid)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+from __future__ import unicode_literals
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from yaksh.journal import Journal
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix='yaksh_test_')
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.path = os.path.join(self.tmp, 'journal.db')
+
+    def test_jobs_survive_reopening(self):
+        # Given
+        journal = Journal(self.path)
+        for uid in ('1', '2', '3', '4'):
+            journal.accept(uid, '{"job": %s}' % uid, '/tmp/u' + uid, 'exam')
+        journal.start('2')
+        journal.finish('3', '{"success": true}')
+        journal.accept('1', '{"job": 1}', '/tmp/u1', 'exam')
+        journal.forget('4')
+        journal.close()
+
+        # When
+        journal = Journal(self.path)
+
+        # Then
+        self.assertEqual(journal.unfinished(), [
+            ('2', '{"job": 2}', '/tmp/u2', 'exam', 'running'),
+            ('1', '{"job": 1}', '/tmp/u1', 'exam', 'queued'),
+        ])
+        finished = journal.finished(60)
+        self.assertEqual([row[:2] for row in finished],
+                         [('3', '{"success": true}')])
+        self.assertLessEqual(finished[0][2], time.time())
+        journal.close()
+
+    def test_results_expire(self):
+        # Given
+        journal = Journal(self.path)
+        journal.finish('1', '{}')
+        time.sleep(0.1)
+        journal.finish('2', '{}')
+
+        # When
+        journal.expire(0.05)
+
+        # Then
+        self.assertEqual([row[0] for row in journal.finished(0)], ['2'])
+        self.assertEqual(len(journal), 1)
+        journal.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
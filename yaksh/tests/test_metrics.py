@@ -0,0 +1,65 @@
+from __future__ import unicode_literals
+import unittest
+
+from yaksh.metrics import Registry
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter_and_gauge(self):
+        # Given
+        counter = self.registry.counter('jobs_total', "Jobs.", ('language',))
+        gauge = self.registry.gauge('queued', "Queued jobs.")
+
+        # When
+        counter.inc(language='python')
+        counter.inc(2, language='c"pp')
+        gauge.set(5)
+        text = self.registry.to_prometheus()
+
+        # Then
+        self.assertEqual(text.splitlines(), [
+            '# HELP jobs_total Jobs.',
+            '# TYPE jobs_total counter',
+            'jobs_total{language="python"} 1',
+            'jobs_total{language="c\\"pp"} 2',
+            '# HELP queued Queued jobs.',
+            '# TYPE queued gauge',
+            'queued 5',
+        ])
+        with self.assertRaises(ValueError):
+            self.registry.gauge('queued', "Again.")
+
+    def test_histogram(self):
+        # Given
+        histogram = self.registry.histogram(
+            'wait_seconds', "Wait.", ('priority',), buckets=(0.1, 1.0)
+        )
+
+        # When
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value, priority='exam')
+        text = self.registry.to_prometheus()
+        data = self.registry.to_dict()
+
+        # Then
+        self.assertIn('wait_seconds_bucket{priority="exam",le="0.1"} 2',
+                      text)
+        self.assertIn('wait_seconds_bucket{priority="exam",le="1.0"} 3',
+                      text)
+        self.assertIn('wait_seconds_bucket{priority="exam",le="+Inf"} 4',
+                      text)
+        self.assertIn('wait_seconds_sum{priority="exam"} 3.65', text)
+        self.assertIn('wait_seconds_count{priority="exam"} 4', text)
+        series = data['wait_seconds'][0]
+        self.assertEqual(series['labels'], {'priority': 'exam'})
+        self.assertEqual(series['value']['count'], 4)
+        self.assertEqual(series['value']['over'], 1)
+        self.assertEqual(list(series['value']['buckets'].values()), [2, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
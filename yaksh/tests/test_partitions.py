@@ -0,0 +1,109 @@
+from __future__ import unicode_literals
+import json
+import unittest
+
+from yaksh.partitions import Partitions, parse_partitions
+
+
+def make_job(language, test_case_type='standardtestcase'):
+    return json.dumps({
+        'metadata': {'language': language},
+        'test_case_data': [{'test_case_type': test_case_type}]
+    })
+
+
+class TestPartitions(unittest.TestCase):
+
+    def test_parse_partitions(self):
+        # When
+        weights = parse_partitions(['python:3', ' java', ''])
+
+        # Then
+        self.assertEqual(list(weights.items()), [('python', 3), ('java', 1)])
+        with self.assertRaises(ValueError):
+            parse_partitions(['python:0'])
+
+    def test_shares_follow_weights(self):
+        # Given
+        partitions = Partitions(['python:3', 'java:1'])
+
+        # When
+        shares = partitions.shares(8)
+
+        # Then
+        self.assertEqual(dict(shares), dict(python=4, java=2, default=2))
+        self.assertEqual(dict(partitions.shares(3)),
+                         dict(python=1, java=1, default=1))
+        with self.assertRaises(ValueError):
+            partitions.shares(2)
+
+    def test_jobs_are_routed_by_language_and_test_case_type(self):
+        # Given
+        partitions = Partitions(['python', 'python/stdiobasedtestcase',
+                                 'java'])
+
+        # When
+        routed = [
+            partitions.route(make_job('python')).name,
+            partitions.route(make_job('python', 'stdiobasedtestcase')).name,
+            partitions.route(make_job('java', 'stdiobasedtestcase')).name,
+            partitions.route(make_job('scilab')).name,
+            partitions.route('not json').name,
+        ]
+
+        # Then
+        self.assertEqual(routed, ['python', 'python/stdiobasedtestcase',
+                                  'java', 'default', 'default'])
+
+    def test_idle_code_servers_are_lent_keeping_one(self):
+        # Given
+        partitions = Partitions(['java'])
+        java = partitions.partitions['java']
+        for pid in (0, 1):
+            partitions.add(pid, java)
+        partitions.add(2, partitions.default)
+        partitions.default.scheduler.put('python job', 'exercise')
+
+        # When
+        lent = partitions.match({0, 1})
+        kept = partitions.match({1})
+
+        # Then
+        self.assertEqual(lent, (0, partitions.default))
+        self.assertEqual(kept, (None, None))
+        self.assertEqual(partitions.match({1, 2}), (2, partitions.default))
+
+    def test_no_borrowing(self):
+        # Given
+        partitions = Partitions(['java'], borrow=False)
+        java = partitions.partitions['java']
+        for pid in (0, 1):
+            partitions.add(pid, java)
+        partitions.add(2, partitions.default)
+        partitions.default.scheduler.put('python job', 'exercise')
+
+        # When
+        matched = partitions.match({0, 1})
+
+        # Then
+        self.assertEqual(matched, (None, None))
+
+    def test_most_urgent_partition_borrows_first(self):
+        # Given
+        partitions = Partitions(['java', 'scilab'])
+        for pid, name in enumerate(['java', 'scilab', 'default', 'default',
+                                    'default']):
+            partitions.add(pid, partitions.partitions[name])
+        partitions.partitions['java'].scheduler.put('regrade', 'background')
+        partitions.partitions['scilab'].scheduler.put('answer', 'exam')
+
+        # When
+        pid, partition = partitions.match({2, 3})
+
+        # Then
+        self.assertEqual(partition.name, 'scilab')
+        self.assertEqual(pid, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+from __future__ import unicode_literals
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from threading import Thread
+import unittest
+
+from yaksh.benchmarks.capacity import make_job, run_job
+from yaksh.code_server import ServerPool
+from yaksh.recorder import Recorder, read_log
+from yaksh.replay import Replay
+from yaksh import settings
+from yaksh.settings import SERVER_POOL_PORT
+
+
+class TestRecorder(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix='yaksh_test_')
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.path = os.path.join(self.tmp, 'jobs.log.gz')
+
+    def test_jobs_are_paired_with_their_results(self):
+        # Given
+        recorder = Recorder(self.path)
+
+        # When
+        recorder.record_submit('1', make_job('python', '1'), '/tmp/a', 'exam')
+        recorder.record_submit('2', make_job('c', '2'), None, 'exercise')
+        recorder.record_result('1', json.dumps(dict(success=True,
+                                                    weight=1.0)))
+        recorder.record_result('3', json.dumps(dict(success=True)))
+        recorder.close()
+        jobs = read_log(self.path)
+
+        # Then
+        self.assertEqual([job['uid'] for job in jobs], ['1', '2'])
+        self.assertEqual([job['language'] for job in jobs], ['python', 'c'])
+        self.assertEqual(jobs[0]['priority'], 'exam')
+        self.assertEqual(jobs[0]['user_dir'], '/tmp/a')
+        self.assertTrue(jobs[0]['result']['success'])
+        self.assertEqual(jobs[0]['result']['weight'], 1.0)
+        self.assertGreaterEqual(jobs[0]['result']['latency'], 0.0)
+        self.assertIsNone(jobs[1]['result'])
+        self.assertEqual(recorder.submitted, {'2': jobs[1]['time']})
+
+    def test_logs_are_appended_and_may_end_short(self):
+        # Given
+        for uid in ('1', '2'):
+            recorder = Recorder(self.path)
+            recorder.record_submit(uid, make_job('python', uid), None, 'exam')
+            recorder.close()
+        with gzip.open(self.path, 'at', encoding='utf-8') as f:
+            f.write('{"event": "submit", "uid": "3"' + 'x' * 1000)
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        with open(self.path, 'wb') as f:
+            f.write(data[:-20])
+
+        # When
+        jobs = read_log(self.path)
+
+        # Then
+        self.assertEqual([job['uid'] for job in jobs], ['1', '2'])
+
+
+class TestRecordAndReplay(unittest.TestCase):
+
+    def setUp(self):
+        evaluators = settings.code_evaluators['python']
+        self.evaluator = evaluators['standardtestcase']
+        evaluators['standardtestcase'] = \
+            "yaksh.python_assertion_evaluator.PythonAssertionEvaluator"
+        self.tmp = tempfile.mkdtemp(prefix='yaksh_test_')
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.path = os.path.join(self.tmp, 'jobs.log.gz')
+        self.port = SERVER_POOL_PORT + 9
+        self.url = 'http://localhost:%s' % self.port
+
+    def tearDown(self):
+        settings.code_evaluators['python']['standardtestcase'] = \
+            self.evaluator
+
+    def run_pool(self, **kw):
+        pool = ServerPool(n=2, pool_port=self.port, **kw)
+        thread = Thread(target=pool.run)
+        thread.start()
+        return pool, thread
+
+    def test_replay_compares_with_the_recording(self):
+        # Given
+        pool, thread = self.run_pool(record=self.path)
+        try:
+            for uid, kind in [('a', 'python'), ('b', 'python_stdio'),
+                              ('c', 'python')]:
+                run_job(self.url, uid, make_job(kind, uid), self.tmp,
+                        'exam')
+        finally:
+            pool.stop()
+            thread.join()
+        jobs = read_log(self.path)
+        # The last job is recorded as having failed.
+        jobs[2]['result']['success'] = False
+
+        # When
+        pool, thread = self.run_pool()
+        try:
+            report = Replay(self.url, jobs, speed=10).run()
+        finally:
+            pool.stop()
+            thread.join()
+
+        # Then
+        self.assertEqual(len(jobs), 3)
+        self.assertEqual(report['completed'], 3)
+        self.assertEqual(report['recorded_latency']['count'], 3)
+        self.assertEqual(report['mismatched'], 1)
+        self.assertEqual(report['mismatches'][0]['uid'], 'c')
+        self.assertEqual(list(report['languages']), ['python'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+from __future__ import unicode_literals
+import subprocess
+import sys
+import time
+import unittest
+
+from yaksh import resource_usage
+from yaksh.resource_usage import AccountedPopen, ResourceStats
+
+
+class TestJobAccount(unittest.TestCase):
+
+    def tearDown(self):
+        resource_usage.account = None
+
+    def test_phases_of_test_cases(self):
+        # Given
+        resource_usage.start_job()
+
+        # When
+        for i in range(2):
+            resource_usage.start_test_case()
+            with resource_usage.phase('compile'):
+                time.sleep(0.05)
+            with resource_usage.phase('run'):
+                time.sleep(0.05)
+                with resource_usage.phase('compare'):
+                    time.sleep(0.1)
+        resources = resource_usage.finish_job()
+
+        # Then
+        self.assertEqual(len(resources['test_cases']), 2)
+        phases = resources['test_cases'][0]
+        self.assertEqual(list(phases), ['compile', 'run', 'compare'])
+        self.assertGreaterEqual(phases['run']['wall'], 0.05)
+        self.assertLess(phases['run']['wall'], 0.1)
+        self.assertGreaterEqual(phases['compare']['wall'], 0.1)
+        self.assertGreaterEqual(resources['wall'], 0.4)
+        self.assertIsNone(resource_usage.account)
+
+    def test_children_are_accounted(self):
+        # Given
+        resource_usage.start_job()
+        script = 'x = bytearray(50 * 1024 * 1024); sum(range(10 ** 6))'
+
+        # When
+        with resource_usage.phase('run'):
+            proc = AccountedPopen([sys.executable, '-c', script],
+                                  stdout=subprocess.PIPE)
+            proc.communicate()
+        resources = resource_usage.finish_job()
+
+        # Then
+        run = resources['test_cases'][0]['run']
+        self.assertEqual(proc.returncode, 0)
+        self.assertGreater(run['max_rss_kb'], 50 * 1024)
+        self.assertEqual(resources['max_rss_kb'], run['max_rss_kb'])
+        self.assertGreater(run['user'] + run['sys'], 0)
+
+    def test_no_job(self):
+        # When
+        with resource_usage.phase('run'):
+            proc = AccountedPopen(['true'])
+            proc.wait()
+
+        # Then
+        self.assertEqual(proc.returncode, 0)
+        self.assertIsNone(resource_usage.finish_job())
+
+
+class TestResourceStats(unittest.TestCase):
+
+    def make_resources(self, question_id, wall, max_rss_kb):
+        return dict(
+            question_id=question_id, language='python', wall=wall,
+            user=wall / 2, sys=0.0, max_rss_kb=max_rss_kb,
+            test_cases=[dict(compile=dict(wall=0.0), run=dict(wall=wall))]
+        )
+
+    def test_sums_per_question(self):
+        # Given
+        stats = ResourceStats()
+
+        # When
+        stats.add(self.make_resources(1, 1.0, 100))
+        stats.add(self.make_resources(1, 3.0, 50))
+        stats.add(self.make_resources(2, 0.5, 10))
+        stats.add(self.make_resources(None, 9.0, 10))
+        stats.add(None)
+        result = stats.stats()
+
+        # Then
+        self.assertEqual(sorted(result), ['1', '2'])
+        self.assertEqual(result['1']['jobs'], 2)
+        self.assertEqual(result['1']['wall'], 4.0)
+        self.assertEqual(result['1']['mean_wall'], 2.0)
+        self.assertEqual(result['1']['mean_user'], 1.0)
+        self.assertEqual(result['1']['max_wall'], 3.0)
+        self.assertEqual(result['1']['max_rss_kb'], 100)
+        self.assertEqual(result['1']['phases'], dict(compile=0.0, run=4.0))
+        self.assertEqual(result['2']['language'], 'python')
+
+
+if __name__ == '__main__':
+    unittest.main()
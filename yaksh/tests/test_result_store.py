@@ -0,0 +1,138 @@
+from __future__ import unicode_literals
+import time
+import unittest
+
+from yaksh.result_store import ResultStore, create_result_store
+
+
+class TestResultStore(unittest.TestCase):
+
+    def test_set_get_and_pop(self):
+        # Given
+        store = ResultStore(max_size=10, ttl=60)
+
+        # When
+        store.set('1', dict(status='not started'))
+        store.set('1', dict(status='done', result='{}'))
+
+        # Then
+        self.assertEqual(store.get('1'), dict(status='done', result='{}'))
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.count('not started'), 0)
+        self.assertEqual(store.count('done'), 1)
+
+        # When
+        result = store.pop('1')
+
+        # Then
+        self.assertEqual(result['status'], 'done')
+        self.assertIsNone(store.get('1'))
+        self.assertEqual(store.pop('1', 'missing'), 'missing')
+        self.assertEqual(store.count('done'), 0)
+
+    def test_status_counts(self):
+        # Given
+        store = ResultStore(max_size=10, ttl=60)
+
+        # When
+        for uid in range(4):
+            store.set(uid, dict(status='not started'))
+        store.set(0, dict(status='running'))
+        store.set(1, dict(status='running'))
+        store.set(1, dict(status='done'))
+
+        # Then
+        self.assertEqual(store.count('not started'), 2)
+        self.assertEqual(store.count('running'), 1)
+        self.assertEqual(store.count('done'), 1)
+
+    def test_evicts_least_recently_updated_when_full(self):
+        # Given
+        store = ResultStore(max_size=3, ttl=0)
+        for uid in range(3):
+            store.set(uid, dict(status='done'))
+
+        # When
+        store.set(0, dict(status='done'))
+        store.set(3, dict(status='done'))
+
+        # Then
+        self.assertEqual(len(store), 3)
+        self.assertNotIn(1, store)
+        self.assertIn(0, store)
+        self.assertEqual(store.stats()['evictions'], dict(size=1, ttl=0))
+        self.assertEqual(store.count('done'), 3)
+
+    def test_keeps_pending_jobs_when_full(self):
+        # Given
+        store = ResultStore(max_size=3, ttl=0.1)
+        store.set('done', dict(status='done'))
+        store.set('running', dict(status='running'))
+
+        # When
+        for uid in range(3):
+            store.set(uid, dict(status='not started'))
+        time.sleep(0.15)
+        store.evict_expired()
+
+        # Then
+        self.assertNotIn('done', store)
+        self.assertEqual(store.get('running'), dict(status='running'))
+        for uid in range(3):
+            self.assertEqual(store.get(uid), dict(status='not started'))
+        self.assertEqual(len(store), 4)
+        self.assertEqual(store.stats()['evictions'], dict(size=1, ttl=0))
+
+        # When
+        store.set(0, dict(status='done'))
+        store.set('running', dict(status='done'))
+
+        # Then
+        self.assertEqual(len(store), 3)
+        self.assertNotIn(0, store)
+        self.assertEqual(store.get('running'), dict(status='done'))
+        self.assertEqual(store.count('not started'), 2)
+
+    def test_results_expire_by_the_time_given(self):
+        # Given
+        store = ResultStore(max_size=0, ttl=60)
+
+        # When
+        store.set('old', dict(status='done'), time.time() - 61)
+        store.set('recent', dict(status='done'), time.time() - 30)
+        store.set('new', dict(status='done'))
+
+        # Then
+        self.assertIsNone(store.get('old'))
+        self.assertEqual(store.get('recent'), dict(status='done'))
+        self.assertEqual(store.stats()['evictions']['ttl'], 1)
+
+    def test_evicts_expired_results(self):
+        # Given
+        store = ResultStore(max_size=0, ttl=0.1)
+        store.set('old', dict(status='done'))
+
+        # When
+        time.sleep(0.15)
+        store.set('new', dict(status='done'))
+
+        # Then
+        self.assertNotIn('old', store)
+        self.assertIn('new', store)
+        self.assertEqual(store.stats()['evictions']['ttl'], 1)
+        self.assertEqual(store.count('done'), 1)
+
+    def test_create_result_store(self):
+        # When
+        store = create_result_store(
+            'yaksh.result_store.ResultStore', max_size=5, ttl=10
+        )
+
+        # Then
+        self.assertIsInstance(store, ResultStore)
+        self.assertEqual(store.max_size, 5)
+        self.assertEqual(store.ttl, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
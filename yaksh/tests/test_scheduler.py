@@ -0,0 +1,124 @@
+from __future__ import unicode_literals
+import time
+import unittest
+
+from yaksh.scheduler import Scheduler
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_higher_priorities_first(self):
+        # Given
+        scheduler = Scheduler(max_wait=60)
+        scheduler.put('regrade', 'background')
+        scheduler.put('practice', 'exercise')
+        scheduler.put('exam1', 'exam')
+        scheduler.put('exam2', 'exam')
+
+        # When
+        jobs = [scheduler.get() for i in range(5)]
+
+        # Then
+        self.assertEqual(jobs, ['exam1', 'exam2', 'practice', 'regrade',
+                                None])
+        self.assertEqual(len(scheduler), 0)
+
+    def test_starved_jobs_are_promoted(self):
+        # Given
+        scheduler = Scheduler(max_wait=0.1)
+        scheduler.put('regrade', 'background')
+        time.sleep(0.15)
+        scheduler.put('exam', 'exam')
+
+        # When
+        first = scheduler.get()
+
+        # Then
+        self.assertEqual(first, 'regrade')
+        self.assertEqual(scheduler.get(), 'exam')
+        self.assertEqual(scheduler.stats()['promoted'], {'background': 1})
+
+    def test_remove(self):
+        # Given
+        scheduler = Scheduler()
+        scheduler.put('a', 'exam')
+        scheduler.put('b', 'background')
+        scheduler.put('c', 'background')
+
+        # When
+        removed = scheduler.remove(lambda job: job in ('a', 'c'))
+
+        # Then
+        self.assertEqual(removed, ['exam', 'background'])
+        self.assertEqual(scheduler.get(), 'b')
+        self.assertEqual(len(scheduler), 0)
+
+    def test_submitters_take_turns(self):
+        # Given
+        scheduler = Scheduler(max_wait=60, key=lambda job: job[0])
+        for job in [('a', 1), ('a', 2), ('a', 3), ('b', 1)]:
+            scheduler.put(job, 'exercise')
+        scheduler.put(('c', 1), 'exam')
+
+        # When
+        submitters = scheduler.stats()['submitters']
+        scheduler.remove(lambda job: job == ('a', 3))
+        jobs = [scheduler.get() for i in range(5)]
+
+        # Then
+        self.assertEqual(submitters, 3)
+        self.assertEqual(jobs, [('c', 1), ('a', 1), ('b', 1), ('a', 2),
+                                None])
+
+    def test_starved_submitter_is_promoted(self):
+        # Given
+        scheduler = Scheduler(max_wait=0.1, key=lambda job: job[0])
+        scheduler.put(('a', 1), 'background')
+        scheduler.put(('a', 2), 'background')
+        time.sleep(0.15)
+        scheduler.put(('b', 1), 'background')
+        scheduler.put(('c', 1), 'exam')
+
+        # When
+        jobs = [scheduler.get() for i in range(4)]
+
+        # Then
+        self.assertEqual(jobs, [('a', 1), ('a', 2), ('c', 1), ('b', 1)])
+
+    def test_depths(self):
+        # Given
+        scheduler = Scheduler()
+
+        # When
+        scheduler.put('a', 'exam')
+        scheduler.put('b', 'background')
+        scheduler.put('c', 'background')
+
+        # Then
+        self.assertEqual(dict(scheduler.depths()),
+                         dict(exam=1, exercise=0, background=2))
+        with self.assertRaises(ValueError):
+            scheduler.put('d', 'urgent')
+
+    def test_wait_of_jobs(self):
+        # Given
+        scheduler = Scheduler()
+        scheduler.put('a', 'background')
+        time.sleep(0.1)
+        scheduler.put('b', 'exam')
+
+        # When
+        oldest = scheduler.oldest_wait()
+        job, priority, wait = scheduler.pop()
+
+        # Then
+        self.assertGreaterEqual(oldest, 0.1)
+        self.assertEqual((job, priority), ('b', 'exam'))
+        self.assertLess(wait, 0.1)
+        self.assertEqual(scheduler.pop()[:2], ('a', 'background'))
+        self.assertEqual(scheduler.pop(), (None, None, 0.0))
+        self.assertEqual(scheduler.oldest_wait(), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
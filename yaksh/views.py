@@ -54,7 +54,9 @@ from yaksh.forms import (
     LessonFileForm, LearningModuleForm, ExerciseForm, TestcaseForm,
     SearchFilterForm, PostForm, CommentForm, TopicForm, VideoQuizForm
 )
-from yaksh.settings import SERVER_POOL_PORT, SERVER_HOST_NAME
+from yaksh.settings import (
+    SERVER_POOL_PORT, SERVER_HOST_NAME, RESULT_POLL_WAIT
+)
 from .settings import URL_ROOT
 from .file_utils import extract_files, is_csv
 from .send_emails import (send_user_mail,
@@ -989,10 +991,13 @@ def check(request, q_id, attempt_num=None, questionpaper_id=None,
 def get_result(request, uid, course_id, module_id):
     result = {}
     url = '{0}:{1}'.format(SERVER_HOST_NAME, SERVER_POOL_PORT)
-    result_state = get_result_from_code_server(url, uid)
+    result_state = get_result_from_code_server(url, uid,
+                                               wait=RESULT_POLL_WAIT)
     result['status'] = result_state.get('status')
     if result['status'] == 'done':
         result = json.loads(result_state.get('result'))
+        # Only kept by the code server, students need not see it.
+        result.pop('resources', None)
         template_path = os.path.join(*[os.path.dirname(__file__),
                                        'templates', 'yaksh',
                                        'error_template.html'
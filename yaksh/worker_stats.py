@@ -0,0 +1,23 @@
+"""Counters kept by a code server process, the code server reports them to
+the server pool after every job.
+"""
+from __future__ import unicode_literals
+from collections import Counter
+
+counters = Counter()
+
+
+def incr(name, value=1):
+    counters[name] += value
+
+
+def snapshot():
+    return dict(counters)
+
+
+def replace(values):
+    """Replace all the counters, used by a code server to take over the
+    counters of the child it forked for a job.
+    """
+    counters.clear()
+    counters.update(values)